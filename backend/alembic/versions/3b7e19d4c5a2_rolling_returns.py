@@ -0,0 +1,46 @@
+"""rolling returns
+
+Revision ID: 3b7e19d4c5a2
+Revises: f2a6c0d94e18
+Create Date: 2026-10-18 17:05:31.402816
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b7e19d4c5a2'
+down_revision: Union[str, None] = 'f2a6c0d94e18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('portfolio_rolling_returns',
+    sa.Column('account_id', sa.UUID(), nullable=False),
+    sa.Column('snapshot_date', sa.Date(), nullable=False),
+    sa.Column('window', sa.String(), nullable=False),
+    sa.Column('rolling_return', sa.Numeric(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['account_id'], ['accounts.account_id'], ),
+    sa.PrimaryKeyConstraint('account_id', 'snapshot_date', 'window')
+    )
+    op.create_table('user_portfolio_rolling_returns',
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('snapshot_date', sa.Date(), nullable=False),
+    sa.Column('window', sa.String(), nullable=False),
+    sa.Column('rolling_return', sa.Numeric(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.user_id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'snapshot_date', 'window')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('user_portfolio_rolling_returns')
+    op.drop_table('portfolio_rolling_returns')
@@ -0,0 +1,42 @@
+"""position watermarks
+
+Revision ID: 5e1c9a7b3d20
+Revises: ab5aa82e0b6d
+Create Date: 2026-10-18 09:12:41.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e1c9a7b3d20'
+down_revision: Union[str, None] = 'ab5aa82e0b6d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('position_watermarks',
+    sa.Column('account_id', sa.UUID(), nullable=False),
+    sa.Column('replay_start', sa.Date(), nullable=False),
+    sa.Column('processed_through', sa.Date(), nullable=False),
+    sa.Column('last_transaction_id', sa.UUID(), nullable=True),
+    sa.Column('last_transaction_date', sa.Date(), nullable=True),
+    sa.Column('transaction_count', sa.Integer(), nullable=False),
+    sa.Column('symbol_data', sa.JSON(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['account_id'], ['accounts.account_id'], ),
+    sa.PrimaryKeyConstraint('account_id')
+    )
+    # Existing rows get the migration time, so only imports made after this point look back-dated.
+    op.add_column('transactions', sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('transactions', 'created_at')
+    op.drop_table('position_watermarks')
@@ -0,0 +1,38 @@
+"""benchmarks
+
+Revision ID: 5e1d8a7c3f90
+Revises: 9c4f2e81b7d6
+Create Date: 2026-10-18 18:36:41.208317
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e1d8a7c3f90'
+down_revision: Union[str, None] = '9c4f2e81b7d6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+RELATIVE_METRICS = ('alpha_to_date', 'beta_to_date', 'tracking_error_to_date', 'information_ratio_to_date')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('benchmark', sa.String(), nullable=True))
+    op.add_column('accounts', sa.Column('benchmark', sa.String(), nullable=True))
+    for table in ('portfolio_metrics_snapshot', 'user_portfolio_metrics_snapshot'):
+        for column in RELATIVE_METRICS:
+            op.add_column(table, sa.Column(column, sa.Numeric(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in ('user_portfolio_metrics_snapshot', 'portfolio_metrics_snapshot'):
+        for column in reversed(RELATIVE_METRICS):
+            op.drop_column(table, column)
+    op.drop_column('accounts', 'benchmark')
+    op.drop_column('users', 'benchmark')
@@ -0,0 +1,43 @@
+"""position snapshot ranges
+
+Revision ID: 8a3f6d2c91b4
+Revises: 5e1c9a7b3d20
+Create Date: 2026-10-18 11:40:05.902117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8a3f6d2c91b4'
+down_revision: Union[str, None] = '5e1c9a7b3d20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('position_snapshot_ranges',
+    sa.Column('range_id', sa.UUID(), nullable=False),
+    sa.Column('account_id', sa.UUID(), nullable=False),
+    sa.Column('symbol', sa.String(), nullable=False),
+    sa.Column('quantity', sa.Numeric(), nullable=False),
+    sa.Column('avg_cost', sa.Numeric(), nullable=True),
+    sa.Column('valid_from', sa.Date(), nullable=False),
+    sa.Column('valid_to', sa.Date(), nullable=False),
+    sa.Column('action', sa.Enum('BUY', 'SELL', 'BUY_TO_OPEN', 'SELL_TO_OPEN', 'BUY_TO_CLOSE', 'SELL_TO_CLOSE', 'SELL_SHORT', 'DIVIDEND', 'JOURNAL', 'QUALIFIED_DIVIDEND', 'CASH_DIVIDEND', 'CREDIT_INTEREST', 'MARGIN_INTEREST', 'MONEYLINK_TRANSFER', 'JOURNALED_SHARES', 'BANK_INTEREST', name='transactiontype', native_enum=False), nullable=False),
+    sa.ForeignKeyConstraint(['account_id'], ['accounts.account_id'], ),
+    sa.PrimaryKeyConstraint('range_id')
+    )
+    op.create_index('ix_position_snapshot_ranges_account_valid_to', 'position_snapshot_ranges', ['account_id', 'valid_to'], unique=False)
+    op.add_column('position_watermarks', sa.Column('snapshot_storage', sa.String(), server_default='daily', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('position_watermarks', 'snapshot_storage')
+    op.drop_index('ix_position_snapshot_ranges_account_valid_to', table_name='position_snapshot_ranges')
+    op.drop_table('position_snapshot_ranges')
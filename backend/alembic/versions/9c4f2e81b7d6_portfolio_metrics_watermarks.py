@@ -0,0 +1,48 @@
+"""portfolio metrics watermarks
+
+Revision ID: 9c4f2e81b7d6
+Revises: 3b7e19d4c5a2
+Create Date: 2026-10-18 17:48:12.730154
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c4f2e81b7d6'
+down_revision: Union[str, None] = '3b7e19d4c5a2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('portfolio_metrics_watermarks',
+    sa.Column('account_id', sa.UUID(), nullable=False),
+    sa.Column('calendar', sa.String(), nullable=False),
+    sa.Column('processed_through', sa.Date(), nullable=False),
+    sa.Column('upstream_checksum', sa.String(), nullable=False),
+    sa.Column('state', sa.JSON(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['account_id'], ['accounts.account_id'], ),
+    sa.PrimaryKeyConstraint('account_id')
+    )
+    op.create_table('user_portfolio_metrics_watermarks',
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('calendar', sa.String(), nullable=False),
+    sa.Column('processed_through', sa.Date(), nullable=False),
+    sa.Column('upstream_checksum', sa.String(), nullable=False),
+    sa.Column('state', sa.JSON(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.user_id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('user_portfolio_metrics_watermarks')
+    op.drop_table('portfolio_metrics_watermarks')
@@ -0,0 +1,56 @@
+"""risk snapshots
+
+Revision ID: a4c7d2e9f613
+Revises: 5e1d8a7c3f90
+Create Date: 2026-10-18 19:12:05.417093
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4c7d2e9f613'
+down_revision: Union[str, None] = '5e1d8a7c3f90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('portfolio_risk_snapshots',
+    sa.Column('account_id', sa.UUID(), nullable=False),
+    sa.Column('snapshot_date', sa.Date(), nullable=False),
+    sa.Column('volatility', sa.Numeric(), nullable=True),
+    sa.Column('sortino', sa.Numeric(), nullable=True),
+    sa.Column('historical_var', sa.Numeric(), nullable=True),
+    sa.Column('historical_cvar', sa.Numeric(), nullable=True),
+    sa.Column('parametric_var', sa.Numeric(), nullable=True),
+    sa.Column('parametric_cvar', sa.Numeric(), nullable=True),
+    sa.Column('max_drawdown_duration', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['account_id'], ['accounts.account_id'], ),
+    sa.PrimaryKeyConstraint('account_id', 'snapshot_date')
+    )
+    op.create_table('user_portfolio_risk_snapshots',
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('snapshot_date', sa.Date(), nullable=False),
+    sa.Column('volatility', sa.Numeric(), nullable=True),
+    sa.Column('sortino', sa.Numeric(), nullable=True),
+    sa.Column('historical_var', sa.Numeric(), nullable=True),
+    sa.Column('historical_cvar', sa.Numeric(), nullable=True),
+    sa.Column('parametric_var', sa.Numeric(), nullable=True),
+    sa.Column('parametric_cvar', sa.Numeric(), nullable=True),
+    sa.Column('max_drawdown_duration', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.user_id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'snapshot_date')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('user_portfolio_risk_snapshots')
+    op.drop_table('portfolio_risk_snapshots')
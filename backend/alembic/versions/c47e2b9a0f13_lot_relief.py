@@ -0,0 +1,34 @@
+"""lot relief
+
+Revision ID: c47e2b9a0f13
+Revises: 8a3f6d2c91b4
+Create Date: 2026-10-18 14:05:27.611392
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c47e2b9a0f13'
+down_revision: Union[str, None] = '8a3f6d2c91b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('realized_pnl', sa.Column('short_term_pnl', sa.Numeric(), nullable=True))
+    op.add_column('realized_pnl', sa.Column('long_term_pnl', sa.Numeric(), nullable=True))
+    op.add_column('position_watermarks', sa.Column('lot_method', sa.String(), nullable=True))
+    op.add_column('position_watermarks', sa.Column('lot_state', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('position_watermarks', 'lot_state')
+    op.drop_column('position_watermarks', 'lot_method')
+    op.drop_column('realized_pnl', 'long_term_pnl')
+    op.drop_column('realized_pnl', 'short_term_pnl')
@@ -0,0 +1,50 @@
+"""period returns
+
+Revision ID: c81f5b3a9e27
+Revises: a4c7d2e9f613
+Create Date: 2026-10-18 19:58:37.602914
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c81f5b3a9e27'
+down_revision: Union[str, None] = 'a4c7d2e9f613'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('portfolio_period_returns',
+    sa.Column('account_id', sa.UUID(), nullable=False),
+    sa.Column('period', sa.String(), nullable=False),
+    sa.Column('as_of_date', sa.Date(), nullable=False),
+    sa.Column('start_date', sa.Date(), nullable=True),
+    sa.Column('twr', sa.Numeric(), nullable=True),
+    sa.Column('mwr', sa.Numeric(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['account_id'], ['accounts.account_id'], ),
+    sa.PrimaryKeyConstraint('account_id', 'period')
+    )
+    op.create_table('user_portfolio_period_returns',
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('period', sa.String(), nullable=False),
+    sa.Column('as_of_date', sa.Date(), nullable=False),
+    sa.Column('start_date', sa.Date(), nullable=True),
+    sa.Column('twr', sa.Numeric(), nullable=True),
+    sa.Column('mwr', sa.Numeric(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.user_id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'period')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('user_portfolio_period_returns')
+    op.drop_table('portfolio_period_returns')
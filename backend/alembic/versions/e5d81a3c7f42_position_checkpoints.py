@@ -0,0 +1,37 @@
+"""position checkpoints
+
+Revision ID: e5d81a3c7f42
+Revises: c47e2b9a0f13
+Create Date: 2026-10-18 15:12:44.208317
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5d81a3c7f42'
+down_revision: Union[str, None] = 'c47e2b9a0f13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('position_checkpoints',
+    sa.Column('account_id', sa.UUID(), nullable=False),
+    sa.Column('as_of_date', sa.Date(), nullable=False),
+    sa.Column('symbol_data', sa.JSON(), nullable=False),
+    sa.Column('lot_method', sa.String(), nullable=True),
+    sa.Column('lot_state', sa.JSON(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['account_id'], ['accounts.account_id'], ),
+    sa.PrimaryKeyConstraint('account_id', 'as_of_date')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('position_checkpoints')
@@ -0,0 +1,28 @@
+"""watermark calendar
+
+Revision ID: f2a6c0d94e18
+Revises: e5d81a3c7f42
+Create Date: 2026-10-18 16:40:09.551873
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2a6c0d94e18'
+down_revision: Union[str, None] = 'e5d81a3c7f42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('position_watermarks', sa.Column('calendar', sa.String(), server_default='all', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('position_watermarks', 'calendar')
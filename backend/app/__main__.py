@@ -7,9 +7,14 @@ from app.importers.schwab_lot_importer import import_schwab_lot_details
 from app.importers.schwab_transactions_importer import import_schwab_transactions
 from app.importers.vanguard_transactions_importer import import_vanguard_transactions
 from app.services.account_service import create_account
+from app.services.benchmark_service import set_benchmark
+from app.services.dry_run_service import dry_run_positions
+from app.services.fetch_scheduler import DEFAULT_FETCH_WORKERS, DEFAULT_RATE, DEFAULT_RETRIES
 from app.services.portfolio_service import recalculate_portfolio_metrics
-from app.services.position_service import recalculate_positions
+from app.services.position_service import recalculate_positions, recalculate_all_positions
+from app.services.price_providers import PRICE_PROVIDERS
 from app.services.price_service import fetch_and_store_prices
+from app.services.risk_service import update_risk_metrics
 from app.services.user_service import create_user
 
 
@@ -39,18 +44,56 @@ def main():
 
     # Recalculate positions
     recalc_parser = subparsers.add_parser("recalculate-positions")
-    recalc_parser.add_argument("--email", required=True)
+    recalc_parser.add_argument("--email")
+    recalc_parser.add_argument("--all", action="store_true", help="Recalculate every account of every user")
+    recalc_parser.add_argument("--workers", type=int, default=1, help="Number of worker processes")
     recalc_parser.add_argument("--initial_load", action="store_true")
+    recalc_parser.add_argument("--incremental", action="store_true",
+                               help="Only replay transactions newer than each account's watermark")
+    recalc_parser.add_argument("--snapshot_storage", default="daily", choices=["daily", "range"],
+                               help="Write one snapshot row per day, or only when a position changes")
+    recalc_parser.add_argument("--lot_method", choices=["fifo", "lifo", "hifo", "specific"],
+                               help="Relieve tax lots with this method instead of average cost")
+    recalc_parser.add_argument("--calendar", default="all", choices=["all", "nyse"],
+                               help="Write snapshots on every day or only on trading sessions")
+    recalc_parser.add_argument("--dry-run", "--dry_run", dest="dry_run", action="store_true",
+                               help="Replay in memory and print what a full recalculation would change")
 
     # Fetch latest prices
     fetch_prices_parser = subparsers.add_parser("fetch-prices",
                                                 help="Fetch current prices for all distinct symbols in positions.")
+    fetch_prices_parser.add_argument("--provider", default="yahoo", choices=PRICE_PROVIDERS,
+                                     help="Where prices come from: Yahoo Finance or a local CSV")
+    fetch_prices_parser.add_argument("--price_file", help="CSV of symbol, date, price for --provider file")
+    fetch_prices_parser.add_argument("--chain_cache",
+                                     help="Directory to keep downloaded option chains in for the rest of the day")
+    fetch_prices_parser.add_argument("--workers", type=int, default=DEFAULT_FETCH_WORKERS,
+                                     help="Remote requests in flight at once")
+    fetch_prices_parser.add_argument("--rate", type=float, default=DEFAULT_RATE,
+                                     help="Remote requests started per second")
+    fetch_prices_parser.add_argument("--retries", type=int, default=DEFAULT_RETRIES,
+                                     help="Retries of a failed request, with exponential backoff")
 
     # Fetch latest prices
     recalculate_portfolio = subparsers.add_parser("recalculate-portfolio",
                                                 help="recalculate portfolio and risk metrics")
-    recalculate_portfolio.add_argument("--email", required=False)
+    recalculate_portfolio.add_argument("--email", help="Only this user; every user when omitted")
     recalculate_portfolio.add_argument("--user", action="store_true", help="Calculate user-level metrics only")
+    recalculate_portfolio.add_argument("--calendar", default="all", choices=["all", "nyse"],
+                                       help="Compute metrics on every snapshot day or only on trading sessions")
+    recalculate_portfolio.add_argument("--incremental", action="store_true",
+                                       help="Append only dates after each metrics watermark")
+
+    recalculate_risk = subparsers.add_parser("recalculate-risk",
+                                             help="Recompute volatility, Sortino, VaR/CVaR and drawdown duration")
+    recalculate_risk.add_argument("--email", help="Only this user's accounts; every user when omitted")
+
+    # Benchmark for the relative metrics
+    benchmark_parser = subparsers.add_parser("set-benchmark", help="Set the benchmark of a user or one of its accounts")
+    benchmark_parser.add_argument("--email", required=True)
+    benchmark_parser.add_argument("--account", help="Account number; the user's benchmark when omitted")
+    benchmark_parser.add_argument("--benchmark", required=True,
+                                  help='A symbol such as "SPY", a blend such as "SPY:0.6,AGG:0.4", or "" to clear')
     
     args = parser.parse_args()
 
@@ -87,16 +130,31 @@ def main():
             print("Unsupported broker or format combination.")
 
     elif args.command == "recalculate-positions":
-        recalculate_positions(args.email, args.initial_load)
+        if args.dry_run:
+            if not args.email and not args.all:
+                recalc_parser.error("either --email or --all is required")
+            if args.initial_load or args.incremental:
+                recalc_parser.error("--dry-run compares against a full replay; drop --initial_load/--incremental")
+            dry_run_positions(None if args.all else args.email, args.snapshot_storage, args.lot_method, args.calendar)
+        elif args.all:
+            recalculate_all_positions(args.initial_load, args.incremental, args.snapshot_storage, args.workers,
+                                      args.lot_method, args.calendar)
+        elif args.email:
+            recalculate_positions(args.email, args.initial_load, args.incremental, args.snapshot_storage,
+                                  args.workers, args.lot_method, args.calendar)
+        else:
+            recalc_parser.error("either --email or --all is required")
     elif args.command == "fetch-prices":
-        fetch_and_store_prices()
+        fetch_and_store_prices(args.provider, args.price_file, args.chain_cache, args.workers, args.rate,
+                               args.retries)
     elif args.command == "recalculate-portfolio":
-        if args.email:
-            # If email is provided, recalculate for specific user
-            recalculate_portfolio_metrics(args.email)
-        else:
-            # Default email if none provided
-            recalculate_portfolio_metrics('venkatachalapatee@gmail.com')
+        # Every user when no email is given; risk is then rewritten only where the metrics were
+        rewritten = recalculate_portfolio_metrics(args.email, args.calendar, args.incremental)
+        update_risk_metrics(args.email, rewritten)
+    elif args.command == "recalculate-risk":
+        update_risk_metrics(args.email)
+    elif args.command == "set-benchmark":
+        set_benchmark(args.email, args.benchmark, args.account)
     else:
         parser.print_help()
 
@@ -1,9 +1,12 @@
-from fastapi import APIRouter, Depends
+from datetime import date
+
+from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 
 from app.db import SessionLocal, get_db
 from app.models import Position
 from app.models.account import Account
+from app.services.checkpoint_service import as_of
 from uuid import UUID
 
 router = APIRouter()
@@ -32,3 +35,26 @@ def get_positions_by_account(account_id: UUID, db: Session = Depends(get_db)):
         }
         for p in positions
     ]
+
+
+@router.get("/{account_id}/positions/as_of")
+def get_positions_as_of(account_id: UUID, as_of_date: date, db: Session = Depends(get_db)):
+    """Holdings at the end of as_of_date, replayed from the nearest earlier month-end checkpoint."""
+    if db.get(Account, account_id) is None:
+        raise HTTPException(status_code=404, detail="Account not found")
+
+    state = as_of(db, account_id, as_of_date)
+    return {
+        "account_id": str(account_id),
+        "as_of_date": as_of_date.isoformat(),
+        "checkpoint_date": state["checkpoint_date"].isoformat() if state["checkpoint_date"] else None,
+        "replayed_transactions": state["replayed_transactions"],
+        "positions": [
+            {
+                "symbol": p["symbol"],
+                "quantity": float(p["quantity"]),
+                "avg_cost": float(p["avg_cost"]) if p["avg_cost"] is not None else None
+            }
+            for p in state["positions"]
+        ]
+    }
@@ -1,12 +1,23 @@
+from datetime import date, timedelta
+from uuid import UUID
+
 from fastapi import APIRouter, Depends
 from sqlalchemy import func
 from sqlalchemy.orm import Session
 
 from app.db import get_db
-from app.models import User, Account, Position, PositionSnapshot, PortfolioMetricsSnapshot, RealizedPnL, UserPortfolioMetricsSnapshot
+from app.models import User, Account, Position, PositionSnapshot, PortfolioMetricsSnapshot, RealizedPnL, UserPortfolioMetricsSnapshot, \
+    PortfolioRollingReturn, PortfolioRiskSnapshot, UserPortfolioRiskSnapshot, PortfolioPeriodReturn, UserPortfolioPeriodReturn
+from app.services.portfolio_service import get_money_weighted_returns
+from app.services.snapshot_store import query_daily_positions
 
 router = APIRouter()
 
+# Metrics columns that stay empty without a benchmark
+BENCHMARK_METRICS = ("benchmark_value", "benchmark_daily_return", "alpha_to_date", "beta_to_date",
+                     "tracking_error_to_date", "information_ratio_to_date")
+RISK_METRICS = ("volatility", "sortino", "historical_var", "historical_cvar", "parametric_var", "parametric_cvar")
+
 
 @router.get("/")
 def list_users(db: Session = Depends(get_db)):
@@ -80,6 +91,29 @@ def get_positions(user_id: str, db: Session = Depends(get_db)):
     }
 
 
+@router.get("/{user_id}/positions/history")
+def get_position_history(user_id: str, start_date: date | None = None, end_date: date | None = None,
+                         db: Session = Depends(get_db)):
+    """Daily positions per account; range-encoded snapshots are expanded back to one point per day."""
+    end_date = end_date or date.today()
+    start_date = start_date or end_date - timedelta(days=30)
+    account_ids = [account_id for (account_id,) in db.query(Account.account_id).filter(Account.user_id == user_id)]
+
+    points = query_daily_positions(db, account_ids, start_date, end_date)
+    return {
+        "positions": [
+            {
+                "as_of_date": point["as_of_date"].isoformat(),
+                "account_id": str(point["account_id"]),
+                "symbol": point["symbol"],
+                "quantity": float(point["quantity"]),
+                "avg_cost": float(point["avg_cost"]) if point["avg_cost"] is not None else None,
+            }
+            for point in points
+        ]
+    }
+
+
 @router.get("/{user_id}/portfolio/summary")
 def portf(user_id: str, db: Session = Depends(get_db)):
     # Step 1: Get all account_ids for the user
@@ -125,6 +159,21 @@ def get_rolling_returns(user_id: str, db: Session = Depends(get_db)):
         .all()
     )
 
+    # Every stored window (7d, 30d, 90d, 252d, ytd, ...) keyed by account and date
+    windows = {}
+    for account_id, snapshot_date, window, rolling_return in (
+        db.query(
+            PortfolioRollingReturn.account_id,
+            PortfolioRollingReturn.snapshot_date,
+            PortfolioRollingReturn.window,
+            PortfolioRollingReturn.rolling_return
+        )
+        .join(Account, PortfolioRollingReturn.account_id == Account.account_id)
+        .filter(Account.user_id == user_id)
+        .all()
+    ):
+        windows.setdefault((account_id, snapshot_date), {})[window] = float(rolling_return or 0)
+
     return {
         "returns": [
             {
@@ -133,6 +182,7 @@ def get_rolling_returns(user_id: str, db: Session = Depends(get_db)):
                 "account_number": account_number,
                 "rolling_return_7d": float(rolling_7d or 0),
                 "rolling_return_30d": float(rolling_30d or 0),
+                "windows": windows.get((account_id, snapshot_date), {}),
             }
             for snapshot_date, account_id, account_number, rolling_7d, rolling_30d in results
         ]
@@ -161,12 +211,103 @@ def get_user_portfolio_metrics(user_id: str, db: Session = Depends(get_db)):
                 "rolling_return_30d": float(metric.rolling_return_30d or 0),
                 "sharpe_to_date": float(metric.sharpe_to_date or 0),
                 "drawdown_to_date": float(metric.drawdown_to_date or 0),
+                **{
+                    column: float(getattr(metric, column)) if getattr(metric, column) is not None else None
+                    for column in BENCHMARK_METRICS
+                },
             }
             for metric in results
         ]
     }
 
 
+@router.get("/{user_id}/portfolio/risk")
+def get_user_portfolio_risk(user_id: str, db: Session = Depends(get_db)):
+    """Risk per snapshot date for the user's combined accounts and for each account."""
+    user_risk = (
+        db.query(UserPortfolioRiskSnapshot)
+        .filter(UserPortfolioRiskSnapshot.user_id == user_id)
+        .order_by(UserPortfolioRiskSnapshot.snapshot_date.asc())
+        .all()
+    )
+    account_risk = (
+        db.query(PortfolioRiskSnapshot, Account.account_number)
+        .join(Account, PortfolioRiskSnapshot.account_id == Account.account_id)
+        .filter(Account.user_id == user_id)
+        .order_by(PortfolioRiskSnapshot.snapshot_date.asc())
+        .all()
+    )
+
+    return {
+        "risk": [{"snapshot_date": risk.snapshot_date.isoformat(), **risk_values(risk)} for risk in user_risk],
+        "accounts": [
+            {
+                "snapshot_date": risk.snapshot_date.isoformat(),
+                "account_id": str(risk.account_id),
+                "account_number": account_number,
+                **risk_values(risk),
+            }
+            for risk, account_number in account_risk
+        ]
+    }
+
+
+def risk_values(risk) -> dict:
+    # Empty until a window has enough returns
+    return {
+        column: float(getattr(risk, column)) if getattr(risk, column) is not None else None
+        for column in RISK_METRICS
+    } | {"max_drawdown_duration": risk.max_drawdown_duration}
+
+
+@router.get("/{user_id}/portfolio/xirr")
+def get_user_portfolio_xirr(user_id: UUID, start_date: date | None = None, end_date: date | None = None,
+                            db: Session = Depends(get_db)):
+    """Money-weighted return (XIRR) of the user and of each account, from inception and through today by default."""
+    returns = get_money_weighted_returns(user_id, start_date, end_date, db)
+    return {
+        "start_date": start_date.isoformat() if start_date else None,
+        "end_date": (end_date or date.today()).isoformat(),
+        "xirr": returns["xirr"],
+        "accounts": [{**account, "account_id": str(account["account_id"])} for account in returns["accounts"]],
+    }
+
+
+@router.get("/{user_id}/portfolio/period-returns")
+def get_user_period_returns(user_id: str, db: Session = Depends(get_db)):
+    """MTD, QTD, YTD, 1Y and since-inception TWR and MWR of the user and each account, as of the latest metrics."""
+    user_returns = db.query(UserPortfolioPeriodReturn).filter(UserPortfolioPeriodReturn.user_id == user_id).all()
+    account_returns = (
+        db.query(PortfolioPeriodReturn, Account.account_number)
+        .join(Account, PortfolioPeriodReturn.account_id == Account.account_id)
+        .filter(Account.user_id == user_id)
+        .all()
+    )
+
+    accounts = {}
+    for period_return, account_number in account_returns:
+        account = accounts.setdefault(period_return.account_id, {
+            "account_id": str(period_return.account_id),
+            "account_number": account_number,
+            "periods": {},
+        })
+        account["periods"][period_return.period] = period_values(period_return)
+
+    return {
+        "as_of_date": user_returns[0].as_of_date.isoformat() if user_returns else None,
+        "periods": {period_return.period: period_values(period_return) for period_return in user_returns},
+        "accounts": list(accounts.values()),
+    }
+
+
+def period_values(period_return) -> dict:
+    return {
+        "start_date": period_return.start_date.isoformat() if period_return.start_date else None,
+        "twr": float(period_return.twr) if period_return.twr is not None else None,
+        "mwr": float(period_return.mwr) if period_return.mwr is not None else None,
+    }
+
+
 @router.get("/{user_id}/accounts")
 def get_accounts_by_email(user_id: str, db: Session = Depends(get_db)):
     accounts = db.query(Account).filter(Account.user_id == user_id).all()
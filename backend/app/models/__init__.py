@@ -8,3 +8,14 @@ from .price import Price
 from .realized_pnl import RealizedPnL
 from .portfolio_metrics_snapshot import PortfolioMetricsSnapshot
 from .user_portfolio_metrics_snapshot import UserPortfolioMetricsSnapshot
+from .position_watermark import PositionWatermark
+from .position_snapshot_range import PositionSnapshotRange
+from .position_checkpoint import PositionCheckpoint
+from .portfolio_rolling_return import PortfolioRollingReturn
+from .user_portfolio_rolling_return import UserPortfolioRollingReturn
+from .portfolio_metrics_watermark import PortfolioMetricsWatermark
+from .user_portfolio_metrics_watermark import UserPortfolioMetricsWatermark
+from .portfolio_risk_snapshot import PortfolioRiskSnapshot
+from .user_portfolio_risk_snapshot import UserPortfolioRiskSnapshot
+from .portfolio_period_return import PortfolioPeriodReturn
+from .user_portfolio_period_return import UserPortfolioPeriodReturn
@@ -14,5 +14,6 @@ class Account(Base):
     brokerage = Column(String, nullable=False)
     account_number = Column(String, nullable=True)
     nickname = Column(String, nullable=True)
+    benchmark = Column(String, nullable=True)  # overrides the user's benchmark
     created_at = Column(DateTime, default=func.now())
 
@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Date, DateTime, ForeignKey, JSON, String, UUID, func
+
+from app.db import Base
+
+
+class PortfolioMetricsWatermark(Base):
+    __tablename__ = "portfolio_metrics_watermarks"
+
+    account_id = Column(UUID, ForeignKey("accounts.account_id"), primary_key=True)
+    calendar = Column(String, nullable=False, default="all")  # trading calendar the metrics were computed on
+    processed_through = Column(Date, nullable=False)  # last metrics snapshot date written
+    upstream_checksum = Column(String, nullable=False)  # snapshots and cash flows on/before processed_through
+    state = Column(JSON, nullable=True)  # running TWR, peak and recent returns; None forces a rebuild
+    updated_at = Column(DateTime, nullable=False, default=func.now())
+
+    def __repr__(self):
+        return f"<PortfolioMetricsWatermark(account_id={self.account_id}, processed_through={self.processed_through})>"
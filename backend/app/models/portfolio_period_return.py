@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Date, UUID, ForeignKey, Numeric, DateTime, String, func
+
+from app.db import Base
+
+
+class PortfolioPeriodReturn(Base):
+    """Return of an account over a standard period ("mtd", "qtd", "ytd", "1y", "itd") to its latest metrics date."""
+    __tablename__ = "portfolio_period_returns"
+
+    account_id = Column(UUID, ForeignKey("accounts.account_id"), primary_key=True)
+    period = Column(String, primary_key=True)
+
+    as_of_date = Column(Date, nullable=False)
+    start_date = Column(Date, nullable=True)  # last date before the period; empty since inception
+    twr = Column(Numeric)
+    mwr = Column(Numeric)  # XIRR, annualized
+
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
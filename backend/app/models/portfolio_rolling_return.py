@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Date, UUID, ForeignKey, Numeric, DateTime, String, func
+
+from app.db import Base
+
+
+class PortfolioRollingReturn(Base):
+    """Rolling return of an account per snapshot date and window ("7d", "252d", "ytd", ...), one row each."""
+    __tablename__ = "portfolio_rolling_returns"
+
+    account_id = Column(UUID, ForeignKey("accounts.account_id"), primary_key=True)
+    snapshot_date = Column(Date, primary_key=True)
+    window = Column(String, primary_key=True)
+
+    rolling_return = Column(Numeric)
+
+    created_at = Column(DateTime, default=func.now())
@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Date, DateTime, ForeignKey, JSON, String, func
+from sqlalchemy.dialects.postgresql import UUID
+
+from app.db import Base
+
+
+class PositionCheckpoint(Base):
+    """Per-symbol replay state (qty, total_cost, first_action) at the end of a month."""
+    __tablename__ = "position_checkpoints"
+
+    account_id = Column(UUID(as_uuid=True), ForeignKey("accounts.account_id"), primary_key=True)
+    as_of_date = Column(Date, primary_key=True)
+    symbol_data = Column(JSON, nullable=False)  # serialized like the watermark's symbol_data
+    lot_method = Column(String, nullable=True)
+    lot_state = Column(JSON, nullable=True)  # serialized open lots, only with lot-level relief
+    created_at = Column(DateTime, nullable=False, default=func.now())
+
+    def __repr__(self):
+        return f"<PositionCheckpoint(account_id={self.account_id}, as_of_date={self.as_of_date})>"
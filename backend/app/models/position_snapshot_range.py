@@ -0,0 +1,28 @@
+import uuid
+
+from sqlalchemy import Column, String, Numeric, Date, ForeignKey, Index, Enum as SqlEnum
+from sqlalchemy.dialects.postgresql import UUID
+
+from app.db import Base
+from app.models.transaction_type import TransactionType
+
+
+class PositionSnapshotRange(Base):
+    """A position held unchanged from valid_from through valid_to (both inclusive)."""
+    __tablename__ = "position_snapshot_ranges"
+
+    range_id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    account_id = Column(UUID(as_uuid=True), ForeignKey("accounts.account_id"), nullable=False)
+    symbol = Column(String, nullable=False)
+    quantity = Column(Numeric, nullable=False)
+    avg_cost = Column(Numeric, nullable=True)
+    valid_from = Column(Date, nullable=False)
+    valid_to = Column(Date, nullable=False)  # last replayed day the position was unchanged
+    action = Column(SqlEnum(TransactionType, native_enum=False), nullable=False)
+
+    __table_args__ = (
+        Index("ix_position_snapshot_ranges_account_valid_to", "account_id", "valid_to"),
+    )
+
+    def __repr__(self):
+        return f"<PositionSnapshotRange(account_id={self.account_id}, symbol={self.symbol}, quantity={self.quantity}, valid_from={self.valid_from}, valid_to={self.valid_to})>"
@@ -0,0 +1,24 @@
+from sqlalchemy import Column, Date, DateTime, ForeignKey, Integer, JSON, String, func
+from sqlalchemy.dialects.postgresql import UUID
+
+from app.db import Base
+
+
+class PositionWatermark(Base):
+    __tablename__ = "position_watermarks"
+
+    account_id = Column(UUID(as_uuid=True), ForeignKey("accounts.account_id"), primary_key=True)
+    snapshot_storage = Column(String, nullable=False, default="daily")  # "daily" or "range"
+    calendar = Column(String, nullable=False, default="all")  # trading calendar snapshots are written on
+    replay_start = Column(Date, nullable=False)  # first day replayed day-by-day
+    processed_through = Column(Date, nullable=False)  # last snapshot date written
+    last_transaction_id = Column(UUID(as_uuid=True), nullable=True)
+    last_transaction_date = Column(Date, nullable=True)
+    transaction_count = Column(Integer, nullable=False)  # transactions dated on/before processed_through
+    symbol_data = Column(JSON, nullable=False)  # serialized per-symbol state at processed_through
+    lot_method = Column(String, nullable=True)  # fifo/lifo/hifo/specific, or None for average cost
+    lot_state = Column(JSON, nullable=True)  # serialized open lots at processed_through
+    updated_at = Column(DateTime, nullable=False, default=func.now())
+
+    def __repr__(self):
+        return f"<PositionWatermark(account_id={self.account_id}, processed_through={self.processed_through})>"
@@ -23,6 +23,8 @@ class RealizedPnL(Base):
     quantity_closed = Column(Numeric, nullable=False)
     cost_basis = Column(Numeric, nullable=True)
     proceeds = Column(Numeric, nullable=True)
+    short_term_pnl = Column(Numeric, nullable=True)  # only with lot-level relief
+    long_term_pnl = Column(Numeric, nullable=True)
 
     action = Column(SqlEnum(TransactionType, native_enum=False), nullable=False)
     instrument_type = Column(String, nullable=False)  # stock/option
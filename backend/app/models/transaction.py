@@ -1,6 +1,6 @@
 import uuid
 
-from sqlalchemy import Column, String, Numeric, Date, ForeignKey, JSON, Enum as SqlEnum
+from sqlalchemy import Column, String, Numeric, Date, DateTime, ForeignKey, JSON, Enum as SqlEnum, func
 from sqlalchemy.dialects.postgresql import UUID
 
 from app.db import Base
@@ -23,3 +23,4 @@ class Transaction(Base):
     option_details = Column(JSON, nullable=True)
     journal_details = Column(JSON, nullable=True)
     source = Column(String, nullable=True)
+    created_at = Column(DateTime, server_default=func.now())  # used to detect back-dated imports
@@ -13,4 +13,5 @@ class User(Base):
     user_id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     email = Column(String, unique=True, nullable=True)
     name = Column(String, nullable=True)
+    benchmark = Column(String, nullable=True)  # "SPY" or a blend such as "SPY:0.6,AGG:0.4"
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -20,5 +20,9 @@ class UserPortfolioMetricsSnapshot(Base):
     rolling_return_30d = Column(Numeric)
     sharpe_to_date = Column(Numeric)
     drawdown_to_date = Column(Numeric)
+    alpha_to_date = Column(Numeric)
+    beta_to_date = Column(Numeric)
+    tracking_error_to_date = Column(Numeric)
+    information_ratio_to_date = Column(Numeric)
 
     created_at = Column(DateTime, default=func.now())
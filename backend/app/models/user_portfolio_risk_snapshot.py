@@ -0,0 +1,21 @@
+from sqlalchemy import Column, Date, UUID, ForeignKey, Numeric, Integer, DateTime, func
+
+from app.db import Base
+
+
+class UserPortfolioRiskSnapshot(Base):
+    """Risk of a user's combined accounts per snapshot date, over the trailing returns window of risk_service."""
+    __tablename__ = "user_portfolio_risk_snapshots"
+
+    user_id = Column(UUID, ForeignKey("users.user_id"), primary_key=True)
+    snapshot_date = Column(Date, primary_key=True)
+
+    volatility = Column(Numeric)  # annualized
+    sortino = Column(Numeric)  # annualized
+    historical_var = Column(Numeric)  # one-day loss, as a positive fraction
+    historical_cvar = Column(Numeric)
+    parametric_var = Column(Numeric)
+    parametric_cvar = Column(Numeric)
+    max_drawdown_duration = Column(Integer)  # longest stretch below a previous peak to date, in days
+
+    created_at = Column(DateTime, default=func.now())
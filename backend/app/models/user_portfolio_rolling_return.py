@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Date, UUID, ForeignKey, Numeric, DateTime, String, func
+
+from app.db import Base
+
+
+class UserPortfolioRollingReturn(Base):
+    """Rolling return across all of a user's accounts per snapshot date and window, one row each."""
+    __tablename__ = "user_portfolio_rolling_returns"
+
+    user_id = Column(UUID, ForeignKey("users.user_id"), primary_key=True)
+    snapshot_date = Column(Date, primary_key=True)
+    window = Column(String, primary_key=True)
+
+    rolling_return = Column(Numeric)
+
+    created_at = Column(DateTime, default=func.now())
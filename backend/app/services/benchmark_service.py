@@ -0,0 +1,159 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+from sqlalchemy.orm import Session
+
+from app.db import SessionLocal
+from app.models import Account, Price, User
+
+session: Session = SessionLocal()
+
+TRADING_DAYS = 252
+
+# A benchmark level needs a price on or before the first metrics date; older ones than this are not read
+PRICE_LOOKBACK = timedelta(days=10)
+
+# Running sums behind the to-date relative metrics: count, p, b, p*b, b*b, a, a*a (a = p - b)
+RELATIVE_SUMS = 7
+
+
+def parse_benchmark(spec: str | None) -> dict[str, float]:
+    """
+    "SPY" or a blend such as "SPY:0.6,AGG:0.4" as symbol -> weight, weights normalized to sum to 1.
+    None or an empty spec means no benchmark.
+    """
+    if not spec or not spec.strip():
+        return {}
+
+    weights = {}
+    for part in spec.split(","):
+        symbol, _, weight = part.strip().partition(":")
+        symbol = symbol.strip().upper()
+        if not symbol:
+            raise ValueError(f"Invalid benchmark: {spec}")
+        try:
+            weights[symbol] = weights.get(symbol, 0.0) + (float(weight) if weight else 1.0)
+        except ValueError:
+            raise ValueError(f"Invalid benchmark weight in: {spec}") from None
+
+    total = sum(weights.values())
+    if total <= 0 or any(weight < 0 for weight in weights.values()):
+        raise ValueError(f"Benchmark weights must be non-negative and sum to more than 0: {spec}")
+    return {symbol: weight / total for symbol, weight in weights.items()}
+
+
+def account_benchmark(account: Account, user: User) -> str | None:
+    """The account's own benchmark, else its user's."""
+    return account.benchmark or user.benchmark
+
+
+def configured_benchmark_symbols() -> set[str]:
+    """Every symbol a user or account benchmark refers to, so fetch-prices stores them too."""
+    specs = [spec for spec, in session.query(User.benchmark).filter(User.benchmark.isnot(None))]
+    specs += [spec for spec, in session.query(Account.benchmark).filter(Account.benchmark.isnot(None))]
+    return {symbol for spec in specs for symbol in parse_benchmark(spec)}
+
+
+def load_benchmark_prices(symbols, from_date: date) -> pd.DataFrame:
+    """Stored prices of the symbols from PRICE_LOOKBACK before from_date on, in one range query, as dates x symbols."""
+    if not symbols:
+        return pd.DataFrame(dtype=float)
+
+    rows = session.query(Price.price_date, Price.symbol, Price.price).filter(
+        Price.symbol.in_(sorted(symbols)),
+        Price.price_date >= from_date - PRICE_LOOKBACK
+    ).all()
+    frame = pd.DataFrame([(day, symbol, float(price)) for day, symbol, price in rows],
+                         columns=["date", "symbol", "price"])
+    return frame.pivot(index="date", columns="symbol", values="price").sort_index()
+
+
+def compute_benchmark_levels(weights: dict[str, float], prices: pd.DataFrame, index: pd.Index,
+                             level: float | None = None) -> tuple[pd.Series, pd.Series]:
+    """
+    Benchmark level and daily return on each date of index, from prices as of each date.
+
+    A blend is rebalanced to its weights on every date, so its return is the weighted sum of the
+    symbols' returns. The level starts at the weighted price on the first date every symbol has a
+    price (a single symbol's level is its price) and compounds from there; pass level to continue from
+    the level stored for index[0]. Dates before every symbol has a price get NaN.
+    """
+    symbols = list(weights)
+    aligned = prices.reindex(columns=symbols)
+    aligned = aligned.reindex(aligned.index.union(index)).ffill().reindex(index)
+    weight = np.array([weights[symbol] for symbol in symbols])
+
+    daily_returns = (aligned.pct_change(fill_method=None) * weight).sum(axis=1, min_count=len(symbols))
+    complete = aligned.notna().all(axis=1).to_numpy()
+    levels = pd.Series(np.nan, index=index)
+    if not complete.any():
+        return levels, daily_returns
+
+    start = int(np.argmax(complete))
+    factors = 1 + daily_returns.iloc[start:]
+    if level is not None and start == 0:
+        factors.iloc[0] = level
+    else:
+        factors.iloc[0] = float((aligned.iloc[start] * weight).sum())
+    levels.iloc[start:] = factors.cumprod()
+    return levels, daily_returns
+
+
+def compute_relative_metrics(portfolio_returns: pd.Series, benchmark_returns: pd.Series,
+                             sums: list[float] | None = None) -> tuple[pd.DataFrame, list[float]]:
+    """
+    Alpha, beta, tracking error and information ratio to each date (annualized over TRADING_DAYS),
+    from expanding sums of the daily return pairs. Dates where either return is missing are skipped.
+    sums continues the running sums of an earlier run; the final sums are returned to store.
+    """
+    p = portfolio_returns.to_numpy(dtype=float)
+    b = benchmark_returns.reindex(portfolio_returns.index).to_numpy(dtype=float)
+    valid = np.isfinite(p) & np.isfinite(b)
+    p, b = np.where(valid, p, 0.0), np.where(valid, b, 0.0)
+    a = p - b
+
+    terms = np.column_stack([valid.astype(float), p, b, p * b, b * b, a, a * a])
+    seed = np.array(sums if sums is not None else [0.0] * RELATIVE_SUMS)
+    totals = np.cumsum(np.vstack([seed, terms]), axis=0)[1:]
+    n, sum_p, sum_b, sum_pb, sum_bb, sum_a, sum_aa = totals.T
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ddof = np.where(n > 1, n - 1, np.nan)
+        mean_p, mean_b, mean_a = sum_p / n, sum_b / n, sum_a / n
+        covariance = (sum_pb - n * mean_p * mean_b) / ddof
+        variance_b = (sum_bb - n * mean_b * mean_b) / ddof
+        variance_a = np.maximum(sum_aa - n * mean_a * mean_a, 0.0) / ddof
+
+        beta = covariance / variance_b
+        alpha = (mean_p - beta * mean_b) * TRADING_DAYS
+        tracking_error = np.sqrt(variance_a * TRADING_DAYS)
+        information_ratio = mean_a * TRADING_DAYS / tracking_error
+
+    metrics = pd.DataFrame({
+        "alpha": alpha,
+        "beta": beta,
+        "tracking_error": tracking_error,
+        "information_ratio": information_ratio,
+    }, index=portfolio_returns.index)
+    final_sums = [float(total) for total in totals[-1]] if len(totals) else [float(total) for total in seed]
+    return metrics.replace([np.inf, -np.inf], np.nan), final_sums
+
+
+def set_benchmark(email: str, spec: str | None, account_number: str | None = None):
+    """Sets (or with an empty spec clears) the benchmark of a user, or of one of the user's accounts."""
+    parse_benchmark(spec)  # validate before storing
+    user = session.query(User).filter_by(email=email).first()
+    if not user:
+        raise ValueError(f"No user found with email: {email}")
+
+    target = user
+    if account_number is not None:
+        target = session.query(Account).filter_by(user_id=user.user_id, account_number=account_number).first()
+        if not target:
+            raise ValueError(f"No account {account_number} for {email}")
+
+    target.benchmark = spec.strip() if spec and spec.strip() else None
+    session.commit()
+    owner = f"account {account_number}" if account_number is not None else email
+    print(f"✅ Benchmark for {owner}: {target.benchmark or 'none'}")
@@ -0,0 +1,152 @@
+import io
+import json
+from datetime import date, datetime
+
+from sqlalchemy import Enum, JSON, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+COPY_NULL = "\\N"
+
+# PostgreSQL allows 65535 bind parameters per statement; stay well below it
+MAX_BIND_PARAMETERS = 30_000
+
+
+def bulk_insert(session: Session, model, rows: list[dict]) -> int:
+    """
+    Inserts rows (column name -> value) for model in as few statements as the database allows:
+    a single COPY FROM STDIN on PostgreSQL, one executemany INSERT everywhere else (e.g. SQLite in tests).
+    Python-side column defaults are filled in first, so both paths write the same values.
+    """
+    if not rows:
+        return 0
+
+    table = model.__table__
+    rows = fill_defaults(session, table, rows)
+
+    # Anything the ORM still has pending (deletes, parent rows) must reach the database first
+    session.flush()
+
+    if session.get_bind().dialect.name == "postgresql":
+        copy_rows(session, table, rows)
+    else:
+        session.execute(insert(table), rows)
+    return len(rows)
+
+
+def bulk_upsert(session: Session, model, rows: list[dict]) -> int:
+    """
+    Inserts rows for model, updating the rows whose primary key already exists, as multi-row
+    INSERT ... ON CONFLICT (primary key) DO UPDATE statements sized to stay under the bind-parameter
+    limit. Only the columns given in rows are updated, so defaults such as created_at keep their first
+    value. Works on PostgreSQL and SQLite; other databases fall back to session.merge per row.
+    """
+    if not rows:
+        return 0
+
+    table = model.__table__
+    primary_key = [column.name for column in table.primary_key.columns]
+    updated = [name for name in rows[0] if name not in primary_key]
+    rows = fill_defaults(session, table, rows)
+    session.flush()
+
+    dialect = session.get_bind().dialect.name
+    if dialect not in ("postgresql", "sqlite"):
+        for row in rows:
+            session.merge(model(**row))
+        return len(rows)
+
+    upsert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    batch_size = max(1, MAX_BIND_PARAMETERS // len(rows[0]))
+    for start in range(0, len(rows), batch_size):
+        statement = upsert(table).values(rows[start:start + batch_size])
+        if updated:
+            statement = statement.on_conflict_do_update(
+                index_elements=primary_key,
+                set_={name: statement.excluded[name] for name in updated}
+            )
+        else:
+            statement = statement.on_conflict_do_nothing(index_elements=primary_key)
+        session.execute(statement)
+    return len(rows)
+
+
+def fill_defaults(session: Session, table, rows: list[dict]) -> list[dict]:
+    defaults = {}
+    for column in table.columns:
+        if column.name in rows[0] or column.default is None:
+            continue
+        if column.default.is_clause_element:
+            # e.g. func.now(): evaluate once so every row gets the same server timestamp
+            defaults[column.name] = session.execute(select(column.default.arg)).scalar()
+        elif column.default.is_callable:
+            defaults[column.name] = column.default.arg
+        else:
+            defaults[column.name] = column.default.arg
+
+    names = [column.name for column in table.columns if column.name in rows[0] or column.name in defaults]
+    filled = []
+    for row in rows:
+        values = {}
+        for name in names:
+            if name in row:
+                values[name] = row[name]
+            elif table.columns[name].default.is_callable:
+                values[name] = defaults[name](None)  # wrapped by SQLAlchemy to take an execution context
+            else:
+                values[name] = defaults[name]
+        filled.append(values)
+    return filled
+
+
+def copy_rows(session: Session, table, rows: list[dict]):
+    dialect = session.get_bind().dialect
+    names = list(rows[0].keys())
+    # Only Enum (stored by name) and JSON need the type's own conversion; Decimal, UUID and dates
+    # are written as text directly so numerics keep their exact value
+    processors = [
+        table.columns[name].type.bind_processor(dialect)
+        if isinstance(table.columns[name].type, (Enum, JSON)) else None
+        for name in names
+    ]
+
+    buffer = io.StringIO()
+    for row in rows:
+        record = []
+        for name, processor in zip(names, processors):
+            value = row[name]
+            if processor is not None and value is not None:
+                value = processor(value)
+            record.append(to_copy_field(value))
+        buffer.write(",".join(record) + "\n")
+    buffer.seek(0)
+
+    columns = ", ".join(f'"{name}"' for name in names)
+    sql = f'COPY "{table.name}" ({columns}) FROM STDIN WITH (FORMAT csv, NULL \'{COPY_NULL}\')'
+
+    # Use the DBAPI connection behind the session so the COPY joins its transaction
+    dbapi_connection = session.connection().connection
+    with dbapi_connection.cursor() as cursor:
+        cursor.copy_expert(sql, buffer)
+
+
+def to_copy_field(value) -> str:
+    """
+    A CSV field for COPY: NULL unquoted, every value quoted. COPY only reads unquoted fields as NULL,
+    so text that happens to spell COPY_NULL (or is empty) stays text.
+    """
+    if value is None:
+        return COPY_NULL
+    return '"' + to_copy_text(value).replace('"', '""') + '"'
+
+
+def to_copy_text(value) -> str:
+    if value is None:
+        return COPY_NULL
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return str(value)  # UUID, Decimal, str
@@ -0,0 +1,98 @@
+from datetime import date
+from uuid import UUID
+
+from sqlalchemy.orm import Session
+
+from app.models import PositionCheckpoint, PositionWatermark
+from app.models.transaction import Transaction
+from app.services.lot_engine import LotLedger
+from app.services.position_service import aggregate_transactions, apply_day_transactions, deserialize_symbol_data
+from app.services.snapshot_store import snapshot_rows
+from app.services.trading_calendar import get_calendar
+
+
+def as_of(db: Session, account_id: UUID, as_of_date: date) -> dict:
+    """
+    Positions held by an account at the end of as_of_date, without reading daily snapshots.
+
+    Starts from the nearest earlier month-end checkpoint (or the watermark, when the date is past
+    it) and replays only the transactions after it, so the result matches that day's snapshot.
+    Without a usable checkpoint the state is rebuilt the way the replay does it: no cash tracking
+    before the watermark's replay start, day-by-day cash after it (or from the first transaction
+    for dates before the replay start).
+    """
+    watermark = db.get(PositionWatermark, account_id)
+    base = nearest_checkpoint(db, account_id, as_of_date, watermark)
+    # Transactions dated on a non-session day only count from the next session on
+    through = get_calendar(watermark.calendar if watermark else None).roll_back(as_of_date)
+
+    if base is not None:
+        base_date = base.processed_through if isinstance(base, PositionWatermark) else base.as_of_date
+        symbol_data = deserialize_symbol_data(base.symbol_data)
+        lots = LotLedger.from_dict(base.lot_state) if base.lot_state else None
+        txns = load_transactions_between(db, account_id, base_date, through)
+        apply_day_transactions(symbol_data, txns, lots=lots)
+    else:
+        base_date = None
+        txns = load_transactions_between(db, account_id, None, through)
+        if watermark is not None and watermark.replay_start <= as_of_date:
+            lots = LotLedger(watermark.lot_method) if watermark.lot_method else None
+            symbol_data, _ = aggregate_transactions([txn for txn in txns if txn.date < watermark.replay_start],
+                                                    track_cash=False, lots=lots)
+            apply_day_transactions(symbol_data, [txn for txn in txns if txn.date >= watermark.replay_start], lots=lots)
+        else:
+            # Earlier snapshots come from a replay that started at the first transaction
+            lot_method = earlier_lot_method(db, account_id, watermark)
+            lots = LotLedger(lot_method) if lot_method else None
+            symbol_data, _ = aggregate_transactions(txns, lots=lots)
+
+    return {
+        "account_id": account_id,
+        "as_of_date": as_of_date,
+        "checkpoint_date": base_date,
+        "replayed_transactions": len(txns),
+        "positions": [
+            {"symbol": symbol, "quantity": quantity, "avg_cost": avg_cost, "action": action}
+            for symbol, quantity, avg_cost, action in snapshot_rows(symbol_data)
+        ],
+    }
+
+
+def nearest_checkpoint(db: Session, account_id: UUID, as_of_date: date, watermark: PositionWatermark | None):
+    """
+    Latest stored state on or before as_of_date: the watermark or a month-end checkpoint, if any.
+    Checkpoints before the watermark's replay start belong to an earlier replay, so they only answer
+    dates before it, and dates from the replay start on only use checkpoints of the last replay.
+    """
+    if watermark is not None and as_of_date >= watermark.processed_through:
+        return watermark
+
+    query = db.query(PositionCheckpoint).filter(
+        PositionCheckpoint.account_id == account_id,
+        PositionCheckpoint.as_of_date <= as_of_date
+    )
+    if watermark is not None and as_of_date >= watermark.replay_start:
+        query = query.filter(PositionCheckpoint.as_of_date >= watermark.replay_start)
+    elif watermark is not None:
+        query = query.filter(PositionCheckpoint.as_of_date < watermark.replay_start)
+    return query.order_by(PositionCheckpoint.as_of_date.desc()).first()
+
+
+def earlier_lot_method(db: Session, account_id: UUID, watermark: PositionWatermark | None) -> str | None:
+    """Lot method of the replay that wrote the history before the watermark's replay start."""
+    if watermark is None:
+        return None
+    first = (
+        db.query(PositionCheckpoint.lot_method)
+        .filter(PositionCheckpoint.account_id == account_id, PositionCheckpoint.as_of_date < watermark.replay_start)
+        .order_by(PositionCheckpoint.as_of_date.asc())
+        .first()
+    )
+    return first.lot_method if first else watermark.lot_method
+
+
+def load_transactions_between(db: Session, account_id: UUID, after: date | None, through: date) -> list[Transaction]:
+    query = db.query(Transaction).filter(Transaction.account_id == account_id, Transaction.date <= through)
+    if after is not None:
+        query = query.filter(Transaction.date > after)
+    return query.order_by(Transaction.date.asc()).all()
@@ -0,0 +1,201 @@
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Type
+
+import dateutil.utils
+from sqlalchemy.orm import Session
+
+from app.db import SessionLocal
+from app.models import PositionSnapshot, PositionSnapshotRange, RealizedPnL, TransactionType
+from app.models.account import Account
+from app.models.position import Position
+from app.models.user import User
+from app.services.lot_engine import LotLedger
+from app.services.position_service import (
+    CUTOFF_DATE, aggregate_transactions, iter_replay, load_transactions, position_rows, realized_pnl_rows
+)
+from app.services.snapshot_store import expand_snapshot_ranges, get_snapshot_store, snapshot_rows
+from app.services.trading_calendar import get_calendar
+
+session: Session = SessionLocal()
+
+# Rows of each kind printed per account; the counts always cover everything
+DIFF_SAMPLE_ROWS = 5
+
+
+@dataclass
+class RowDiff:
+    """Keyed differences between stored rows and the rows a full replay would write."""
+    added: list[tuple] = field(default_factory=list)  # (key, new)
+    removed: list[tuple] = field(default_factory=list)  # (key, old)
+    changed: list[tuple] = field(default_factory=list)  # (key, old, new)
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed)
+
+
+def dry_run_positions(email: str | None = None, snapshot_storage: str = "daily", lot_method: str | None = None,
+                      calendar: str = "all") -> dict[str, dict[str, RowDiff]]:
+    """
+    Replays every account of the user (or of every user when email is None) in memory and prints
+    what a full recalculation would add, remove and change. Nothing is written.
+    """
+    query = session.query(Account)
+    if email is not None:
+        user = session.query(User).filter_by(email=email).first()
+        if not user:
+            raise ValueError(f"No user found with email: {email}")
+        query = query.filter_by(user_id=user.user_id)
+
+    diffs = {}
+    try:
+        for account in query.order_by(Account.user_id).all():
+            diffs[str(account.account_id)] = dry_run_account(account, snapshot_storage, lot_method, calendar)
+            print_account_diff(str(account.account_id), diffs[str(account.account_id)])
+    finally:
+        session.rollback()
+
+    changed = sum(1 for account_diff in diffs.values() if any(account_diff.values()))
+    print(f"✅ Dry run: {changed} of {len(diffs)} account(s) would change")
+    return diffs
+
+
+def dry_run_account(account: Type[Account], snapshot_storage: str = "daily", lot_method: str | None = None,
+                    calendar: str = "all") -> dict[str, RowDiff]:
+    """Full replay of one account into dicts keyed like the tables, joined against the stored rows."""
+    txns = load_transactions(account.account_id)
+    if not txns:
+        return {"positions": RowDiff(), "snapshots": RowDiff(), "realized_pnl": RowDiff()}
+
+    # Same window full_replay() uses once it has cleared everything from the cutoff
+    trading_calendar = get_calendar(calendar)
+    store = get_snapshot_store(snapshot_storage, session, account.account_id)
+    last_snapshot_date = store.last_snapshot_date(before=CUTOFF_DATE)
+    start_date = last_snapshot_date + timedelta(days=1) if last_snapshot_date else txns[0].date
+    end_date = trading_calendar.roll_back(dateutil.utils.today().date())
+
+    lots = LotLedger(lot_method) if lot_method else None
+    symbol_data, _ = aggregate_transactions([txn for txn in txns if txn.date < start_date],
+                                            track_cash=False, lots=lots)
+
+    new_snapshots, new_pnl = {}, {}
+    for current_date, day_state, daily_realized_pnl in iter_replay(symbol_data, txns, start_date, end_date,
+                                                                   lots, trading_calendar):
+        for symbol, quantity, avg_cost, action in snapshot_rows(day_state):
+            new_snapshots[(current_date, symbol)] = snapshot_value(quantity, avg_cost, action)
+        for row in realized_pnl_rows(account.account_id, daily_realized_pnl, current_date):
+            new_pnl[pnl_key(row)] = pnl_value(row)
+        symbol_data = day_state
+
+    new_positions = {
+        row["symbol"]: snapshot_value(row["quantity"], row["avg_cost"], row["action"])
+        for row in position_rows(account.account_id, symbol_data, end_date)
+    }
+    return {
+        "positions": diff_rows(stored_positions(account.account_id), new_positions),
+        "snapshots": diff_rows(stored_snapshots(account.account_id, start_date, snapshot_storage, trading_calendar),
+                               new_snapshots),
+        "realized_pnl": diff_rows(stored_realized_pnl(account.account_id, start_date), new_pnl),
+    }
+
+
+def diff_rows(old: dict, new: dict) -> RowDiff:
+    """Hash join of two keyed row sets."""
+    diff = RowDiff()
+    for key, new_value in new.items():
+        old_value = old.get(key)
+        if old_value is None:
+            diff.added.append((key, new_value))
+        elif old_value != new_value:
+            diff.changed.append((key, old_value, new_value))
+    diff.removed = [(key, old_value) for key, old_value in old.items() if key not in new]
+    return diff
+
+
+def stored_positions(account_id) -> dict:
+    return {
+        position.symbol: snapshot_value(position.quantity, position.avg_cost, position.action)
+        for position in session.query(Position).filter_by(account_id=account_id)
+    }
+
+
+def stored_snapshots(account_id, start_date: date, snapshot_storage: str, calendar) -> dict:
+    """Daily points from the table the storage mode writes to, from start_date on."""
+    if snapshot_storage == "range":
+        ranges = session.query(PositionSnapshotRange).filter(
+            PositionSnapshotRange.account_id == account_id,
+            PositionSnapshotRange.valid_to >= start_date
+        )
+        # Ranges run across closed days; only the sessions are comparable with the replay
+        points = [point for point in expand_snapshot_ranges(ranges, start_date, date.max)
+                  if calendar.is_session(point["as_of_date"])]
+    else:
+        points = [
+            {"as_of_date": row.as_of_date, "symbol": row.symbol, "quantity": row.quantity,
+             "avg_cost": row.avg_cost, "action": row.action}
+            for row in session.query(PositionSnapshot).filter(
+                PositionSnapshot.account_id == account_id,
+                PositionSnapshot.as_of_date >= start_date
+            )
+        ]
+    return {
+        (point["as_of_date"], point["symbol"]): snapshot_value(point["quantity"], point["avg_cost"], point["action"])
+        for point in points
+    }
+
+
+def stored_realized_pnl(account_id, start_date: date) -> dict:
+    rows = session.query(RealizedPnL).filter(RealizedPnL.account_id == account_id, RealizedPnL.date >= start_date)
+    return {
+        pnl_key({"date": row.date, "base_symbol": row.base_symbol, "option_symbol": row.option_symbol}): pnl_value({
+            "realized_pnl": row.realized_pnl,
+            "quantity_closed": row.quantity_closed,
+            "cost_basis": row.cost_basis,
+            "proceeds": row.proceeds,
+        })
+        for row in rows
+    }
+
+
+def snapshot_value(quantity, avg_cost, action) -> tuple:
+    return (
+        round(quantity, 5),
+        round(avg_cost, 5) if avg_cost is not None else None,
+        TransactionType(action).value,
+    )
+
+
+def pnl_key(row: dict) -> tuple:
+    return row["date"], row["base_symbol"], row["option_symbol"]
+
+
+def pnl_value(row: dict) -> tuple:
+    return (
+        round(row["realized_pnl"], 2),
+        round(row["quantity_closed"], 5),
+        round(row["cost_basis"], 5) if row["cost_basis"] is not None else None,
+        round(row["proceeds"], 5) if row["proceeds"] is not None else None,
+    )
+
+
+def print_account_diff(account_id: str, account_diff: dict[str, RowDiff]):
+    summary = " | ".join(
+        f"{table}: +{len(diff.added)} -{len(diff.removed)} ~{len(diff.changed)}" for table, diff in account_diff.items()
+    )
+    print(f"[{account_id}] {summary}")
+    for table, diff in account_diff.items():
+        for key, value in diff.added[:DIFF_SAMPLE_ROWS]:
+            print(f"  + {table} {format_key(key)}: {format_value(value)}")
+        for key, value in diff.removed[:DIFF_SAMPLE_ROWS]:
+            print(f"  - {table} {format_key(key)}: {format_value(value)}")
+        for key, old_value, new_value in diff.changed[:DIFF_SAMPLE_ROWS]:
+            print(f"  ~ {table} {format_key(key)}: {format_value(old_value)} -> {format_value(new_value)}")
+
+
+def format_key(key) -> str:
+    parts = key if isinstance(key, tuple) else (key,)
+    return " ".join(str(part) for part in parts if part is not None)
+
+
+def format_value(value: tuple) -> str:
+    return " ".join("-" if part is None else str(part) for part in value)
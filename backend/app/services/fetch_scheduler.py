@@ -0,0 +1,110 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Hashable
+
+DEFAULT_FETCH_WORKERS = 8
+# Remote requests started per second, with bursts of up to DEFAULT_BURST
+DEFAULT_RATE = 4.0
+DEFAULT_BURST = 8
+DEFAULT_RETRIES = 3
+# The n-th retry waits BACKOFF_SECONDS * 2 ** (n - 1), at most MAX_BACKOFF_SECONDS
+BACKOFF_SECONDS = 0.5
+MAX_BACKOFF_SECONDS = 8.0
+
+
+class TokenBucket:
+    """Thread-safe token bucket: up to capacity tokens, refilled at rate per second."""
+
+    def __init__(self, rate: float, capacity: int, clock: Callable[[], float] = time.monotonic):
+        if rate <= 0 or capacity < 1:
+            raise ValueError("The rate must be positive and the capacity at least 1")
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = float(capacity)
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Takes one token, sleeping until one is available."""
+        while True:
+            with self.lock:
+                now = self.clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+@dataclass
+class FetchFailure:
+    error: str
+    attempts: int
+
+
+@dataclass
+class FetchReport:
+    """What one scheduler did over a run: requests made, retries and the tasks that never succeeded."""
+    requests: int = 0
+    retries: int = 0
+    failures: dict[Hashable, FetchFailure] = field(default_factory=dict)
+
+    def summary(self) -> list[str]:
+        lines = [f"{self.requests} request(s), {self.retries} retried, {len(self.failures)} failed"]
+        lines += [f"[{key}] {failure.error} (after {failure.attempts} attempt(s))"
+                  for key, failure in self.failures.items()]
+        return lines
+
+
+class FetchScheduler:
+    """
+    Runs remote fetches on a thread pool. Every attempt first takes a token from a shared bucket, so
+    the pool never starts more than rate requests per second. Failed attempts are retried with
+    exponential backoff; tasks that still fail are left out of the results and recorded in the report.
+    """
+
+    def __init__(self, workers: int = DEFAULT_FETCH_WORKERS, rate: float = DEFAULT_RATE,
+                 burst: int = DEFAULT_BURST, retries: int = DEFAULT_RETRIES,
+                 backoff: float = BACKOFF_SECONDS, sleep: Callable[[float], None] = time.sleep):
+        self.workers = max(1, workers)
+        self.bucket = TokenBucket(rate, burst)
+        self.retries = retries
+        self.backoff = backoff
+        self.sleep = sleep
+        self.report = FetchReport()
+        self.report_lock = threading.Lock()
+
+    def run(self, tasks: dict[Hashable, Callable[[], object]]) -> dict[Hashable, object]:
+        """Result of every task that succeeded, by task key."""
+        if not tasks:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(tasks))) as pool:
+            futures = {key: pool.submit(self.attempt, key, task) for key, task in tasks.items()}
+        results = {}
+        for key, future in futures.items():
+            succeeded, value = future.result()
+            if succeeded:
+                results[key] = value
+        return results
+
+    def attempt(self, key: Hashable, task: Callable[[], object]) -> tuple[bool, object]:
+        for attempt in range(1, self.retries + 2):
+            self.bucket.acquire()
+            with self.report_lock:
+                self.report.requests += 1
+            try:
+                return True, task()
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            if attempt <= self.retries:
+                with self.report_lock:
+                    self.report.retries += 1
+                self.sleep(min(self.backoff * 2 ** (attempt - 1), MAX_BACKOFF_SECONDS))
+        with self.report_lock:
+            self.report.failures[key] = FetchFailure(error, self.retries + 1)
+        return False, None
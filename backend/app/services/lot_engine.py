@@ -0,0 +1,220 @@
+from dataclasses import dataclass
+from datetime import date
+from decimal import Decimal
+
+import numpy as np
+
+LOT_METHODS = ("fifo", "lifo", "hifo", "specific")
+
+# Lots held longer than this many days are long-term
+LONG_TERM_DAYS = 365
+
+# Decimal places kept when converting relieved amounts back to Decimal
+DECIMAL_PLACES = Decimal("0.00001")
+
+# Float residue below this is treated as a fully closed lot
+EPSILON = 1e-9
+
+# A relief may exceed the open lots by float residue below the reported precision, but no more
+SHORTFALL_TOLERANCE = float(DECIMAL_PLACES) / 2
+
+
+@dataclass
+class LotRelief:
+    """What closing a quantity took out of the book, split by holding period."""
+    quantity: Decimal
+    cost_basis: Decimal
+    short_term_quantity: Decimal
+    short_term_cost: Decimal
+    long_term_quantity: Decimal
+    long_term_cost: Decimal
+
+
+def to_decimal(value: float) -> Decimal:
+    return Decimal(repr(float(value))).quantize(DECIMAL_PLACES)
+
+
+class LotBook:
+    """
+    Open lots for one symbol, stored as parallel NumPy arrays in open order: signed quantity,
+    unit cost (already including any contract multiplier) and open date as a proleptic ordinal.
+    Short lots carry negative quantities. Arrays grow by doubling, so adding a lot is amortized
+    O(1); relief is a handful of vectorized passes and closed lots are compacted away in bulk.
+    """
+
+    def __init__(self, capacity: int = 8):
+        self.quantity = np.zeros(capacity, dtype=np.float64)
+        self.unit_cost = np.zeros(capacity, dtype=np.float64)
+        self.open_date = np.zeros(capacity, dtype=np.int64)
+        self.size = 0
+        self._closed = 0  # fully relieved lots still occupying slots until the next compaction
+
+    def __len__(self):
+        return self.size - self._closed
+
+    def open(self, quantity, unit_cost, open_date: date):
+        if self.size == len(self.quantity):
+            self._grow()
+        self.quantity[self.size] = float(quantity)
+        self.unit_cost[self.size] = float(unit_cost)
+        self.open_date[self.size] = open_date.toordinal()
+        self.size += 1
+
+    def total_quantity(self) -> float:
+        return float(self.quantity[:self.size].sum())
+
+    def total_cost(self) -> float:
+        return float((self.quantity[:self.size] * self.unit_cost[:self.size]).sum())
+
+    def open_quantity(self, side: int = 1) -> float:
+        """Unsigned quantity held in the lots on one side (1 = long, -1 = short)."""
+        quantities = self.quantity[:self.size]
+        return float(np.abs(quantities[np.sign(quantities) == side]).sum())
+
+    def relieve(self, quantity, as_of: date, method: str = "fifo", side: int = 1,
+                lot_open_dates: list[date] | None = None) -> LotRelief:
+        """
+        Closes abs(quantity) from the lots on the given side (1 = long, -1 = short), picking lots by
+        method: fifo/lifo by open order, hifo by highest unit cost first, specific by lot_open_dates
+        first (in the order given) and fifo for any remainder. Relieving more than the lots on that
+        side hold raises ValueError and leaves the book unchanged.
+        """
+        if method not in LOT_METHODS:
+            raise ValueError(f"Unknown lot relief method: {method}")
+
+        wanted = abs(float(quantity))
+        quantities = self.quantity[:self.size]
+        candidates = np.flatnonzero(np.sign(quantities) == side)
+        order = self._relief_order(candidates, method, wanted, lot_open_dates)
+
+        available = np.abs(quantities[order])
+        if wanted - available.sum() > SHORTFALL_TOLERANCE:
+            raise ValueError(f"Cannot relieve {wanted:g} from {available.sum():g} in open lots")
+        already_taken = np.cumsum(available) - available
+        taken = np.clip(wanted - already_taken, 0.0, available)
+
+        costs = taken * self.unit_cost[order]
+        held_days = as_of.toordinal() - self.open_date[order]
+        long_term = held_days > LONG_TERM_DAYS
+
+        remaining = self.quantity[order] - side * taken
+        remaining[np.abs(remaining) <= EPSILON] = 0.0
+        self.quantity[order] = remaining
+        self._closed += int(np.count_nonzero((taken > 0) & (remaining == 0)))
+        if self._closed * 2 > self.size:
+            self._compact()
+
+        return LotRelief(
+            quantity=to_decimal(taken.sum()),
+            cost_basis=to_decimal(costs.sum()),
+            short_term_quantity=to_decimal(taken[~long_term].sum()),
+            short_term_cost=to_decimal(costs[~long_term].sum()),
+            long_term_quantity=to_decimal(taken[long_term].sum()),
+            long_term_cost=to_decimal(costs[long_term].sum()),
+        )
+
+    def to_dict(self) -> dict:
+        self._compact()
+        return {
+            "quantity": self.quantity[:self.size].tolist(),
+            "unit_cost": self.unit_cost[:self.size].tolist(),
+            "open_date": self.open_date[:self.size].tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, payload: dict) -> "LotBook":
+        book = cls(max(8, len(payload["quantity"])))
+        book.size = len(payload["quantity"])
+        book.quantity[:book.size] = payload["quantity"]
+        book.unit_cost[:book.size] = payload["unit_cost"]
+        book.open_date[:book.size] = payload["open_date"]
+        return book
+
+    def _relief_order(self, candidates: np.ndarray, method: str, wanted: float,
+                      lot_open_dates: list[date] | None) -> np.ndarray:
+        if method == "lifo":
+            return candidates[::-1]
+        if method == "hifo":
+            return self._highest_cost_first(candidates, wanted)
+        if method == "specific" and lot_open_dates:
+            wanted = np.array([d.toordinal() for d in lot_open_dates], dtype=np.int64)
+            dates = self.open_date[candidates]
+            # rank each candidate by where its open date appears in the request; unlisted lots go last
+            rank = np.full(len(candidates), len(wanted), dtype=np.int64)
+            for position, ordinal in enumerate(wanted):
+                rank[(dates == ordinal) & (rank == len(wanted))] = position
+            return candidates[np.argsort(rank, kind="stable")]
+        return candidates
+
+    def _highest_cost_first(self, candidates: np.ndarray, wanted: float) -> np.ndarray:
+        """
+        Candidates by unit cost descending, oldest first among equal costs. Only the most expensive
+        lots needed to cover the wanted quantity are sorted; every lot tied at the cut-off cost is
+        included, so the order matches a full stable sort over the lots that get relieved.
+        """
+        costs = self.unit_cost[candidates]
+        count = min(len(candidates), 32)
+        while count < len(candidates):
+            cutoff = np.partition(costs, len(costs) - count)[len(costs) - count]
+            selected = candidates[costs >= cutoff]
+            if np.abs(self.quantity[selected]).sum() >= wanted:
+                return selected[np.argsort(-self.unit_cost[selected], kind="stable")]
+            count *= 2
+        return candidates[np.argsort(-costs, kind="stable")]
+
+    def _compact(self):
+        keep = np.flatnonzero(self.quantity[:self.size] != 0)
+        size = len(keep)
+        self.quantity[:size] = self.quantity[keep]
+        self.unit_cost[:size] = self.unit_cost[keep]
+        self.open_date[:size] = self.open_date[keep]
+        self.size = size
+        self._closed = 0
+
+    def _grow(self):
+        capacity = len(self.quantity) * 2
+        for name in ("quantity", "unit_cost", "open_date"):
+            current = getattr(self, name)
+            grown = np.zeros(capacity, dtype=current.dtype)
+            grown[:self.size] = current[:self.size]
+            setattr(self, name, grown)
+
+
+class LotLedger:
+    """Lot books for every symbol in an account, relieved with one method."""
+
+    def __init__(self, method: str = "fifo"):
+        if method not in LOT_METHODS:
+            raise ValueError(f"Unknown lot relief method: {method}")
+        self.method = method
+        self.books: dict[str, LotBook] = {}
+
+    def book(self, symbol: str) -> LotBook:
+        if symbol not in self.books:
+            self.books[symbol] = LotBook()
+        return self.books[symbol]
+
+    def open(self, symbol: str, quantity, unit_cost, open_date: date):
+        self.book(symbol).open(quantity, unit_cost, open_date)
+
+    def open_quantity(self, symbol: str, side: int = 1) -> Decimal:
+        return to_decimal(self.book(symbol).open_quantity(side))
+
+    def relieve(self, symbol: str, quantity, as_of: date, side: int = 1,
+                lot_open_dates: list[date] | None = None) -> LotRelief:
+        try:
+            return self.book(symbol).relieve(quantity, as_of, self.method, side, lot_open_dates)
+        except ValueError as e:
+            raise ValueError(f"[{symbol}] {e} on {as_of}") from e
+
+    def to_dict(self) -> dict:
+        return {
+            "method": self.method,
+            "books": {symbol: book.to_dict() for symbol, book in self.books.items() if len(book)},
+        }
+
+    @classmethod
+    def from_dict(cls, payload: dict) -> "LotLedger":
+        ledger = cls(payload["method"])
+        ledger.books = {symbol: LotBook.from_dict(book) for symbol, book in payload["books"].items()}
+        return ledger
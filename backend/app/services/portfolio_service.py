@@ -1,174 +1,205 @@
+import hashlib
+from dataclasses import dataclass
 from datetime import timedelta, date
 from uuid import UUID
 
 import numpy as np
 import pandas as pd
+from sqlalchemy import case
 from sqlalchemy.orm import Session, InstrumentedAttribute
 from sqlalchemy.sql import func
 
 from app.db import SessionLocal
-from app.models import TransactionType, PortfolioMetricsSnapshot, User, Account, UserPortfolioMetricsSnapshot
+from app.models import TransactionType, PortfolioMetricsSnapshot, User, Account, UserPortfolioMetricsSnapshot, \
+    PortfolioRollingReturn, UserPortfolioRollingReturn, PortfolioMetricsWatermark, UserPortfolioMetricsWatermark, Price, \
+    PortfolioPeriodReturn, UserPortfolioPeriodReturn, PositionWatermark
 from app.models.position_snapshots import PositionSnapshot
 from app.models.transaction import Transaction
+from app.services.benchmark_service import (
+    account_benchmark, compute_benchmark_levels, compute_relative_metrics, load_benchmark_prices, parse_benchmark
+)
+from app.services.bulk_writer import bulk_upsert
+from app.services.trading_calendar import TradingCalendar, get_calendar
+from app.services.xirr import flow_years, solve_xirr
 
 session: Session = SessionLocal()
 
+# Windows stored in portfolio_rolling_returns / user_portfolio_rolling_returns; adding one needs no
+# migration. 7d and 30d also fill the rolling_return_* columns of the metrics snapshots.
+ROLLING_WINDOWS = ("7d", "30d", "90d", "252d", "ytd")
+SHARPE_WINDOW = 30
+# Daily returns a metrics watermark keeps so appended dates see full Sharpe and "Nd" windows
+RETURN_HISTORY = max([SHARPE_WINDOW - 1] + [int(window[:-1]) - 2 for window in ROLLING_WINDOWS if window != "ytd"])
 
-def get_portfolio_series(account_id: str, from_date: date) -> pd.Series:
+# Full metrics rebuilds read snapshots after this date
+METRICS_START_DATE = date(2000, 1, 1)
+
+# Periods of portfolio_period_returns / user_portfolio_period_returns, all ending on the latest metrics date
+PERIODS = ("mtd", "qtd", "ytd", "1y", "itd")
+# Looking this far before a date finds the value or TWR it opens with
+AS_OF_LOOKBACK = timedelta(days=10)
+
+
+@dataclass
+class MetricsMatrix:
     """
-    Returns a Pandas Series mapping each snapshot date to the total portfolio value
-    for the given account, starting from the specified date (exclusive).
+    Dates x accounts frames of everything the metrics read: non-cash value, external cash flows
+    (CASH transactions) and CASH balances, loaded once. Account series are its columns and user
+    series the column sums, so both levels see the same numbers. Benchmark prices are dates x symbols.
     """
-    rows = session.query(
+    from_date: date  # values and balances after this date, flows on or after it
+    values: pd.DataFrame
+    cash_flows: pd.DataFrame
+    cash_balances: pd.DataFrame
+    benchmark_prices: pd.DataFrame
+
+    def account(self, account_id, from_date: date) -> tuple[pd.Series, pd.Series, pd.Series]:
+        """Value series after from_date, flows on or after it and cash balances after it for one account."""
+        return (
+            self.after(column(self.values, account_id).dropna(), from_date),
+            column(self.cash_flows, account_id).dropna().loc[lambda flows: flows.index >= from_date],
+            self.after(column(self.cash_balances, account_id).dropna(), from_date),
+        )
+
+    def total(self, from_date: date) -> tuple[pd.Series, pd.Series, pd.Series]:
+        """The same series summed across every account of the matrix."""
+        return (
+            self.after(self.values.sum(axis=1, min_count=1).dropna(), from_date),
+            self.cash_flows.sum(axis=1).loc[lambda flows: flows.index >= from_date],
+            self.after(self.cash_balances.sum(axis=1), from_date),
+        )
+
+    @staticmethod
+    def after(series: pd.Series, from_date: date) -> pd.Series:
+        return series[series.index > from_date]
+
+
+def load_metrics_matrix(account_ids: list, from_date: date, benchmark_symbols=(),
+                        db: Session | None = None) -> MetricsMatrix:
+    """
+    One grouped query each for snapshot values, CASH transactions and CASH balances of the accounts,
+    pivoted to dates x accounts, and one range query for the stored prices of the benchmark symbols.
+    db defaults to this module's session.
+    """
+    db = session if db is None else db
+    values = db.query(
+        PositionSnapshot.account_id,
         PositionSnapshot.as_of_date,
         func.sum(PositionSnapshot.total_value)
     ).filter(
-        PositionSnapshot.account_id == account_id,
+        PositionSnapshot.account_id.in_(account_ids),
         PositionSnapshot.symbol != "CASH",  # Exclude cash
         PositionSnapshot.as_of_date > from_date
     ).group_by(
-        PositionSnapshot.as_of_date
-    ).order_by(
-        PositionSnapshot.as_of_date
+        PositionSnapshot.account_id, PositionSnapshot.as_of_date
     ).all()
 
-    return pd.Series({row.as_of_date: float(row[1]) for row in rows})
-
-
-def get_user_portfolio_series(user_id: UUID, from_date: date) -> pd.Series:
-    """
-    Returns a Pandas Series mapping each snapshot date to the total portfolio value
-    across all accounts for a given user, starting from the specified date (exclusive).
-    """
-    account_ids = session.query(Account.account_id).filter(Account.user_id == user_id).all()
-    if not account_ids:
-        return pd.Series()
-
-    account_ids = [str(acc_id[0]) for acc_id in account_ids]
-
-    rows = session.query(
+    cash_balances = db.query(
+        PositionSnapshot.account_id,
         PositionSnapshot.as_of_date,
-        func.sum(PositionSnapshot.total_value)
+        func.sum(PositionSnapshot.quantity)
     ).filter(
         PositionSnapshot.account_id.in_(account_ids),
-        PositionSnapshot.symbol != "CASH",  # Exclude cash
+        PositionSnapshot.symbol == "CASH",
         PositionSnapshot.as_of_date > from_date
     ).group_by(
-        PositionSnapshot.as_of_date
-    ).order_by(
-        PositionSnapshot.as_of_date
+        PositionSnapshot.account_id, PositionSnapshot.as_of_date
     ).all()
 
-    return pd.Series({row.as_of_date: float(row[1]) for row in rows})
-
+    return MetricsMatrix(from_date, pivot_by_date(values), load_cash_flow_matrix(account_ids, from_date, db),
+                         pivot_by_date(cash_balances), load_benchmark_prices(benchmark_symbols, from_date))
 
-def get_cash_flows(account_id: UUID, from_date: date) -> tuple[pd.Series, pd.Series]:
-    """
-    Returns two Pandas Series of cash flows by date:
-    - external_cash_flow: deposits/withdrawals (symbol == "CASH")
-    - internal_trade_flow: cash impact of stock/option buys/sells (symbol != "CASH")
-    """
-    result = (
-        session.query(Transaction.date, Transaction.symbol, Transaction.action,
-                      Transaction.quantity, Transaction.price)
-        .filter(Transaction.account_id == account_id)
-        .filter(Transaction.date >= from_date)
-        .order_by(Transaction.date)
-        .all()
-    )
 
-    external_cash_map = {}
-    internal_trade_map = {}
+def load_cash_flow_matrix(account_ids: list, from_date: date, db: Session | None = None) -> pd.DataFrame:
+    """External cash flows (CASH transactions) of the accounts on or after from_date as dates x accounts."""
+    db = session if db is None else db
+    # Deposits and withdrawals; trades move cash between positions and are not external flows
+    cash_flows = db.query(
+        Transaction.account_id,
+        Transaction.date,
+        func.sum(Transaction.quantity)
+    ).filter(
+        Transaction.account_id.in_(account_ids),
+        Transaction.symbol == "CASH",
+        Transaction.date >= from_date
+    ).group_by(
+        Transaction.account_id, Transaction.date
+    ).all()
+    return pivot_by_date(cash_flows)
 
-    for txn_date, symbol, action, quantity, price in result:
-        qty = float(quantity or 0)
-        price = float(price or 0)
 
-        if symbol == "CASH":
-            flow = qty  # Deposit or withdrawal
-            if flow != 0:
-                external_cash_map.setdefault(txn_date, 0.0)
-                external_cash_map[txn_date] += flow
-        else:
-            flow = -qty * price  # Trade: buy (-), sell (+)
-            if flow != 0:
-                internal_trade_map.setdefault(txn_date, 0.0)
-                internal_trade_map[txn_date] += flow
-
-    return (
-        pd.Series(external_cash_map).sort_index(),
-        pd.Series(internal_trade_map).sort_index()
+def pivot_by_date(rows) -> pd.DataFrame:
+    """(account_id, date, amount) rows as a sorted dates x accounts float frame; missing cells are NaN."""
+    frame = pd.DataFrame(
+        [(account_id, day, float(amount) if amount is not None else np.nan) for account_id, day, amount in rows],
+        columns=["account_id", "date", "amount"]
     )
+    return frame.pivot(index="date", columns="account_id", values="amount").sort_index()
 
 
-def get_user_cash_flows(user_id: UUID, from_date: date) -> tuple[pd.Series, pd.Series]:
-    """
-    Returns two Pandas Series of cash flows by date across all user accounts:
-    - external_cash_flow: deposits/withdrawals (symbol == "CASH")
-    - internal_trade_flow: cash impact of stock/option buys/sells (symbol != "CASH")
-    """
-    account_ids = session.query(Account.account_id).filter(Account.user_id == user_id).all()
-    if not account_ids:
-        return pd.Series(), pd.Series()
-
-    account_ids = [acc_id[0] for acc_id in account_ids]
-
-    result = (
-        session.query(Transaction.date, Transaction.symbol, Transaction.action,
-                      Transaction.quantity, Transaction.price)
-        .filter(Transaction.account_id.in_(account_ids))
-        .filter(Transaction.date >= from_date)
-        .order_by(Transaction.date)
-        .all()
-    )
-
-    external_cash_map = {}
-    internal_trade_map = {}
+def column(frame: pd.DataFrame, account_id) -> pd.Series:
+    return frame[account_id] if account_id in frame.columns else pd.Series(dtype=float)
 
-    for txn_date, symbol, action, quantity, price in result:
-        qty = float(quantity or 0)
-        price = float(price or 0)
 
-        if symbol == "CASH":
-            flow = qty  # Deposit or withdrawal
-            if flow != 0:
-                external_cash_map.setdefault(txn_date, 0.0)
-                external_cash_map[txn_date] += flow
-        else:
-            flow = -qty * price  # Trade: buy (-), sell (+)
-            if flow != 0:
-                internal_trade_map.setdefault(txn_date, 0.0)
-                internal_trade_map[txn_date] += flow
-
-    return (
-        pd.Series(external_cash_map).sort_index(),
-        pd.Series(internal_trade_map).sort_index()
-    )
+def align_to_sessions(portfolio_series: pd.Series, cash_flows: pd.Series,
+                      calendar: TradingCalendar) -> tuple[pd.Series, pd.Series]:
+    """
+    Keeps only the calendar's sessions in the value series and moves cash flows dated on other days
+    to the next session, so returns are measured session to session without zero-return days.
+    """
+    if not portfolio_series.empty:
+        portfolio_series = portfolio_series[[calendar.is_session(day) for day in portfolio_series.index]]
+    if not cash_flows.empty:
+        cash_flows = cash_flows.groupby([calendar.roll_forward(day) for day in cash_flows.index]).sum()
+    return portfolio_series, cash_flows
 
 
-def compute_daily_returns(portfolio_series: pd.Series, cash_flows: pd.Series) -> pd.Series:
-    adjusted = {}
-    prev_value = None
+def align_cash_flows(portfolio_values: pd.Series | pd.DataFrame,
+                     cash_flows: pd.Series | pd.DataFrame) -> pd.Series | pd.DataFrame:
+    """
+    Cash flows reindexed once onto the value dates (and, for a frame, its columns), zero where
+    there are none. Flows on dates without a value are dropped, as the per-date lookup did.
+    """
+    if isinstance(portfolio_values, pd.DataFrame):
+        cash_flows = cash_flows.reindex(index=portfolio_values.index, columns=portfolio_values.columns)
+    else:
+        cash_flows = cash_flows.reindex(portfolio_values.index)
+    return cash_flows.astype(float).fillna(0.0)
 
-    for date in portfolio_series.index:
-        value = portfolio_series[date]
-        flow = cash_flows.get(date, 0.0)
 
-        if prev_value is not None:
-            adjusted[date] = (value - flow) / prev_value - 1
+def compute_growth_factors(portfolio_values: pd.Series | pd.DataFrame,
+                           cash_flows: pd.Series | pd.DataFrame) -> pd.Series | pd.DataFrame:
+    """
+    (value - flow) / previous value for every date. Works on one series or on a dates x accounts
+    frame at once; a frame column is measured against its own last value, so leading and interior
+    gaps (NaN) behave like the column with its gaps dropped. The first value of a series or column
+    gets a factor of 1.
+    """
+    values = portfolio_values.astype(float)
+    previous = values.ffill().shift(1)
+    factors = (values - align_cash_flows(values, cash_flows)) / previous
+    return factors.where(previous.notna() | values.isna(), 1.0)
 
-        prev_value = value
 
-    return pd.Series(adjusted)
+def compute_daily_returns(portfolio_series: pd.Series | pd.DataFrame,
+                          cash_flows: pd.Series | pd.DataFrame) -> pd.Series | pd.DataFrame:
+    """Flow-adjusted return of each date against the previous value; the first date has none."""
+    values = portfolio_series.astype(float)
+    daily_returns = (values - align_cash_flows(values, cash_flows)) / values.ffill().shift(1) - 1
+    return daily_returns.iloc[1:]
 
 
-def compute_drawdown_series(portfolio_series: pd.Series) -> pd.Series:
+def compute_drawdown_series(portfolio_series: pd.Series | pd.DataFrame,
+                            peak: float | None = None) -> pd.Series | pd.DataFrame:
+    """Drawdown from the running peak; peak carries the running peak of values before the series."""
     cumulative_max = portfolio_series.cummax()
+    if peak is not None:
+        cumulative_max = cumulative_max.clip(lower=peak)
     drawdown_series = (portfolio_series - cumulative_max) / cumulative_max
     return drawdown_series
 
 
-def compute_sharpe_ratio_series(daily_returns: pd.Series, risk_free_rate=0.05, window: int = 30) -> pd.Series:
+def compute_sharpe_ratio_series(daily_returns: pd.Series, risk_free_rate=0.05, window: int = SHARPE_WINDOW) -> pd.Series:
     daily_rf = risk_free_rate / 252
     excess_returns = daily_returns - daily_rf
 
@@ -180,23 +211,69 @@ def compute_sharpe_ratio_series(daily_returns: pd.Series, risk_free_rate=0.05, w
     return sharpe_series.dropna()
 
 
-def compute_twr_series(portfolio_series: pd.Series, cash_flows: pd.Series) -> pd.Series:
-    twr = 1.0
-    prev_value = None
-    twr_series = {}
+def compute_twr_series(portfolio_series: pd.Series | pd.DataFrame,
+                       cash_flows: pd.Series | pd.DataFrame) -> pd.Series | pd.DataFrame:
+    """Cumulative time-weighted return to each date: the running product of the growth factors."""
+    return compute_growth_factors(portfolio_series, cash_flows).cumprod() - 1
 
-    for date in portfolio_series.index:
-        value = portfolio_series[date]
-        flow = cash_flows.get(date, 0.0)
 
-        if prev_value is not None:
-            r = (value - flow - prev_value) / prev_value
-            twr *= (1 + r)
+def window_starts(window: str, index: pd.Index) -> np.ndarray:
+    """
+    Position of the first daily return in each date's window. "Nd" spans the last N snapshot dates,
+    i.e. the N - 1 returns between them; "ytd" spans the returns dated in the same calendar year.
+    Windows longer than the history compound whatever it has.
+    """
+    positions = np.arange(len(index))
+    if window == "ytd":
+        years = np.fromiter((day.year for day in index), dtype=np.int64, count=len(index))
+        return np.searchsorted(years, years, side="left")
+    if window.endswith("d") and window[:-1].isdigit() and int(window[:-1]) > 1:
+        return np.maximum(0, positions - (int(window[:-1]) - 2))
+    raise ValueError(f"Unknown rolling window: {window}")
 
-        prev_value = value
-        twr_series[date] = twr - 1  # cumulative TWR to this date
 
-    return pd.Series(twr_series)
+def compute_rolling_returns(daily_returns: pd.Series | pd.DataFrame,
+                            windows: tuple[str, ...] = ROLLING_WINDOWS) -> dict[str, pd.Series | pd.DataFrame]:
+    """
+    Compounded return over every window for every date, shaped like daily_returns (a series, or
+    dates x accounts). Uses one prefix sum of log growth: a window's return is exp(L[end] - L[start]) - 1,
+    so each extra window costs one vectorized subtraction. Missing returns count as flat, as the
+    product they replace skipped them. Windows containing a factor the logarithm cannot take
+    (a loss of 100% or more, or an infinite return after a zero value) are multiplied out directly.
+    """
+    # An explicit width, as reshape cannot infer one when there are no returns yet
+    width = daily_returns.shape[1] if isinstance(daily_returns, pd.DataFrame) else 1
+    factors = 1 + daily_returns.to_numpy(dtype=float).reshape(len(daily_returns), width)
+    missing = np.isnan(factors)
+    irregular = ~missing & ~(np.isfinite(factors) & (factors > 0))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log_growth = np.where(missing | irregular, 0.0, np.log(factors))
+
+    zeros = np.zeros((1, factors.shape[1]))
+    cumulative = np.vstack([zeros, np.cumsum(log_growth, axis=0)])
+    irregular_count = np.vstack([zeros, np.cumsum(irregular, axis=0)])
+    ends = np.arange(1, len(factors) + 1)
+
+    rolling = {}
+    for window in windows:
+        starts = window_starts(window, daily_returns.index)
+        returns = np.expm1(cumulative[ends] - cumulative[starts])
+        for row, column in zip(*np.nonzero(irregular_count[ends] - irregular_count[starts])):
+            returns[row, column] = np.nanprod(factors[starts[row]:row + 1, column]) - 1
+        if isinstance(daily_returns, pd.DataFrame):
+            rolling[window] = pd.DataFrame(returns, index=daily_returns.index, columns=daily_returns.columns)
+        else:
+            rolling[window] = pd.Series(returns[:, 0], index=daily_returns.index)
+    return rolling
+
+
+def rolling_return_rows(owner: dict, rolling: dict[str, pd.Series]) -> list[dict]:
+    """Long-format rows (one per date and window) for the rolling return tables; owner holds the key column."""
+    return [
+        {**owner, "snapshot_date": snapshot_date, "window": window, "rolling_return": to_float(value)}
+        for window, returns in rolling.items()
+        for snapshot_date, value in returns.items()
+    ]
 
 
 def compute_cagr(portfolio_series: pd.Series) -> float:
@@ -214,173 +291,536 @@ def to_float(x):
     return x
 
 
+def to_optional_float(x):
+    """to_float, with NaN and infinities stored as None."""
+    return to_float(x) if x is not None and np.isfinite(x) else None
+
+
 def compute_xirr(cash_flows: list[tuple[date, float]]) -> float:
-    """Compute XIRR using Newton-Raphson method."""
+    """XIRR of one list of (date, amount) flows; NaN when it has none (e.g. all flows of one sign)."""
     if not cash_flows:
         return 0.0
+    return float(solve_xirr(flow_years([day for day, _ in cash_flows]), [[amount for _, amount in cash_flows]])[0])
 
-    dates = [cf[0] for cf in cash_flows]
-    amounts = [cf[1] for cf in cash_flows]
-    days = [(d - dates[0]).days / 365.0 for d in dates]
 
-    def xnpv(rate):
-        return sum(amount / ((1 + rate) ** day) for amount, day in zip(amounts, days))
+def compute_money_weighted_returns(values: pd.DataFrame, cash_flows: pd.DataFrame, start_date: date | None,
+                                   end_date: date) -> pd.Series:
+    """
+    XIRR of every column of a dates x owners value frame over (start_date, end_date], all solved at
+    once. Each column is invested at its value as of start_date (nothing without a start_date or a
+    value by then), gets every external flow after it as an investment (a deposit) or a payout (a
+    withdrawal), and is paid out at its value on the last date up to end_date. The flows of every
+    column share one timeline, so they form one owners x dates matrix.
+    """
+    values = values[values.index <= end_date].ffill()
+    if values.empty:
+        return pd.Series(np.nan, index=values.columns)
+    closing_date = values.index[-1]
+    opening = pd.Series(0.0, index=values.columns)
+    if start_date is not None:
+        opening = values[values.index <= start_date].iloc[-1:].sum().reindex(values.columns, fill_value=0.0)
+    cash_flows = cash_flows.reindex(columns=values.columns)
+    cash_flows = cash_flows[(cash_flows.index > (start_date or date.min)) & (cash_flows.index <= closing_date)]
+
+    days = [start_date or min([values.index[0], *cash_flows.index])] + list(cash_flows.index) + [closing_date]
+    amounts = np.column_stack([
+        -opening.to_numpy(),
+        -cash_flows.fillna(0.0).to_numpy().T,
+        values.iloc[-1].fillna(0.0).to_numpy(),
+    ])
+    return pd.Series(solve_xirr(flow_years(days), amounts), index=values.columns)
+
+
+def get_money_weighted_returns(user_id: UUID, start_date: date | None = None, end_date: date | None = None,
+                               db: Session | None = None) -> dict:
+    """
+    XIRR of each account of the user and of all of them together over (start_date, end_date], from
+    inception and through today by default. Value includes cash, since the external flows are the
+    CASH deposits and withdrawals.
+    """
+    db = session if db is None else db
+    end_date = end_date or date.today()
+    accounts = db.query(Account).filter(Account.user_id == user_id).all()
+    from_date = start_date - AS_OF_LOOKBACK if start_date is not None else METRICS_START_DATE
+    matrix = load_metrics_matrix([account.account_id for account in accounts], from_date, db=db)
+
+    values, cash_flows = money_weighted_frames(matrix.values, matrix.cash_balances, matrix.cash_flows)
+    rates = compute_money_weighted_returns(values, cash_flows, start_date, end_date)
+
+    return {
+        "xirr": to_optional_float(rates.get("user")),
+        "accounts": [
+            {"account_id": account.account_id, "account_number": account.account_number,
+             "xirr": to_optional_float(rates.get(account.account_id))}
+            for account in accounts
+        ],
+    }
+
+
+def money_weighted_frames(values: pd.DataFrame, cash_balances: pd.DataFrame,
+                          cash_flows: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Account value with cash and the external flows, each with a "user" column summing the accounts."""
+    values = values.add(cash_balances, fill_value=0.0).ffill()
+    values["user"] = values.sum(axis=1, min_count=1)
+    cash_flows = cash_flows.copy()
+    cash_flows["user"] = cash_flows.sum(axis=1)
+    return values, cash_flows
+
+
+def period_start(period: str, as_of: date) -> date | None:
+    """Last date before the period ending on as_of, which its return is measured from; None since inception."""
+    if period == "mtd":
+        return as_of.replace(day=1) - timedelta(days=1)
+    if period == "qtd":
+        return date(as_of.year, 3 * ((as_of.month - 1) // 3) + 1, 1) - timedelta(days=1)
+    if period == "ytd":
+        return date(as_of.year - 1, 12, 31)
+    if period == "1y":
+        return date(as_of.year - 1, as_of.month, min(as_of.day, 28 if as_of.month == 2 else 31))
+    if period == "itd":
+        return None
+    raise ValueError(f"Unknown period: {period}")
+
+
+def compute_period_twr(twr: pd.DataFrame, start_date: date | None) -> pd.Series:
+    """
+    TWR of every column of a dates x owners frame of TWR to date, from start_date to its last date:
+    the ratio of the growth to both dates. Owners without a TWR by start_date return since inception.
+    """
+    twr = twr.ffill()
+    opening = pd.Series(0.0, index=twr.columns)
+    if start_date is not None:
+        opening = twr[twr.index <= start_date].iloc[-1:].sum().reindex(twr.columns, fill_value=0.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (1 + twr.iloc[-1]) / (1 + opening) - 1
+
 
-    def xirr():
-        rate = 0.1
-        for _ in range(100):
-            f_value = xnpv(rate)
-            deriv = sum(-day * amount / ((1 + rate) ** (day + 1)) for amount, day in zip(amounts, days))
-            rate -= f_value / deriv
-            if abs(f_value) < 1e-6:
-                return rate
-        return rate
+def update_period_returns(user_id: UUID):
+    """
+    Stores TWR and MWR (XIRR) over every PERIODS entry for the user and each of its accounts, all
+    ending on the user's latest metrics date. TWR comes from the stored TWR to date; MWR from one
+    batched XIRR solve per period over the user's and accounts' flows.
+    """
+    as_of = session.query(func.max(UserPortfolioMetricsSnapshot.snapshot_date)).filter(
+        UserPortfolioMetricsSnapshot.user_id == user_id
+    ).scalar()
+    if as_of is None:
+        return
 
-    return xirr()
+    account_ids = [account_id for account_id, in session.query(Account.account_id).filter(Account.user_id == user_id)]
+    starts = {period: period_start(period, as_of) for period in PERIODS}
+    from_date = min(start for start in starts.values() if start is not None) - AS_OF_LOOKBACK
 
+    twr_rows = session.query(
+        PortfolioMetricsSnapshot.account_id, PortfolioMetricsSnapshot.snapshot_date, PortfolioMetricsSnapshot.twr_to_date
+    ).filter(
+        PortfolioMetricsSnapshot.account_id.in_(account_ids),
+        PortfolioMetricsSnapshot.snapshot_date > from_date,
+        PortfolioMetricsSnapshot.snapshot_date <= as_of
+    ).all() + [
+        ("user", snapshot_date, twr_to_date) for snapshot_date, twr_to_date in session.query(
+            UserPortfolioMetricsSnapshot.snapshot_date, UserPortfolioMetricsSnapshot.twr_to_date
+        ).filter(
+            UserPortfolioMetricsSnapshot.user_id == user_id,
+            UserPortfolioMetricsSnapshot.snapshot_date > from_date,
+            UserPortfolioMetricsSnapshot.snapshot_date <= as_of
+        )
+    ]
+    twr = pivot_by_date(twr_rows)
+
+    # Values around the period starts, flows since inception for the "itd" XIRR
+    matrix = load_metrics_matrix(account_ids, from_date)
+    values, cash_flows = money_weighted_frames(matrix.values, matrix.cash_balances,
+                                               load_cash_flow_matrix(account_ids, METRICS_START_DATE))
+
+    rows = {"account": [], "user": []}
+    for period, start_date in starts.items():
+        period_twr = compute_period_twr(twr, start_date)
+        period_mwr = compute_money_weighted_returns(values, cash_flows, start_date, as_of)
+        for owner in ["user", *account_ids]:
+            kind = "user" if owner == "user" else "account"
+            rows[kind].append({
+                f"{kind}_id": user_id if owner == "user" else owner,
+                "period": period,
+                "as_of_date": as_of,
+                "start_date": start_date,
+                "twr": to_optional_float(period_twr.get(owner)),
+                "mwr": to_optional_float(period_mwr.get(owner)),
+                "updated_at": func.now(),
+            })
+
+    bulk_upsert(session, PortfolioPeriodReturn, rows["account"])
+    bulk_upsert(session, UserPortfolioPeriodReturn, rows["user"])
+    session.commit()
 
-def update_portfolio_metrics(email: str):
+
+def update_portfolio_metrics(email: str, calendar: str = "all", incremental: bool = False) -> dict[tuple, date]:
+    """
+    Rebuilds the metrics of every account of the user, or with incremental=True appends only the
+    dates after each account's metrics watermark. An account is rebuilt anyway when it has no
+    watermark, was computed on another calendar, or its snapshots or cash flows on or before the
+    watermark changed since. Benchmark-relative metrics use the account's benchmark, else the user's.
+    Accounts whose positions were replayed with range storage are refused, as ranges are not valued.
+    Every read and write covers all accounts at once, so the statements run do not grow with the
+    number of accounts or dates (beyond bulk upserts splitting at the bind-parameter limit).
+
+    Returns the first date whose metrics were rewritten, keyed by ("account", account_id) and
+    ("user", user_id); date.min for rebuilt owners, whose earlier rows were dropped as well.
+    Owners left as they were are not in it.
+    """
+    trading_calendar = get_calendar(calendar)
     user = session.query(User).filter_by(email=email).first()
     if not user:
         raise ValueError(f"No user with email {email}")
 
     accounts = session.query(Account).filter_by(user_id=user.user_id).all()
-    account_ids = [a.account_id for a in accounts]
-    #  Delete all PortfolioMetricsSnapshot that is matching the accounts
-    # Step 2: Delete all matching PortfolioMetricsSnapshot records
-    session.query(PortfolioMetricsSnapshot).filter(
-        PortfolioMetricsSnapshot.account_id.in_(account_ids)
-    ).delete(synchronize_session=False)
-    session.commit()
-
-    for account in accounts:
-        last_snapshot = session.query(func.max(PortfolioMetricsSnapshot.snapshot_date)) \
-            .filter_by(account_id=account.account_id).scalar()
-        start_date = last_snapshot + timedelta(days=1) if last_snapshot else date(2000, 1, 1)
-
-        portfolio_series = get_portfolio_series(str(account.account_id), start_date)
+    benchmarks = {account.account_id: account_benchmark(account, user) for account in accounts}
+    account_ids = list(benchmarks)
+    # Metrics are computed from the valued daily snapshots; ranges carry no prices
+    range_stored = [str(account_id) for account_id, in session.query(PositionWatermark.account_id).filter(
+        PositionWatermark.account_id.in_(account_ids),
+        PositionWatermark.snapshot_storage == "range"
+    )]
+    if range_stored:
+        raise ValueError(f"Account(s) {', '.join(range_stored)} of {email} are stored as snapshot ranges; "
+                         f"replay them with --snapshot_storage daily before recalculating metrics")
+    stored = {watermark.account_id: watermark for watermark in session.query(PortfolioMetricsWatermark).filter(
+        PortfolioMetricsWatermark.account_id.in_(account_ids)
+    )} if incremental else {}
+    checksums = upstream_checksums({
+        account_id: ([account_id], watermark.processed_through, parse_benchmark(benchmarks[account_id]))
+        for account_id, watermark in stored.items()
+    })
+
+    watermarks, start_dates = {}, {}
+    for account_id in account_ids:
+        watermark = stored.get(account_id)
+        reason = rebuild_reason(watermark, calendar, benchmarks[account_id],
+                                checksums[account_id]) if watermark is not None else None
+        if reason:
+            print(f"[{account_id}] {reason}, rebuilding metrics.")
+            watermark = None
+        watermarks[account_id] = watermark
+        start_dates[account_id] = METRICS_START_DATE if watermark is None else watermark.processed_through
+
+    rebuilt = [account_id for account_id, watermark in watermarks.items() if watermark is None]
+    if rebuilt:
+        for model in (PortfolioMetricsSnapshot, PortfolioRollingReturn, PortfolioMetricsWatermark):
+            session.query(model).filter(model.account_id.in_(rebuilt)).delete(synchronize_session=False)
+
+    # Every account's series, the user's sums of them and every benchmark price come from one load
+    benchmark_symbols = {symbol for spec in [user.benchmark, *benchmarks.values()] for symbol in parse_benchmark(spec)}
+    matrix = load_metrics_matrix(account_ids, min(start_dates.values(), default=METRICS_START_DATE), benchmark_symbols)
+    metrics_rows, rolling_rows, computed = [], [], {}
+    rewritten = {("account", account_id): date.min for account_id in rebuilt}
+    for account_id in account_ids:
+        portfolio_series, external_cash_flows, cash_balances = matrix.account(account_id, start_dates[account_id])
+        portfolio_series, external_cash_flows = align_to_sessions(portfolio_series, external_cash_flows,
+                                                                  trading_calendar)
         if portfolio_series.empty:
             continue
 
-        external_cash_flows, _ = get_cash_flows(account.account_id, start_date)
-        daily_returns = compute_daily_returns(portfolio_series, external_cash_flows)
-        twr = compute_twr_series(portfolio_series, external_cash_flows)
-        sharpe = compute_sharpe_ratio_series(daily_returns)
-        drawdown = compute_drawdown_series(portfolio_series)
-
-        for i in range(1, len(portfolio_series)):
-            snapshot_date = portfolio_series.index[i]
-            value = portfolio_series.iloc[i]
-            cash = 0
-            cash_row = session.query(PositionSnapshot).filter_by(
-                account_id=account.account_id,
-                as_of_date=snapshot_date,
-                symbol="CASH"
-            ).first()
-            if cash_row:
-                cash = float(str(cash_row.quantity))
-
-            rolling_7d = daily_returns.iloc[max(0, i - 6):i].add(1).prod() - 1
-            rolling_30d = daily_returns.iloc[max(0, i - 29):i].add(1).prod() - 1
-
-            twr_value = to_float(twr.get(snapshot_date))
-            sharpe_value = to_float(sharpe.get(snapshot_date))
-            drawdown_value = to_float(drawdown.get(snapshot_date))
-
-            session.merge(PortfolioMetricsSnapshot(
-                snapshot_date=snapshot_date,
-                account_id=account.account_id,
-                portfolio_value=to_float(value),
-                benchmark_value=None,  # Expected type 'Decimal | float', got 'None' instead
-                portfolio_daily_return=to_float(daily_returns.get(snapshot_date)),
-                benchmark_daily_return=None,  # Expected type 'Decimal | float', got 'None' instead
-                cash_balance=to_float(cash),
-                twr_to_date=to_float(twr_value),
-                rolling_return_7d=to_float(rolling_7d),
-                rolling_return_30d=to_float(rolling_30d),
-                sharpe_to_date=to_float(sharpe_value),
-                drawdown_to_date=to_float(drawdown_value),
-            ))
-
-        session.commit()
-        print(f"✅ Metrics updated for account {account.account_id}")
+        rows, rolling, state = compute_metrics(portfolio_series, external_cash_flows, cash_balances,
+                                               watermarks[account_id], benchmarks[account_id], matrix.benchmark_prices)
+        owner = {"account_id": account_id}
+        metrics_rows += [{**owner, **row} for row in rows]
+        rolling_rows += rolling_return_rows(owner, rolling)
+        computed[account_id] = (portfolio_series.index[-1], state, len(rows))
+        if rows and watermarks[account_id] is not None:
+            rewritten[("account", account_id)] = rows[0]["snapshot_date"]
+
+    checksums = upstream_checksums({
+        account_id: ([account_id], processed_through, parse_benchmark(benchmarks[account_id]))
+        for account_id, (processed_through, _, _) in computed.items()
+    })
+    bulk_upsert(session, PortfolioMetricsSnapshot, metrics_rows)
+    bulk_upsert(session, PortfolioRollingReturn, rolling_rows)
+    bulk_upsert(session, PortfolioMetricsWatermark, [{
+        "account_id": account_id,
+        "calendar": calendar,
+        "processed_through": processed_through,
+        "upstream_checksum": checksums[account_id],
+        "state": state,
+        "updated_at": func.now(),
+    } for account_id, (processed_through, state, _) in computed.items()])
+    session.commit()
+    for account_id, (_, _, new_dates) in computed.items():
+        print(f"✅ Metrics updated for account {account_id} ({new_dates} new date(s))")
 
     # Calculate and store user-level metrics
-    update_user_portfolio_metrics(user.user_id)
+    user_rewritten_from = update_user_portfolio_metrics(user.user_id, calendar, incremental, matrix)
+    if user_rewritten_from is not None:
+        rewritten[("user", user.user_id)] = user_rewritten_from
     print(f"✅ User-level metrics updated for {email}")
+    update_period_returns(user.user_id)
+    print(f"✅ Period returns updated for {email}")
+    return rewritten
 
 
-def update_user_portfolio_metrics(user_id: UUID):
+def update_user_portfolio_metrics(user_id: UUID, calendar: str = "all", incremental: bool = False,
+                                  matrix: MetricsMatrix | None = None) -> date | None:
     """
     Calculate and store portfolio metrics at the user level by aggregating data across all accounts.
+    With incremental=True only dates after the user's metrics watermark are appended, under the
+    same rebuild rules as update_portfolio_metrics. The series are the column sums of matrix, the one
+    the account metrics were computed from; it is loaded here when not given or not reaching back far enough.
+    Returns the first date rewritten (date.min after a rebuild), or None when nothing was.
     """
-    # Delete existing user portfolio metrics snapshots
-    session.query(UserPortfolioMetricsSnapshot).filter(
-        UserPortfolioMetricsSnapshot.user_id == user_id
-    ).delete(synchronize_session=False)
-    session.commit()
+    trading_calendar = get_calendar(calendar)
+    account_ids = [account_id for account_id, in session.query(Account.account_id).filter(Account.user_id == user_id)]
+    benchmark = session.get(User, user_id).benchmark
+
+    watermark = session.get(UserPortfolioMetricsWatermark, user_id) if incremental else None
+    reason = rebuild_reason(watermark, calendar, benchmark, upstream_checksums({
+        user_id: (account_ids, watermark.processed_through, parse_benchmark(benchmark))
+    })[user_id]) if watermark is not None else None
+    if reason:
+        print(f"[{user_id}] {reason}, rebuilding user metrics.")
+        watermark = None
+
+    if watermark is None:
+        # Delete existing user portfolio metrics snapshots
+        session.query(UserPortfolioMetricsSnapshot).filter(
+            UserPortfolioMetricsSnapshot.user_id == user_id
+        ).delete(synchronize_session=False)
+        session.query(UserPortfolioRollingReturn).filter(
+            UserPortfolioRollingReturn.user_id == user_id
+        ).delete(synchronize_session=False)
+        session.query(UserPortfolioMetricsWatermark).filter(
+            UserPortfolioMetricsWatermark.user_id == user_id
+        ).delete(synchronize_session=False)
+        session.commit()
 
-    # Find the earliest start date from account-level metrics
-    earliest_date = session.query(func.min(PortfolioMetricsSnapshot.snapshot_date)) \
-        .join(Account, PortfolioMetricsSnapshot.account_id == Account.account_id) \
-        .filter(Account.user_id == user_id) \
-        .scalar()
+        # Find the earliest start date from account-level metrics
+        earliest_date = session.query(func.min(PortfolioMetricsSnapshot.snapshot_date)) \
+            .join(Account, PortfolioMetricsSnapshot.account_id == Account.account_id) \
+            .filter(Account.user_id == user_id) \
+            .scalar()
+
+        if not earliest_date:
+            # No account-level metrics found
+            return date.min
+        start_date = earliest_date - timedelta(days=1)  # Start one day before to include earliest date
+    else:
+        start_date = watermark.processed_through
+
+    if matrix is None or matrix.from_date > start_date:
+        matrix = load_metrics_matrix(account_ids, start_date, parse_benchmark(benchmark))
+    # Total value, flows and cash across all accounts for every date
+    portfolio_series, external_cash_flows, cash_totals = matrix.total(start_date)
+    portfolio_series, external_cash_flows = align_to_sessions(portfolio_series, external_cash_flows,
+                                                              trading_calendar)
 
-    if not earliest_date:
-        # No account-level metrics found
-        return
+    if portfolio_series.empty:
+        return date.min if watermark is None else None
+
+    rows, rolling, state = compute_metrics(portfolio_series, external_cash_flows, cash_totals, watermark,
+                                           benchmark, matrix.benchmark_prices)
+    owner = {"user_id": user_id}
+    bulk_upsert(session, UserPortfolioMetricsSnapshot, [{**owner, **row} for row in rows])
+    bulk_upsert(session, UserPortfolioRollingReturn, rolling_return_rows(owner, rolling))
+
+    processed_through = portfolio_series.index[-1]
+    session.merge(UserPortfolioMetricsWatermark(
+        user_id=user_id,
+        calendar=calendar,
+        processed_through=processed_through,
+        upstream_checksum=upstream_checksums({
+            user_id: (account_ids, processed_through, parse_benchmark(benchmark))
+        })[user_id],
+        state=state,
+        updated_at=func.now()
+    ))
+    session.commit()
+    if watermark is None:
+        return date.min
+    return rows[0]["snapshot_date"] if rows else None
 
-    # Calculate user-level portfolio metrics
-    start_date = earliest_date - timedelta(days=1)  # Start one day before to include earliest date
-    portfolio_series = get_user_portfolio_series(user_id, start_date)
 
-    if portfolio_series.empty:
-        return
+def compute_metrics(portfolio_series: pd.Series, external_cash_flows: pd.Series, cash_balances: pd.Series,
+                    watermark=None, benchmark: str | None = None,
+                    benchmark_prices: pd.DataFrame | None = None) -> tuple[list[dict], dict[str, pd.Series], dict | None]:
+    """
+    Metrics rows (without the owner key) and rolling returns for the new dates of portfolio_series,
+    plus the running state to store on the watermark.
 
-    external_cash_flows, _ = get_user_cash_flows(user_id, start_date)
-    daily_returns = compute_daily_returns(portfolio_series, external_cash_flows)
-    twr = compute_twr_series(portfolio_series, external_cash_flows)
-    sharpe = compute_sharpe_ratio_series(daily_returns)
-    drawdown = compute_drawdown_series(portfolio_series)
-
-    for i in range(1, len(portfolio_series)):
-        snapshot_date = portfolio_series.index[i]
-        value = portfolio_series.iloc[i]
-
-        # Calculate total cash across all accounts for this date
-        cash_total = session.query(func.sum(PositionSnapshot.quantity)) \
-            .join(Account, PositionSnapshot.account_id == Account.account_id) \
-            .filter(
-                Account.user_id == user_id,
-                PositionSnapshot.as_of_date == snapshot_date,
-                PositionSnapshot.symbol == "CASH"
-            ).scalar() or 0
-
-        # Calculate rolling returns
-        rolling_7d = daily_returns.iloc[max(0, i - 6):i].add(1).prod() - 1 if i > 0 else 0
-        rolling_30d = daily_returns.iloc[max(0, i - 29):i].add(1).prod() - 1 if i > 0 else 0
-
-        twr_value = to_float(twr.get(snapshot_date))
-        sharpe_value = to_float(sharpe.get(snapshot_date))
-        drawdown_value = to_float(drawdown.get(snapshot_date))
-
-        session.merge(UserPortfolioMetricsSnapshot(
-            snapshot_date=snapshot_date,
-            user_id=user_id,
-            portfolio_value=to_float(value),
-            benchmark_value=None,
-            portfolio_daily_return=to_float(daily_returns.get(snapshot_date)),
-            benchmark_daily_return=None,
-            cash_balance=to_float(float(cash_total)),
-            twr_to_date=to_float(twr_value),
-            rolling_return_7d=to_float(rolling_7d),
-            rolling_return_30d=to_float(rolling_30d),
-            sharpe_to_date=to_float(sharpe_value),
-            drawdown_to_date=to_float(drawdown_value),
-        ))
+    Without a watermark the first date only seeds the returns, as in a full rebuild. With one, every
+    date is new: returns are measured from the stored last value, the TWR product and running peak
+    carry on, and Sharpe and rolling windows see the stored recent returns first, so appended rows
+    match what a rebuild would write.
 
-    session.commit()
+    The benchmark series is aligned as of every value date from benchmark_prices; its level and the
+    running sums behind alpha, beta, tracking error and information ratio carry on the same way.
+    Without a benchmark (or before it has prices) those columns stay empty.
+    """
+    state = watermark.state if watermark is not None else None
+    growth, history = 1.0, pd.Series(dtype=float)
+    values = portfolio_series
+    if state is not None:
+        values = pd.concat([pd.Series({watermark.processed_through: state["last_value"]}), portfolio_series])
+        growth = state["growth"]
+        history = pd.Series({date.fromisoformat(day): value for day, value in state["returns"]}, dtype=float)
+
+    daily_returns = pd.concat([history, compute_daily_returns(values, external_cash_flows)])
+    factors = compute_growth_factors(values, external_cash_flows)
+    factors.iloc[0] = growth  # the seed date's factor is 1; this continues the stored product
+    cumulative_growth = factors.cumprod()
+    twr = cumulative_growth - 1
+    sharpe = compute_sharpe_ratio_series(daily_returns)
+    drawdown = compute_drawdown_series(values, state["peak"] if state is not None else None)
+    rolling = {window: returns.iloc[len(history):]
+               for window, returns in compute_rolling_returns(daily_returns).items()}
+    cash_balances = cash_balances.reindex(values.index, fill_value=0.0)
+
+    weights = parse_benchmark(benchmark)
+    benchmark_levels = benchmark_returns = pd.Series(np.nan, index=values.index)
+    if weights:
+        benchmark_levels, benchmark_returns = compute_benchmark_levels(
+            weights, benchmark_prices, values.index, state.get("benchmark_level") if state is not None else None
+        )
+    relative, benchmark_sums = compute_relative_metrics(daily_returns.iloc[len(history):], benchmark_returns,
+                                                        state.get("benchmark_sums") if state is not None else None)
+
+    rows = []
+    for i in range(1, len(values)):
+        snapshot_date = values.index[i]
+        rows.append({
+            "snapshot_date": snapshot_date,
+            "portfolio_value": to_float(values.iloc[i]),
+            "benchmark_value": to_optional_float(benchmark_levels.iloc[i]),
+            "portfolio_daily_return": to_float(daily_returns.get(snapshot_date)),
+            "benchmark_daily_return": to_optional_float(benchmark_returns.iloc[i]),
+            "cash_balance": to_float(float(cash_balances.iloc[i])),
+            "twr_to_date": to_float(twr.get(snapshot_date)),
+            "rolling_return_7d": to_float(rolling["7d"].get(snapshot_date)),
+            "rolling_return_30d": to_float(rolling["30d"].get(snapshot_date)),
+            "sharpe_to_date": to_float(sharpe.get(snapshot_date)),
+            "drawdown_to_date": to_float(drawdown.get(snapshot_date)),
+            "alpha_to_date": to_optional_float(relative["alpha"].get(snapshot_date)),
+            "beta_to_date": to_optional_float(relative["beta"].get(snapshot_date)),
+            "tracking_error_to_date": to_optional_float(relative["tracking_error"].get(snapshot_date)),
+            "information_ratio_to_date": to_optional_float(relative["information_ratio"].get(snapshot_date)),
+        })
+
+    state = metrics_state(values, cumulative_growth, daily_returns, state["peak"] if state is not None else None)
+    if state is not None:
+        level = float(benchmark_levels.iloc[-1])
+        state.update({
+            "benchmark": benchmark,
+            "benchmark_level": level if np.isfinite(level) else None,
+            "benchmark_sums": benchmark_sums,
+        })
+    return rows, rolling, state
+
+
+def metrics_state(values: pd.Series, cumulative_growth: pd.Series, daily_returns: pd.Series,
+                  peak: float | None = None) -> dict | None:
+    """
+    What compute_metrics needs to append after the last date: its value, the TWR product, the
+    running peak, and the returns the Sharpe and rolling windows still reach (at least
+    RETURN_HISTORY of them, and all of the last date's year for ytd). None when any of it is not
+    finite, which makes the next incremental run rebuild instead. compute_metrics adds the
+    benchmark's level and running sums.
+    """
+    start = len(daily_returns) - RETURN_HISTORY
+    if not daily_returns.empty:
+        last_year = daily_returns.index[-1].year
+        start = min(start, next(i for i, day in enumerate(daily_returns.index) if day.year == last_year))
+    recent = daily_returns.iloc[max(0, start):]
+
+    state = {
+        "last_value": float(values.iloc[-1]),
+        "growth": float(cumulative_growth.iloc[-1]),
+        "peak": float(values.max()) if peak is None else max(peak, float(values.max())),
+        "returns": [[day.isoformat(), float(value)] for day, value in recent.items()],
+    }
+    numbers = [state["last_value"], state["growth"], state["peak"]] + [value for _, value in state["returns"]]
+    return state if np.isfinite(numbers).all() else None
+
+
+def rebuild_reason(watermark, calendar: str, benchmark: str | None, checksum: str) -> str | None:
+    """
+    Why the metrics behind a watermark cannot be appended to, or None when they can. checksum is the
+    upstream_checksums fingerprint of the watermark's inputs as they are now.
+    """
+    if watermark.calendar != calendar:
+        return "Calendar changed"
+    if watermark.state is None:
+        return "No running state stored"
+    if watermark.state.get("benchmark") != benchmark:
+        return "Benchmark changed"
+    if watermark.upstream_checksum != checksum:
+        return "Snapshots, cash flows or benchmark prices changed before the metrics watermark"
+    return None
+
+
+def upstream_checksums(owners: dict) -> dict[object, str]:
+    """
+    Fingerprints of the inputs metrics were computed from: the position snapshots (values and
+    quantities, CASH included), the external cash flows and the benchmark prices. owners maps a key to
+    (account_ids, through, benchmark_symbols), each account belonging to one owner per call; every
+    owner is covered by one grouped query per input.
+    """
+    if not owners:
+        return {}
+    through_by_account = {account_id: through for account_ids, through, _ in owners.values()
+                          for account_id in account_ids}
+    snapshots = {account_id: sums for account_id, *sums in session.query(
+        PositionSnapshot.account_id,
+        func.count(PositionSnapshot.symbol),
+        func.sum(PositionSnapshot.total_value),
+        func.sum(PositionSnapshot.quantity)
+    ).filter(
+        PositionSnapshot.account_id.in_(list(through_by_account)),
+        PositionSnapshot.as_of_date <= case(through_by_account, value=PositionSnapshot.account_id)
+    ).group_by(PositionSnapshot.account_id)}
+    cash_flows = {account_id: sums for account_id, *sums in session.query(
+        Transaction.account_id,
+        func.count(Transaction.transaction_id),
+        func.sum(Transaction.quantity)
+    ).filter(
+        Transaction.account_id.in_(list(through_by_account)),
+        Transaction.symbol == "CASH",
+        Transaction.date <= case(through_by_account, value=Transaction.account_id)
+    ).group_by(Transaction.account_id)}
+
+    priced = [(through, set(symbols)) for _, through, symbols in owners.values() if symbols]
+    prices = session.query(Price.symbol, Price.price_date, Price.price).filter(
+        Price.symbol.in_(sorted(set().union(*[symbols for _, symbols in priced]))),
+        Price.price_date <= max(through for through, _ in priced)
+    ).all() if priced else []
+
+    checksums = {}
+    for key, (account_ids, through, benchmark_symbols) in owners.items():
+        account_ids = sorted(account_ids, key=str)
+        inputs = (add_up([snapshots[account_id] for account_id in account_ids if account_id in snapshots], 3),
+                  add_up([cash_flows[account_id] for account_id in account_ids if account_id in cash_flows], 2))
+        if benchmark_symbols:
+            owner_prices = [price for symbol, day, price in prices if symbol in benchmark_symbols and day <= through]
+            inputs += (add_up([(1, price) for price in owner_prices], 2),)
+        checksums[key] = hashlib.sha256(repr(inputs).encode()).hexdigest()
+    return checksums
+
+
+def add_up(rows: list, width: int) -> tuple:
+    """(count, sum, ...) rows combined as one grouped query over all of them would return: 0 and None when empty."""
+    columns = list(zip(*rows)) or [()] * width
+    return (sum(columns[0]),) + tuple(
+        sum(value for value in values if value is not None) if any(value is not None for value in values) else None
+        for values in columns[1:]
+    )
 
 
-def recalculate_portfolio_metrics(email: str = 'venkatachalapatee@gmail.com'):
-    update_portfolio_metrics(email)
+def recalculate_portfolio_metrics(email: str | None = None, calendar: str = "all",
+                                  incremental: bool = False) -> dict[tuple, date]:
+    """
+    update_portfolio_metrics for one user, or for every user when no email is given. Returns the
+    first rewritten date of every owner, as update_portfolio_metrics does.
+    """
+    emails = [email] if email is not None else [
+        user_email for user_email, in session.query(User.email).filter(User.email.isnot(None)).order_by(User.email)
+    ]
+    rewritten = {}
+    for user_email in emails:
+        rewritten.update(update_portfolio_metrics(user_email, calendar, incremental))
+    return rewritten
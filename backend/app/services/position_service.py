@@ -1,49 +1,66 @@
+import time
 from collections import defaultdict
-from copy import deepcopy
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
 from datetime import timedelta
 from decimal import Decimal
 from typing import Type
 from datetime import date
+from uuid import UUID
 
 import dateutil.utils
+from sqlalchemy import text
 from sqlalchemy.orm import Session
 from sqlalchemy.sql import func
 
-from app.db import SessionLocal
-from app.models import TransactionType, RealizedPnL
+from app.db import SessionLocal, engine
+from app.models import TransactionType, RealizedPnL, PositionWatermark, PositionCheckpoint
 from app.models.account import Account
 from app.models.position import Position
-from app.models.position_snapshots import PositionSnapshot
 from app.models.transaction import Transaction
 from app.models.user import User
+from app.services.bulk_writer import bulk_insert
+from app.services.lot_engine import LotLedger
+from app.services.price_index import load_price_index
+from app.services.snapshot_store import DailySnapshotStore, get_snapshot_store
 from app.services.symbol import get_base_symbol
+from app.services.trading_calendar import EVERY_DAY, TradingCalendar, get_calendar
 
 session: Session = SessionLocal()
 
 CUTOFF_DATE = date(2025, 6, 1)
 
 
-def clear_positions(account: Type[Account]):
+def clear_positions(account: Type[Account], store=None):
     # Remove stale data starting from cutoff
-    session.query(PositionSnapshot).filter(
-        PositionSnapshot.account_id == account.account_id,
-        PositionSnapshot.as_of_date >= CUTOFF_DATE
-    ).delete()
+    clear_positions_from(store or DailySnapshotStore(session, account.account_id), CUTOFF_DATE)
 
     # Optional: Clear latest position as well
     session.query(Position).filter_by(account_id=account.account_id).delete()
 
+    session.flush()
+    session.commit()
+
+
+def clear_positions_from(store, from_date: date):
+    store.clear_from(from_date)
+
     # Clear realized P&L records
     session.query(RealizedPnL).filter(
-        RealizedPnL.account_id == account.account_id,
-        RealizedPnL.date >= CUTOFF_DATE
+        RealizedPnL.account_id == store.account_id,
+        RealizedPnL.date >= from_date
     ).delete()
 
-    session.flush()
-    session.commit()
+    # Checkpoints from this day on no longer match the history
+    session.query(PositionCheckpoint).filter(
+        PositionCheckpoint.account_id == store.account_id,
+        PositionCheckpoint.as_of_date >= from_date
+    ).delete()
 
 
-def recalculate_positions(email: str, initial_load: bool = False):
+def recalculate_positions(email: str, initial_load: bool = False, incremental: bool = False,
+                          snapshot_storage: str = "daily", workers: int = 1, lot_method: str | None = None,
+                          calendar: str = "all"):
     user = session.query(User).filter_by(email=email).first()
     if not user:
         raise ValueError(f"No user found with email: {email}")
@@ -53,58 +70,390 @@ def recalculate_positions(email: str, initial_load: bool = False):
         print("No accounts found for user.")
         return
 
-    for account in accounts:
-        txns = (
-            session.query(Transaction)
-            .filter_by(account_id=account.account_id)
-            .order_by(Transaction.date.asc())
-            .all()
-        )
+    options = {"initial_load": initial_load, "incremental": incremental, "snapshot_storage": snapshot_storage,
+               "lot_method": lot_method, "calendar": calendar}
+    recalculate_accounts([account.account_id for account in accounts], options, workers)
+
+    print(f"✅ Recalculated positions and snapshots for user: {email}")
+
+
+def recalculate_all_positions(initial_load: bool = False, incremental: bool = False,
+                              snapshot_storage: str = "daily", workers: int = 1, lot_method: str | None = None,
+                              calendar: str = "all"):
+    account_ids = [account_id for (account_id,) in session.query(Account.account_id).order_by(Account.user_id)]
+    if not account_ids:
+        print("No accounts found.")
+        return
+
+    options = {"initial_load": initial_load, "incremental": incremental, "snapshot_storage": snapshot_storage,
+               "lot_method": lot_method, "calendar": calendar}
+    recalculate_accounts(account_ids, options, workers)
+
+    print(f"✅ Recalculated positions and snapshots for {len(account_ids)} account(s)")
+
+
+def recalculate_accounts(account_ids: list, options: dict, workers: int = 1):
+    """
+    Recalculates each account, in this process or sharded across a pool of worker processes.
+    Every worker has its own engine connections and session, and each account is guarded by a
+    Postgres advisory lock so two workers (or two runs) never write the same account.
+    """
+    started = time.perf_counter()
+    account_ids = [str(account_id) for account_id in account_ids]
+
+    results = []
+    if workers > 1 and len(account_ids) > 1:
+        session.close()  # don't hand the parent's checked-out connection to the workers
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+            futures = [pool.submit(recalculate_account_by_id, account_id, options) for account_id in account_ids]
+            for future in as_completed(futures):
+                results.append(future.result())
+                print_account_timing(*results[-1])
+    else:
+        for account_id in account_ids:
+            results.append(recalculate_account_by_id(account_id, options))
+            print_account_timing(*results[-1])
+
+    elapsed = time.perf_counter() - started
+    busy = sum(seconds for _, seconds, _ in results)
+    print(f"⏱ {len(results)} account(s) in {elapsed:.2f}s wall, {busy:.2f}s total account time, {workers} worker(s)")
+
+    failed = [account_id for account_id, _, status in results if status.startswith("failed")]
+    if failed:
+        raise RuntimeError(f"Recalculation failed for account(s): {', '.join(failed)}")
+
+
+def init_worker():
+    """Pool initializer: drop connections inherited from the parent and open a fresh session."""
+    global session
+    engine.dispose(close=False)
+    session = SessionLocal()
+
+
+def recalculate_account_by_id(account_id: str, options: dict) -> tuple[str, float, str]:
+    started = time.perf_counter()
+    try:
+        with account_lock(account_id) as acquired:
+            if not acquired:
+                return account_id, time.perf_counter() - started, "skipped: locked by another worker"
+            account = session.get(Account, UUID(account_id))
+            recalculate_account(account, **options)
+        status = "ok"
+    except Exception as e:
+        session.rollback()
+        status = f"failed: {e}"
+    return account_id, time.perf_counter() - started, status
+
+
+def print_account_timing(account_id: str, seconds: float, status: str):
+    print(f"[{account_id}] {seconds:8.2f}s  {status}")
+
+
+@contextmanager
+def account_lock(account_id):
+    """
+    Yields whether this process holds the account's advisory lock. The lock lives on its own
+    connection so the commits made while recalculating do not release it. No-op off Postgres.
+    """
+    bind = session.get_bind()
+    if bind.dialect.name != "postgresql":
+        yield True
+        return
+
+    key = UUID(str(account_id)).int % (2 ** 63)  # advisory lock keys are signed bigints
+    with bind.connect() as connection:
+        acquired = connection.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": key}).scalar()
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": key})
+
+
+def recalculate_account(account: Type[Account], initial_load: bool = False, incremental: bool = False,
+                        snapshot_storage: str = "daily", lot_method: str | None = None, calendar: str = "all"):
+    trading_calendar = get_calendar(calendar)
+
+    if initial_load:
+        txns = load_transactions(account.account_id)
         if not txns:
-            continue
+            return
+        lots = LotLedger(lot_method) if lot_method else None
+        symbol_data, daily_realized_pnl = aggregate_transactions(txns, track_cash=False, lots=lots)
+        save_positions(account.account_id, symbol_data, dateutil.utils.today().date())
+        save_position_snapshot(account.account_id, symbol_data, dateutil.utils.today().date())
+    elif incremental:
+        store = get_snapshot_store(snapshot_storage, session, account.account_id)
+        incremental_replay(account, store, lot_method, trading_calendar)
+    else:
+        store = get_snapshot_store(snapshot_storage, session, account.account_id)
+        full_replay(account, store, lot_method, trading_calendar)
+    session.commit()
 
-        if initial_load:
-            symbol_data, daily_realized_pnl = aggregate_transactions(txns, track_cash=False)
-            end_date = txns[-1].date
-            save_positions(account.account_id, symbol_data, dateutil.utils.today().date())
-            save_position_snapshot(account.account_id, symbol_data, dateutil.utils.today().date())
-            session.commit()
-        else:
-            clear_positions(account)
-            last_snapshot_date = session.query(func.max(PositionSnapshot.as_of_date)).filter_by(
-                account_id=account.account_id
-            ).scalar()
-            #  I guess we need to make sure the previous data is reconstructed with positions and not from transactions
-            #  getting it from transactions may mess up the cash
-            start_date = last_snapshot_date + timedelta(days=1) if last_snapshot_date else txns[0].date
-            end_date = dateutil.utils.today().date()
-
-            # Start by aggregating until start_date
-            prev_txns: list[Type[Transaction]] = [txn for txn in txns if txn.date < start_date]
-            symbol_data, daily_realized_pnl = aggregate_transactions(prev_txns, track_cash=False)
-            previous_day_data = deepcopy(symbol_data)
-
-            current_date = start_date
-            while current_date <= end_date:
-                day_txns = [txn for txn in txns if txn.date == current_date]
-                symbol_data, daily_realized_pnl = update_with_day_transactions(previous_day_data, day_txns)
-                save_position_snapshot(account.account_id, symbol_data, current_date)
-                save_realized_pnl(account.account_id, daily_realized_pnl, current_date)
-                previous_day_data = deepcopy(symbol_data)
-                current_date += timedelta(days=1)
-            save_positions(account.account_id, symbol_data, end_date)  # Save only latest position once
-        session.commit()
 
-    print(f"✅ Recalculated positions and snapshots for user: {email}")
+def load_transactions(account_id, from_date: date | None = None) -> list[Type[Transaction]]:
+    query = session.query(Transaction).filter(Transaction.account_id == account_id)
+    if from_date is not None:
+        query = query.filter(Transaction.date >= from_date)
+    return query.order_by(Transaction.date.asc()).all()
+
+
+def full_replay(account: Type[Account], store, lot_method: str | None = None,
+                calendar: TradingCalendar = EVERY_DAY):
+    txns = load_transactions(account.account_id)
+    if not txns:
+        return
+
+    clear_positions(account, store)
+    last_snapshot_date = store.last_snapshot_date()
+    #  I guess we need to make sure the previous data is reconstructed with positions and not from transactions
+    #  getting it from transactions may mess up the cash
+    start_date = last_snapshot_date + timedelta(days=1) if last_snapshot_date else txns[0].date
+    end_date = calendar.roll_back(dateutil.utils.today().date())
+    # Checkpoints before start_date stay with the snapshots they were written alongside
+    session.query(PositionCheckpoint).filter(
+        PositionCheckpoint.account_id == account.account_id,
+        PositionCheckpoint.as_of_date >= start_date
+    ).delete()
+
+    # Start by aggregating until start_date
+    lots = LotLedger(lot_method) if lot_method else None
+    prev_txns: list[Type[Transaction]] = [txn for txn in txns if txn.date < start_date]
+    symbol_data, daily_realized_pnl = aggregate_transactions(prev_txns, track_cash=False, lots=lots)
+
+    symbol_data = replay_days(store, symbol_data, txns, start_date, end_date, lots, calendar)
+    save_positions(account.account_id, symbol_data, end_date)  # Save only latest position once
+    save_watermark(store, start_date, end_date, txns[-1], symbol_data, lots, calendar)
+
+
+def incremental_replay(account: Type[Account], store, lot_method: str | None = None,
+                       calendar: TradingCalendar = EVERY_DAY):
+    """
+    Replays only the transactions newer than the account's watermark. When an import has
+    inserted rows dated on or before the watermark, everything from the earliest such date
+    is invalidated and rewritten; the state for the day before is rebuilt in memory.
+    """
+    watermark = session.get(PositionWatermark, account.account_id)
+    if watermark is None:
+        print(f"[{account.account_id}] No watermark yet, running a full replay.")
+        full_replay(account, store, lot_method, calendar)
+        return
+    if (watermark.snapshot_storage, watermark.lot_method, watermark.calendar) != (store.mode, lot_method, calendar.name):
+        print(f"[{account.account_id}] Snapshot storage, lot method or calendar changed, running a full replay.")
+        full_replay(account, store, lot_method, calendar)
+        return
+
+    backdated_from = session.query(func.min(Transaction.date)).filter(
+        Transaction.account_id == account.account_id,
+        Transaction.date <= watermark.processed_through,
+        Transaction.created_at > watermark.updated_at
+    ).scalar()
+
+    if backdated_from is None:
+        known_count = session.query(func.count(Transaction.transaction_id)).filter(
+            Transaction.account_id == account.account_id,
+            Transaction.date <= watermark.processed_through
+        ).scalar()
+        if known_count != watermark.transaction_count:
+            # Rows were removed (or slipped in unnoticed) and we cannot tell from which day
+            print(f"[{account.account_id}] Transaction history changed before the watermark, running a full replay.")
+            full_replay(account, store, lot_method, calendar)
+            return
+
+        replay_start = watermark.replay_start
+        start_date = watermark.processed_through + timedelta(days=1)
+        symbol_data = deserialize_symbol_data(watermark.symbol_data)
+        lots = LotLedger.from_dict(watermark.lot_state) if lot_method else None
+        txns = load_transactions(account.account_id, start_date)
+    else:
+        print(f"[{account.account_id}] Back-dated transactions found, replaying from {backdated_from}.")
+        all_txns = load_transactions(account.account_id)
+        replay_start = min(backdated_from, watermark.replay_start)
+        start_date = backdated_from
+
+        # Rebuild the state as of the day before, the same way the full replay would have
+        lots = LotLedger(lot_method) if lot_method else None
+        symbol_data, _ = aggregate_transactions([txn for txn in all_txns if txn.date < replay_start],
+                                                track_cash=False, lots=lots)
+        symbol_data, _ = update_with_day_transactions(
+            symbol_data, [txn for txn in all_txns if replay_start <= txn.date < start_date], lots=lots
+        )
+        clear_positions_from(store, start_date)
+        txns = [txn for txn in all_txns if txn.date >= start_date]
+
+    end_date = max(calendar.roll_back(dateutil.utils.today().date()), watermark.processed_through)
+    if start_date <= end_date:
+        symbol_data = replay_days(store, symbol_data, txns, start_date, end_date, lots, calendar)
+
+    save_positions(account.account_id, symbol_data, end_date)
+    last_txn = txns[-1] if txns else None
+    save_watermark(store, replay_start, end_date, last_txn, symbol_data, lots, calendar, previous=watermark)
+
+
+def replay_days(store, symbol_data, txns: list[Type[Transaction]], start_date: date, end_date: date,
+                lots: LotLedger | None = None, calendar: TradingCalendar = EVERY_DAY):
+    if store.valued:
+        # One as-of index for the whole replay, so snapshots are written already valued
+        symbols = set(symbol_data) | {txn.symbol for txn in txns} | {"CASH"}
+        store.price_index = load_price_index(session, symbols, start_date, end_date)
+
+    pnl_rows = []
+    checkpoint_rows = []
+    days = iter_replay(symbol_data, txns, start_date, end_date, lots, calendar)
+    for current_date, day_state, daily_realized_pnl in days:
+        store.write(day_state, current_date)
+        pnl_rows.extend(realized_pnl_rows(store.account_id, daily_realized_pnl, current_date))
+        if calendar.is_last_session_of_month(current_date):
+            checkpoint_rows.append(checkpoint_row(store.account_id, day_state, current_date, lots))
+        symbol_data = day_state
+
+    # One bulk write per table for the whole replay
+    store.flush()
+    bulk_insert(session, RealizedPnL, pnl_rows)
+    bulk_insert(session, PositionCheckpoint, checkpoint_rows)
+    return symbol_data
+
+
+def iter_replay(symbol_data, txns: list[Type[Transaction]], start_date: date, end_date: date,
+                lots: LotLedger | None = None, calendar: TradingCalendar | None = None):
+    """
+    Replays txns day by day from start_date to end_date, yielding (day, symbol_data, realized_pnl).
+
+    The caller's symbol_data is copied once up front; after that the same dict is mutated in place
+    and yielded every day, so consumers that need to keep a day's state must freeze_symbol_data() it.
+    """
+    symbol_data = freeze_symbol_data(symbol_data)
+    for current_date, day_txns in iter_days(txns, start_date, end_date, calendar):
+        daily_realized_pnl = apply_day_transactions(symbol_data, day_txns, lots=lots)
+        yield current_date, symbol_data, daily_realized_pnl
+
+
+def iter_days(txns: list[Type[Transaction]], start_date: date, end_date: date,
+              calendar: TradingCalendar | None = None):
+    """
+    Yields (day, transactions for that day) for every session of the calendar in [start_date, end_date]
+    (every calendar day by default), walking a date-sorted cursor over txns once. Transactions dated
+    on a non-session day roll into the next session; those outside the range are ignored.
+    """
+    txns = sorted(txns, key=lambda txn: txn.date)  # no-op cost when already sorted; keeps same-day order
+    cursor = 0
+    while cursor < len(txns) and txns[cursor].date < start_date:
+        cursor += 1
+
+    for current_date in (calendar or EVERY_DAY).sessions(start_date, end_date):
+        day_start = cursor
+        while cursor < len(txns) and txns[cursor].date <= current_date:
+            cursor += 1
+        yield current_date, txns[day_start:cursor]
+
+
+def freeze_symbol_data(symbol_data):
+    """Copies the per-symbol dicts; the Decimal values inside are immutable so a shallow copy each is enough."""
+    frozen = new_symbol_data()
+    for symbol, data in symbol_data.items():
+        frozen[symbol] = dict(data)
+    return frozen
+
+
+def save_watermark(store, replay_start: date, processed_through: date, last_txn: Type[Transaction] | None,
+                   symbol_data, lots: LotLedger | None = None, calendar: TradingCalendar = EVERY_DAY,
+                   previous: PositionWatermark | None = None):
+    transaction_count = session.query(func.count(Transaction.transaction_id)).filter(
+        Transaction.account_id == store.account_id,
+        Transaction.date <= processed_through
+    ).scalar()
+
+    if last_txn is not None:
+        last_transaction_id, last_transaction_date = last_txn.transaction_id, last_txn.date
+    elif previous is not None:
+        last_transaction_id, last_transaction_date = previous.last_transaction_id, previous.last_transaction_date
+    else:
+        last_transaction_id, last_transaction_date = None, None
+
+    session.merge(PositionWatermark(
+        account_id=store.account_id,
+        snapshot_storage=store.mode,
+        calendar=calendar.name,
+        replay_start=replay_start,
+        processed_through=processed_through,
+        last_transaction_id=last_transaction_id,
+        last_transaction_date=last_transaction_date,
+        transaction_count=transaction_count,
+        symbol_data=serialize_symbol_data(symbol_data),
+        lot_method=lots.method if lots is not None else None,
+        lot_state=lots.to_dict() if lots is not None else None,
+        updated_at=func.now()
+    ))
+
+
+def checkpoint_row(account_id, symbol_data, as_of_date: date, lots: LotLedger | None = None) -> dict:
+    return {
+        "account_id": account_id,
+        "as_of_date": as_of_date,
+        "symbol_data": serialize_symbol_data(symbol_data),
+        "lot_method": lots.method if lots is not None else None,
+        "lot_state": lots.to_dict() if lots is not None else None,
+    }
+
+
+def new_symbol_data():
+    return defaultdict(lambda: {"qty": Decimal(0), "total_cost": Decimal(0), "first_action": None})
+
+
+def serialize_symbol_data(symbol_data) -> dict:
+    return {
+        symbol: {
+            "qty": str(data["qty"]),
+            "total_cost": str(data["total_cost"]),
+            "first_action": data["first_action"],
+        }
+        for symbol, data in symbol_data.items()
+    }
+
+
+def deserialize_symbol_data(payload: dict):
+    symbol_data = new_symbol_data()
+    for symbol, data in payload.items():
+        symbol_data[symbol] = {
+            "qty": Decimal(data["qty"]),
+            "total_cost": Decimal(data["total_cost"]),
+            "first_action": data["first_action"],
+        }
+    return symbol_data
+
+
+def aggregate_transactions(txns: list[Type[Transaction]], track_cash: bool = True, lots: LotLedger | None = None):
+    symbol_data = new_symbol_data()
+    daily_realized_pnl = apply_day_transactions(symbol_data, txns, track_cash=track_cash, lots=lots)
+    return symbol_data, daily_realized_pnl
+
+
+def update_with_day_transactions(symbol_data, txns: list[Type[Transaction]], track_cash: bool = True,
+                                 lots: LotLedger | None = None):
+    symbol_data = freeze_symbol_data(symbol_data)  # don't mutate caller’s dict (the lot ledger is advanced)
+    daily_realized_pnl = apply_day_transactions(symbol_data, txns, track_cash=track_cash, lots=lots)
+    return symbol_data, daily_realized_pnl
+
 
+def lot_open_dates(txn: Type[Transaction]) -> list[date] | None:
+    """Lots picked for specific identification, as journal_details["lot_open_dates"] ISO dates."""
+    details = getattr(txn, "journal_details", None)
+    if isinstance(details, dict) and details.get("lot_open_dates"):
+        return [date.fromisoformat(value) for value in details["lot_open_dates"]]
+    return None
 
-def aggregate_transactions(txns: list[Type[Transaction]], track_cash: bool = True):
-    symbol_data = defaultdict(lambda: {"qty": Decimal(0), "total_cost": Decimal(0), "first_action": None})
-    return update_with_day_transactions(symbol_data, txns, track_cash=track_cash)
 
+def apply_day_transactions(symbol_data, txns: list[Type[Transaction]], track_cash: bool = True,
+                           lots: LotLedger | None = None):
+    """
+    Applies txns to symbol_data in place and returns the realized P&L records they produced.
 
-def update_with_day_transactions(symbol_data, txns: list[Type[Transaction]], track_cash: bool = True):
-    symbol_data = deepcopy(symbol_data)  # don't mutate caller’s dict
+    Without lots, closing trades are matched at average cost. With a LotLedger, opening trades add
+    lots, closing trades relieve them with the ledger's method and the relieved lots' cost, and the
+    realized P&L is split into short- and long-term parts. A closing trade larger than the open lots
+    realizes P&L on those and opens the rest as a lot on the other side; journaling out more shares
+    than the lots hold raises ValueError.
+    """
     daily_realized_pnl = []  # Track realized P&L records
 
     for txn in txns:
@@ -154,6 +503,9 @@ def update_with_day_transactions(symbol_data, txns: list[Type[Transaction]], tra
                         # Calculate proportionally for outgoing transfers or when no cost basis is provided
                         cost_ratio = abs(qty) / symbol_data[symbol]["qty"] if qty < 0 else 0
                         transferred_cost = symbol_data[symbol]["total_cost"] * cost_ratio if qty < 0 else amount
+                        if lots is not None and qty < 0:
+                            # Outgoing shares leave with the cost of the lots they are taken from
+                            transferred_cost = lots.relieve(symbol, qty, txn.date, 1, lot_open_dates(txn)).cost_basis
 
                     # Update total cost - subtract for outgoing, add for incoming
                     if qty < 0:  # Shares leaving this account
@@ -168,6 +520,10 @@ def update_with_day_transactions(symbol_data, txns: list[Type[Transaction]], tra
                         else:
                             symbol_data[symbol]["total_cost"] += amount
 
+                if lots is not None and qty > 0:
+                    incoming_cost = journal_cost_basis if journal_cost_basis is not None else amount
+                    lots.open(symbol, qty, incoming_cost / qty, txn.date)
+
                 # Update the quantity
                 symbol_data[symbol]["qty"] += qty
 
@@ -190,14 +546,25 @@ def update_with_day_transactions(symbol_data, txns: list[Type[Transaction]], tra
             avg_unit_cost = current_total_cost / current_qty if current_qty else Decimal(0)
             closed_qty = abs(qty)  # qty is signed, we want the amount traded
 
-            cost_basis = avg_unit_cost * closed_qty
             sale_proceeds = price * closed_qty
             if instrument_type == "option":
                 sale_proceeds *= 100
-            if action in ["sell", "sell_to_close"]:
-                realized = sale_proceeds - cost_basis
+            direction = 1 if action in ["sell", "sell_to_close"] else -1  # P&L sign: long vs short close
+
+            short_term_pnl = long_term_pnl = None
+            if lots is not None:
+                lot_side = 1 if current_qty > 0 else -1
+                # Closing more than the open lots hold crosses through zero: the excess opens the other side
+                proceeds_per_unit = sale_proceeds / closed_qty
+                closed_qty = min(closed_qty, lots.open_quantity(symbol, lot_side))
+                sale_proceeds = proceeds_per_unit * closed_qty
+                relief = lots.relieve(symbol, closed_qty, txn.date, lot_side, lot_open_dates(txn))
+                cost_basis = relief.cost_basis
+                short_term_pnl = direction * (proceeds_per_unit * relief.short_term_quantity - relief.short_term_cost)
+                long_term_pnl = direction * (proceeds_per_unit * relief.long_term_quantity - relief.long_term_cost)
             else:
-                realized = cost_basis - sale_proceeds
+                cost_basis = avg_unit_cost * closed_qty
+            realized = direction * (sale_proceeds - cost_basis)
 
             daily_realized_pnl.append({
                 "symbol": symbol,
@@ -208,10 +575,26 @@ def update_with_day_transactions(symbol_data, txns: list[Type[Transaction]], tra
                 "cost_basis": cost_basis,
                 "proceeds": sale_proceeds,
                 "action": txn.action,
-                "instrument_type": instrument_type
+                "instrument_type": instrument_type,
+                "short_term_pnl": short_term_pnl,
+                "long_term_pnl": long_term_pnl,
             })
 
+            if lots is not None:
+                # The relieved lots' cost leaves the position instead of the trade amount
+                symbol_data[symbol]["total_cost"] -= lot_side * cost_basis
+                excess = abs(qty) - closed_qty
+                if excess > 0:
+                    lots.open(symbol, -lot_side * excess, amount / qty, txn.date)
+                    symbol_data[symbol]["total_cost"] -= lot_side * excess * amount / qty
+                symbol_data[symbol]["qty"] += qty
+                if track_cash:
+                    symbol_data["CASH"]["qty"] -= amount
+                continue
+
         if action in ["buy", "sell", "buy_to_open", "sell_to_close", "sell_to_open", "buy_to_close"]:
+            if lots is not None and qty != 0:
+                lots.open(symbol, qty, amount / qty, txn.date)
             symbol_data[symbol]["total_cost"] += amount
             symbol_data[symbol]["qty"] += qty
             if track_cash:
@@ -220,14 +603,17 @@ def update_with_day_transactions(symbol_data, txns: list[Type[Transaction]], tra
     if track_cash and ("CASH" not in symbol_data or symbol_data["CASH"]["first_action"] is None):
         symbol_data["CASH"]["first_action"] = TransactionType.BUY.value
 
-    return symbol_data, daily_realized_pnl
+    return daily_realized_pnl
 
 
 def save_positions(account_id, symbol_data, snapshot_date):
     # Delete all existing positions for this account
     session.query(Position).filter_by(account_id=account_id).delete()
-    session.flush()  # Ensure deletion happens before inserts
+    bulk_insert(session, Position, position_rows(account_id, symbol_data, snapshot_date))
 
+
+def position_rows(account_id, symbol_data, snapshot_date) -> list[dict]:
+    rows = []
     for symbol, data in symbol_data.items():
         quantity = round(data["qty"], 5)
         total_cost = data["total_cost"]
@@ -237,75 +623,64 @@ def save_positions(account_id, symbol_data, snapshot_date):
         if quantity == 0:
             continue  # Skip zero-quantity positions
 
-        session.add(Position(
-            account_id=account_id,
-            symbol=symbol,
-            quantity=quantity,
-            avg_cost=avg_cost,
-            last_updated=snapshot_date,
-            action=first_action
-        ))
+        rows.append({
+            "account_id": account_id,
+            "symbol": symbol,
+            "quantity": quantity,
+            "avg_cost": avg_cost,
+            "last_updated": snapshot_date,
+            "action": first_action,
+        })
+    return rows
 
 
 def save_position_snapshot(account_id, symbol_data, snapshot_date):
-    session.query(PositionSnapshot).filter_by(account_id=account_id, as_of_date=snapshot_date).delete()
+    store = DailySnapshotStore(session, account_id,
+                               load_price_index(session, symbol_data, snapshot_date, snapshot_date))
+    store.write(symbol_data, snapshot_date)
+    store.flush()
 
-    for symbol, data in symbol_data.items():
-        quantity = round(data["qty"], 5)
-        total_cost = data["total_cost"]
-        first_action = data["first_action"] or TransactionType.BUY.value
-
-        # ✅ Special case for CASH
-        if symbol == "CASH":
-            avg_cost = Decimal("1.0")
-        else:
-            avg_cost = round(total_cost / quantity, 5) if quantity else None
 
-        if quantity == 0:
-            continue
-
-        session.add(PositionSnapshot(
-            account_id=account_id,
-            symbol=symbol,
-            quantity=quantity,
-            avg_cost=avg_cost,
-            as_of_date=snapshot_date,
-            action=first_action
-        ))
-
-
-def merge_pnl_records(pnls: list[RealizedPnL]) -> list[RealizedPnL]:
+def merge_pnl_records(pnls: list[dict]) -> list[dict]:
     merged = {}
     for pnl in pnls:
-        key = (pnl.account_id, pnl.option_symbol, pnl.date)
+        key = (pnl["account_id"], pnl["option_symbol"], pnl["date"])
         if key not in merged:
             merged[key] = pnl
         else:
             existing = merged[key]
-            existing.realized_pnl += pnl.realized_pnl
-            existing.quantity_closed += pnl.quantity_closed
-            existing.cost_basis += pnl.cost_basis
-            existing.proceeds += pnl.proceeds
+            existing["realized_pnl"] += pnl["realized_pnl"]
+            existing["quantity_closed"] += pnl["quantity_closed"]
+            existing["cost_basis"] += pnl["cost_basis"]
+            existing["proceeds"] += pnl["proceeds"]
+            for split in ("short_term_pnl", "long_term_pnl"):
+                if pnl[split] is not None:
+                    existing[split] = (existing[split] or 0) + pnl[split]
     return list(merged.values())
 
 
-def save_realized_pnl(account_id, pnl_records, date):
+def realized_pnl_rows(account_id, pnl_records, date) -> list[dict]:
     realized_pnls = []
     for record in pnl_records:
         if record["qty"] == 0 or record["pnl"] == 0:
             continue
-        realized_pnls.append(RealizedPnL(
-            account_id=account_id,
-            base_symbol=record["base_symbol"],
-            option_symbol=record["option_symbol"],
-            date=date,
-            realized_pnl=round(record["pnl"], 2),
-            quantity_closed=record["qty"],
-            cost_basis=round(record["cost_basis"], 5),
-            proceeds=round(record["proceeds"], 5),
-            action=record["action"],
-            instrument_type=record["instrument_type"]
-        ))
-
-    merged = merge_pnl_records(realized_pnls)
-    session.bulk_save_objects(merged)
+        realized_pnls.append({
+            "account_id": account_id,
+            "base_symbol": record["base_symbol"],
+            "option_symbol": record["option_symbol"],
+            "date": date,
+            "realized_pnl": round(record["pnl"], 2),
+            "quantity_closed": record["qty"],
+            "cost_basis": round(record["cost_basis"], 5),
+            "proceeds": round(record["proceeds"], 5),
+            "action": record["action"],
+            "instrument_type": record["instrument_type"],
+            "short_term_pnl": round(record["short_term_pnl"], 2) if record.get("short_term_pnl") is not None else None,
+            "long_term_pnl": round(record["long_term_pnl"], 2) if record.get("long_term_pnl") is not None else None,
+        })
+
+    return merge_pnl_records(realized_pnls)
+
+
+def save_realized_pnl(account_id, pnl_records, date):
+    bulk_insert(session, RealizedPnL, realized_pnl_rows(account_id, pnl_records, date))
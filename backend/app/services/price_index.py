@@ -0,0 +1,85 @@
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal, ROUND_HALF_UP
+
+from sqlalchemy import and_, func
+from sqlalchemy.orm import Session
+
+from app.models.price import Price
+
+# Define precision to 5 decimal places
+PRECISION = Decimal("0.00001")
+
+
+def value_snapshot(symbol: str, quantity, price) -> tuple[Decimal, Decimal]:
+    """Price and total value of a snapshot, quantized to 5 decimals; options are valued per 100 shares."""
+    price_val = Decimal(str(price)).quantize(PRECISION, rounding=ROUND_HALF_UP)
+    total_val = Decimal(str(quantity)) * price_val
+    # Check if it's an option symbol (e.g., "TSLA_2025-06-20_210.0_PUT")
+    if "_" in symbol:
+        total_val *= 100
+    return price_val, total_val.quantize(PRECISION, rounding=ROUND_HALF_UP)
+
+
+class AsOfPriceIndex:
+    """Stored prices by symbol, answering the latest price on or before a date by binary search."""
+
+    def __init__(self, rows):
+        by_symbol = defaultdict(list)
+        for symbol, price_date, price in rows:
+            by_symbol[symbol].append((price_date, price))
+        self.dates: dict[str, list[date]] = {}
+        self.prices: dict[str, list] = {}
+        for symbol, points in by_symbol.items():
+            points.sort()
+            self.dates[symbol] = [price_date for price_date, _ in points]
+            self.prices[symbol] = [price for _, price in points]
+
+    def price(self, symbol: str, as_of_date: date):
+        """Latest price of symbol on or before as_of_date, or None before its first price."""
+        dates = self.dates.get(symbol)
+        if not dates:
+            return None
+        position = bisect_right(dates, as_of_date)
+        return self.prices[symbol][position - 1] if position else None
+
+    def settled_price(self, symbol: str, as_of_date: date):
+        """
+        Price of symbol as of as_of_date once a newer close can no longer change it: one dated that
+        day, or an earlier one when a later price is already known. None otherwise, e.g. today's
+        before its close is stored, so the snapshot is left for hydrate_missing_prices.
+        """
+        dates = self.dates.get(symbol)
+        if not dates:
+            return None
+        position = bisect_right(dates, as_of_date)
+        if not position or (dates[position - 1] < as_of_date and position == len(dates)):
+            return None
+        return self.prices[symbol][position - 1]
+
+
+def load_price_index(session: Session, symbols, start_date: date, end_date: date) -> AsOfPriceIndex:
+    """
+    Prices of the symbols dated from start_date through end_date, plus each symbol's latest price
+    before start_date so that the first days are covered too; two queries in all.
+    """
+    symbols = sorted(symbols)
+    if not symbols:
+        return AsOfPriceIndex([])
+
+    latest_before = (
+        session.query(Price.symbol, func.max(Price.price_date).label("price_date"))
+        .filter(Price.symbol.in_(symbols), Price.price_date < start_date)
+        .group_by(Price.symbol)
+        .subquery()
+    )
+    rows = session.query(Price.symbol, Price.price_date, Price.price).join(
+        latest_before, and_(Price.symbol == latest_before.c.symbol, Price.price_date == latest_before.c.price_date)
+    ).all()
+    rows += session.query(Price.symbol, Price.price_date, Price.price).filter(
+        Price.symbol.in_(symbols),
+        Price.price_date >= start_date,
+        Price.price_date <= end_date
+    ).all()
+    return AsOfPriceIndex(rows)
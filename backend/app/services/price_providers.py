@@ -0,0 +1,182 @@
+import csv
+import os
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+from functools import partial
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+from app.services.fetch_scheduler import FetchScheduler
+
+PRICE_PROVIDERS = ("yahoo", "file")
+# Equities per multi-ticker download; batches are fetched concurrently
+EQUITY_BATCH_SIZE = 100
+
+
+def parse_option_symbol(option_symbol: str):
+    try:
+        parts = option_symbol.split("_")
+        underlying = parts[0]
+        expiry = parts[1]
+        strike = float(parts[2])
+        option_type = parts[3].lower()
+        return underlying, expiry, strike, option_type
+    except Exception as e:
+        raise ValueError(f"Invalid option symbol format: {option_symbol}") from e
+
+
+class OptionChainCache:
+    """
+    Option chains keyed by (underlying, expiry), each downloaded at most once per run. With a
+    directory, chains are also kept there as one .npz file per chain and day, so later runs on the
+    same day read them from disk.
+    """
+
+    def __init__(self, directory: str | None = None, today: date | None = None):
+        self.directory = directory
+        self.today = today or date.today()
+        self.chains: dict[tuple[str, str], pd.Series] = {}
+
+    def chain(self, underlying: str, expiry: str) -> pd.Series:
+        """Last price by (option_type, strike) for one chain, puts and calls together."""
+        key = (underlying, expiry)
+        if key not in self.chains:
+            chain = self.load(key)
+            if chain is None:
+                chain = self.download(underlying, expiry)
+                self.save(key, chain)
+            self.chains[key] = chain
+        return self.chains[key]
+
+    def cached(self, key: tuple[str, str]) -> bool:
+        if key not in self.chains:
+            chain = self.load(key)
+            if chain is not None:
+                self.chains[key] = chain
+        return key in self.chains
+
+    @staticmethod
+    def download(underlying: str, expiry: str) -> pd.Series:
+        chain = yf.Ticker(underlying).option_chain(expiry)
+        frames = [frame[["strike", "lastPrice"]].assign(option_type=option_type)
+                  for option_type, frame in (("call", chain.calls), ("put", chain.puts))]
+        prices = pd.concat(frames, ignore_index=True).astype({"strike": float, "lastPrice": float})
+        # The first row of a repeated strike wins, as in the per-symbol lookup
+        return prices.drop_duplicates(["option_type", "strike"]).set_index(["option_type", "strike"])["lastPrice"]
+
+    def path(self, key: tuple[str, str]) -> str:
+        underlying, expiry = key
+        return os.path.join(self.directory, f"{underlying}_{expiry}_{self.today.isoformat()}.npz")
+
+    def load(self, key: tuple[str, str]) -> pd.Series | None:
+        if not self.directory or not os.path.exists(self.path(key)):
+            return None
+        with np.load(self.path(key)) as arrays:
+            index = pd.MultiIndex.from_arrays([arrays["option_type"], arrays["strike"]],
+                                              names=["option_type", "strike"])
+            return pd.Series(arrays["last_price"], index=index, name="lastPrice")
+
+    def save(self, key: tuple[str, str], chain: pd.Series):
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        np.savez(self.path(key), option_type=chain.index.get_level_values("option_type").to_numpy(dtype=str),
+                 strike=chain.index.get_level_values("strike").to_numpy(), last_price=chain.to_numpy())
+
+    def prices(self, symbols: list[str], scheduler: FetchScheduler) -> dict[str, Decimal]:
+        """
+        Last price of every option symbol found in its chain. Chains are fetched through the
+        scheduler; those that fail are left out here and recorded in its report.
+        """
+        groups: dict[tuple[str, str], list[tuple[str, float, str]]] = defaultdict(list)
+        for symbol in symbols:
+            underlying, expiry, strike, option_type = parse_option_symbol(symbol)
+            groups[(underlying, expiry)].append((symbol, strike, option_type))
+
+        # Only chains not already in memory or on disk cost a remote request
+        scheduler.run({f"{underlying} {expiry}": partial(self.chain, underlying, expiry)
+                       for underlying, expiry in groups if not self.cached((underlying, expiry))})
+        prices = {}
+        for key, options in groups.items():
+            chain = self.chains.get(key)
+            if chain is None:
+                continue
+            wanted = pd.MultiIndex.from_tuples([(option_type, strike) for _, strike, option_type in options])
+            found = chain.reindex(wanted).to_numpy()
+            prices.update({symbol: Decimal(float(price))
+                           for (symbol, _, _), price in zip(options, found) if not np.isnan(price)})
+        return prices
+
+
+class YahooPriceProvider:
+    """
+    Yahoo Finance through yfinance. Equity closes come from multi-ticker downloads of up to
+    EQUITY_BATCH_SIZE symbols, option prices from an OptionChainCache; every download goes
+    through the scheduler.
+    """
+    name = "yahoo"
+
+    def __init__(self, chain_cache: str | None = None, scheduler: FetchScheduler | None = None):
+        self.chains = OptionChainCache(chain_cache)
+        self.scheduler = scheduler or FetchScheduler()
+
+    def latest_closes(self, symbols: list[str]) -> dict[str, Decimal]:
+        """Last close of every symbol over the past few days; symbols without one are left out."""
+        batches = [symbols[i:i + EQUITY_BATCH_SIZE] for i in range(0, len(symbols), EQUITY_BATCH_SIZE)]
+        results = self.scheduler.run({f"closes {batch[0]}..{batch[-1]}": partial(self.download_closes, batch)
+                                      for batch in batches})
+        return {symbol: price for closes in results.values() for symbol, price in closes.items()}
+
+    @staticmethod
+    def download_closes(symbols: list[str]) -> dict[str, Decimal]:
+        # auto_adjust as Ticker.history() does, so the closes match the per-symbol ones
+        data = yf.download(symbols, period="5d", auto_adjust=True, progress=False, threads=False)
+        # yfinance reports failed tickers as missing closes rather than raising, so an empty batch is retried
+        if data is None or data.empty:
+            raise ValueError(f"No closes returned for {len(symbols)} symbol(s)")
+        closes = data["Close"]
+        if isinstance(closes, pd.Series):
+            closes = closes.to_frame(symbols[0])
+        latest = closes.reindex(columns=symbols).ffill().iloc[-1].dropna()
+        if latest.empty:
+            raise ValueError(f"No closes returned for {len(symbols)} symbol(s)")
+        return {symbol: Decimal(float(price)) for symbol, price in latest.items()}
+
+    def option_prices(self, symbols: list[str]) -> dict[str, Decimal]:
+        return self.chains.prices(symbols, self.scheduler)
+
+
+class FilePriceProvider:
+    """
+    Prices from a local CSV with symbol, date (YYYY-MM-DD) and price columns, options included; the
+    latest row of each symbol is its price. Stands in for Yahoo in tests, needing no network.
+    """
+    name = "file"
+
+    def __init__(self, path: str):
+        self.prices: dict[str, tuple[date, Decimal]] = {}
+        with open(path, newline="") as file:
+            for row in csv.DictReader(file):
+                symbol, price_date = row["symbol"].strip(), date.fromisoformat(row["date"].strip())
+                if symbol not in self.prices or price_date >= self.prices[symbol][0]:
+                    self.prices[symbol] = (price_date, Decimal(row["price"].strip()))
+
+    def latest_closes(self, symbols: list[str]) -> dict[str, Decimal]:
+        return {symbol: self.prices[symbol][1] for symbol in symbols if symbol in self.prices}
+
+    def option_prices(self, symbols: list[str]) -> dict[str, Decimal]:
+        return self.latest_closes(symbols)
+
+
+def get_price_provider(name: str = "yahoo", price_file: str | None = None, chain_cache: str | None = None,
+                       scheduler: FetchScheduler | None = None):
+    if name == "yahoo":
+        return YahooPriceProvider(chain_cache, scheduler)
+    if name == "file":
+        if not price_file:
+            raise ValueError("The file price provider needs --price_file")
+        return FilePriceProvider(price_file)
+    raise ValueError(f"Unknown price provider: {name}")
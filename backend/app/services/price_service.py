@@ -1,127 +1,173 @@
 from datetime import date, datetime
-from decimal import Decimal, ROUND_HALF_UP
+from decimal import Decimal
 
-import yfinance as yf
+import pandas as pd
+from sqlalchemy import func, text, update
 from sqlalchemy.orm import Session
-from sqlalchemy.sql.operators import and_
 
 from app.db import SessionLocal
 from app.models import PositionSnapshot
 from app.models.position import Position
 from app.models.price import Price  # optional, if you store prices
-
-# Define precision to 5 decimal places
-PRECISION = Decimal("0.00001")
-
-
-def parse_option_symbol(option_symbol: str):
-    try:
-        parts = option_symbol.split("_")
-        underlying = parts[0]
-        expiry = parts[1]
-        strike = float(parts[2])
-        option_type = parts[3].lower()
-        return underlying, expiry, strike, option_type
-    except Exception as e:
-        raise ValueError(f"Invalid option symbol format: {option_symbol}") from e
-
-
-def get_option_price(symbol: str) -> Decimal:
-    underlying, expiry, strike, option_type = parse_option_symbol(symbol)
-    ticker = yf.Ticker(underlying)
-    chain = ticker.option_chain(expiry)
-    df = chain.puts if option_type == 'put' else chain.calls
-    row = df[df['strike'] == strike]
-    if row.empty:
-        raise ValueError(f"No matching strike {strike} for {symbol}")
-    return Decimal(row.iloc[0]['lastPrice'])
-
-
-def get_equity_price(symbol: str) -> Decimal:
-    ticker = yf.Ticker(symbol)
-    hist = ticker.history(period="1d")
-    if hist.empty:
-        raise ValueError(f"No price history for {symbol}")
-    return Decimal(hist["Close"].iloc[-1])
-
-
-def fetch_and_store_prices():
+from app.services.benchmark_service import configured_benchmark_symbols
+from app.services.bulk_writer import bulk_insert
+from app.services.fetch_scheduler import DEFAULT_FETCH_WORKERS, DEFAULT_RATE, DEFAULT_RETRIES, FetchScheduler
+from app.services.price_index import value_snapshot
+from app.services.price_providers import get_price_provider, parse_option_symbol
+
+# Option symbols (e.g. "TSLA_2025-06-20_210.0_PUT") are valued per 100 shares. round(numeric, 5)
+# rounds half away from zero, as ROUND_HALF_UP does.
+HYDRATE_SQL = """
+UPDATE position_snapshots AS s
+SET price = h.price,
+    total_value = round(s.quantity * h.price * CASE WHEN strpos(s.symbol, '_') > 0 THEN 100 ELSE 1 END, 5)
+FROM (
+    SELECT m.snapshot_id, round(p.price, 5) AS price
+    FROM position_snapshots AS m
+    CROSS JOIN LATERAL (
+        SELECT price FROM prices
+        WHERE prices.symbol = m.symbol AND prices.price_date <= m.as_of_date
+        ORDER BY prices.price_date DESC
+        LIMIT 1
+    ) AS p
+    WHERE m.price IS NULL AND m.quantity IS NOT NULL
+) AS h
+WHERE s.snapshot_id = h.snapshot_id
+"""
+
+# Symbols whose unpriced snapshots and prices are joined at once by the merge_asof fallback
+HYDRATE_CHUNK_SYMBOLS = 200
+
+
+def fetch_and_store_prices(provider: str = "yahoo", price_file: str | None = None, chain_cache: str | None = None,
+                           workers: int = DEFAULT_FETCH_WORKERS, rate: float = DEFAULT_RATE,
+                           retries: int = DEFAULT_RETRIES):
+    """
+    Stores today's price of every position and benchmark symbol not stored yet. Equity closes come
+    from multi-ticker provider calls, options from one download per (underlying, expiry) chain, and
+    all rows go in one insert. Remote calls run concurrently, rate limited and retried, and the run
+    ends with a report of the symbols left without a price.
+    """
+    scheduler = FetchScheduler(workers=workers, rate=rate, retries=retries)
+    prices = get_price_provider(provider, price_file, chain_cache, scheduler)
     session: Session = SessionLocal()
     today = date.today()
 
     symbols = session.query(Position.symbol).distinct().all()
     symbols = [row.symbol for row in symbols]
+    # Benchmarks are read from stored prices only, so their symbols are fetched along with the positions
+    symbols += sorted(configured_benchmark_symbols() - set(symbols))
 
+    stored = {row.symbol for row in session.query(Price.symbol).filter(Price.price_date == today)}
+    fetched: dict[str, Decimal] = {}
+    equities, options = [], []
     for symbol in symbols:
-        try:
-            # Skip if price already exists
-            exists = session.query(Price).filter_by(symbol=symbol, price_date=today).first()
-            if exists:
-                print(f"[{symbol}] Price already stored for {today}, skipping.")
-                continue
-
-            if symbol == "CASH":
-                price = 1.0
-            elif "_" in symbol:
-                underlying, expiry_str, _, _ = parse_option_symbol(symbol)
+        if symbol in stored:
+            print(f"[{symbol}] Price already stored for {today}, skipping.")
+        elif symbol == "CASH":
+            fetched[symbol] = Decimal("1.0")
+        elif "_" in symbol:
+            try:
+                _, expiry_str, _, _ = parse_option_symbol(symbol)
                 expiry_date = datetime.strptime(expiry_str, "%Y-%m-%d").date()
                 if expiry_date < today:
                     print(f"[{symbol}] Option expired on {expiry_date}, skipping.")
                     continue
-                price = get_option_price(symbol)
+                options.append(symbol)
+            except Exception as e:
+                print(f"[{symbol}] Error fetching price: {e}")
+        else:
+            equities.append(symbol)
+
+    failed = []
+    batches = (("close", equities, prices.latest_closes), ("option quote", options, prices.option_prices))
+    for kind, group, fetch in batches:
+        try:
+            quotes = fetch(group)
+        except Exception as e:
+            print(f"Error fetching prices for {len(group)} symbol(s): {e}")
+            quotes = {}
+        for symbol in group:
+            if symbol in quotes:
+                fetched[symbol] = quotes[symbol]
             else:
-                price = get_equity_price(symbol)
+                print(f"[{symbol}] Error fetching price: no {kind} from {prices.name}")
+                failed.append(symbol)
 
-            price = round(price, 4)
+    rows = []
+    for symbol in symbols:
+        if symbol in fetched:
+            price = round(fetched[symbol], 4)
             print(f"[{symbol}] Price on {today}: ${price}")
+            rows.append({"symbol": symbol, "price_date": today, "price": price})
 
-            session.add(Price(symbol=symbol, price_date=today, price=price))
-
-        except Exception as e:
-            print(f"[{symbol}] Error fetching price: {e}")
-
+    bulk_insert(session, Price, rows)
     session.commit()
     session.close()
+
+    if scheduler.report.requests:
+        print("Fetch report: " + "\n  ".join(scheduler.report.summary()))
+    if failed:
+        print(f"⚠️ No price for {len(failed)} symbol(s): {', '.join(failed)}")
     hydrate_missing_prices()
 
 
 def hydrate_missing_prices():
-    # Fetch all position snapshots with missing price
+    """
+    Prices every snapshot without one at the latest stored price on or before its date, with the
+    x100 option multiplier in total_value, as one set-based statement on PostgreSQL and in chunked
+    merge_asof joins elsewhere (e.g. SQLite in tests). Replays value snapshots as they write them,
+    so this only repairs those written before their price was stored, such as today's.
+    """
     session: Session = SessionLocal()
-    snapshots_to_update = (
-        session.query(PositionSnapshot)
-        .filter(PositionSnapshot.price.is_(None))
-        .all()
-    )
+    missing = (session.query(func.count()).select_from(PositionSnapshot)
+               .filter(PositionSnapshot.price.is_(None)).scalar())
+    print(f"Found {missing} snapshots to update.")
 
-    print(f"Found {len(snapshots_to_update)} snapshots to update.")
-    updated_count = 0
-
-    for snapshot in snapshots_to_update:
-        matching_price = (
-            session.query(Price)
-            .filter(
-                and_(
-                    Price.symbol == snapshot.symbol,
-                    Price.price_date <= snapshot.as_of_date
-                )
-            )
-            .order_by(Price.price_date.desc())
-            .first()
-        )
-
-        if matching_price and snapshot.quantity is not None:
-            price_val = Decimal(str(matching_price.price)).quantize(PRECISION, rounding=ROUND_HALF_UP)
-            qty_val = Decimal(str(snapshot.quantity))
-            total_val = qty_val * price_val
-
-            # Check if it's an option symbol (e.g., "TSLA_2025-06-20_210.0_PUT")
-            if "_" in snapshot.symbol:
-                total_val *= 100
-
-            snapshot.price = price_val
-            snapshot.total_value = total_val.quantize(PRECISION, rounding=ROUND_HALF_UP)
-            updated_count += 1
+    if not missing:
+        updated_count = 0
+    elif session.get_bind().dialect.name == "postgresql":
+        updated_count = session.execute(text(HYDRATE_SQL)).rowcount
+    else:
+        updated_count = hydrate_in_chunks(session)
 
     session.commit()
+    session.close()
     print(f"Updated {updated_count} position snapshot(s) with price and total_value.")
+
+
+def hydrate_in_chunks(session: Session) -> int:
+    symbols = [row.symbol for row in session.query(PositionSnapshot.symbol)
+               .filter(PositionSnapshot.price.is_(None)).distinct().order_by(PositionSnapshot.symbol)]
+    updated_count = 0
+    for i in range(0, len(symbols), HYDRATE_CHUNK_SYMBOLS):
+        chunk = symbols[i:i + HYDRATE_CHUNK_SYMBOLS]
+        snapshots = pd.DataFrame(
+            session.query(PositionSnapshot.snapshot_id, PositionSnapshot.symbol, PositionSnapshot.as_of_date,
+                          PositionSnapshot.quantity)
+            .filter(PositionSnapshot.price.is_(None), PositionSnapshot.quantity.isnot(None),
+                    PositionSnapshot.symbol.in_(chunk)).all(),
+            columns=["snapshot_id", "symbol", "as_of_date", "quantity"])
+        prices = pd.DataFrame(
+            session.query(Price.symbol, Price.price_date, Price.price)
+            .filter(Price.symbol.in_(chunk), Price.price_date <= snapshots["as_of_date"].max()).all(),
+            columns=["symbol", "price_date", "price"])
+        if snapshots.empty or prices.empty:
+            continue
+
+        snapshots["as_of_date"] = pd.to_datetime(snapshots["as_of_date"])
+        prices["price_date"] = pd.to_datetime(prices["price_date"])
+        matched = pd.merge_asof(snapshots.sort_values("as_of_date"), prices.sort_values("price_date"),
+                                left_on="as_of_date", right_on="price_date", by="symbol", direction="backward")
+        matched = matched[matched["price_date"].notna()]
+
+        rows = []
+        columns = matched[["snapshot_id", "symbol", "quantity", "price"]]
+        for snapshot_id, symbol, quantity, price in columns.itertuples(index=False):
+            price_val, total_val = value_snapshot(symbol, quantity, price)
+            rows.append({"snapshot_id": snapshot_id, "price": price_val, "total_value": total_val})
+
+        # Bulk UPDATE by primary key: one executemany per chunk
+        session.execute(update(PositionSnapshot), rows)
+        updated_count += len(rows)
+    return updated_count
@@ -0,0 +1,230 @@
+import warnings
+from collections import defaultdict
+from datetime import date
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from app.db import SessionLocal
+from app.models import Account, PortfolioMetricsSnapshot, UserPortfolioMetricsSnapshot, PortfolioRiskSnapshot, \
+    UserPortfolioRiskSnapshot, PortfolioMetricsWatermark, UserPortfolioMetricsWatermark, User
+from app.services.bulk_writer import bulk_insert
+from app.services.portfolio_service import to_optional_float
+
+session: Session = SessionLocal()
+
+TRADING_DAYS = 252
+# Daily returns in each date's window; shorter histories use what they have from MIN_RISK_OBSERVATIONS on
+RISK_WINDOW = 252
+MIN_RISK_OBSERVATIONS = 20
+VAR_CONFIDENCE = 0.95
+RISK_FREE_RATE = 0.05  # the Sharpe ratio's default
+# Dates per block of sliding windows; a block holds dates x owners x RISK_WINDOW floats
+RISK_CHUNK_DATES = 256
+
+RISK_METRICS = ("volatility", "sortino", "historical_var", "historical_cvar", "parametric_var", "parametric_cvar")
+
+
+def compute_risk_metrics(daily_returns: pd.DataFrame, window: int = RISK_WINDOW,
+                         confidence: float = VAR_CONFIDENCE) -> dict[str, pd.DataFrame]:
+    """
+    Every RISK_METRICS entry for every date and column of a dates x owners returns frame, over the
+    trailing window of dates. Missing returns are left out of a window. VaR and CVaR are one-day
+    losses at the confidence level, positive for a loss: historical from the window's empirical
+    quantile (linear interpolation, as numpy's default) and the mean of the returns at or below it,
+    parametric from a normal distribution with the window's mean and standard deviation.
+
+    Windows are sliding views over the returns matrix, evaluated RISK_CHUNK_DATES dates at a time
+    with sorts and reductions along the window axis, so there is no loop per owner or date.
+    """
+    returns = daily_returns.to_numpy(dtype=float)
+    results = {name: np.full(returns.shape, np.nan) for name in RISK_METRICS}
+    if returns.size == 0:
+        return {name: pd.DataFrame(values, index=daily_returns.index, columns=daily_returns.columns)
+                for name, values in results.items()}
+
+    daily_rf = RISK_FREE_RATE / TRADING_DAYS
+    tail = 1 - confidence
+    z = NormalDist().inv_cdf(tail)
+    tail_density = NormalDist().pdf(z) / tail
+
+    padded = np.vstack([np.full((window - 1, returns.shape[1]), np.nan), returns])
+    views = sliding_window_view(padded, window, axis=0)  # dates x owners x window
+    for start in range(0, len(returns), RISK_CHUNK_DATES):
+        block = views[start:start + RISK_CHUNK_DATES]
+        rows = slice(start, start + len(block))
+        count = np.sum(~np.isnan(block), axis=-1)
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # windows without enough returns
+            mean = np.nanmean(block, axis=-1)
+            std = np.nanstd(block, axis=-1, ddof=1)
+            downside = np.sqrt(np.nanmean(np.minimum(block - daily_rf, 0.0) ** 2, axis=-1))
+
+            # Quantile from the sorted window (NaNs sort last), interpolated between neighbours
+            ordered = np.sort(block, axis=-1)
+            position = np.maximum(count - 1, 0) * tail
+            lower = np.floor(position).astype(int)
+            upper = np.ceil(position).astype(int)
+            low = np.take_along_axis(ordered, lower[..., None], axis=-1)[..., 0]
+            high = np.take_along_axis(ordered, upper[..., None], axis=-1)[..., 0]
+            quantile = low + (high - low) * (position - lower)
+            in_tail = ordered <= quantile[..., None]
+            tail_mean = np.where(in_tail, ordered, 0.0).sum(axis=-1) / in_tail.sum(axis=-1)
+
+            metrics = {
+                "volatility": std * np.sqrt(TRADING_DAYS),
+                "sortino": (mean - daily_rf) / downside * np.sqrt(TRADING_DAYS),
+                "historical_var": -quantile,
+                "historical_cvar": -tail_mean,
+                "parametric_var": -(mean + z * std),
+                "parametric_cvar": -(mean - std * tail_density),
+            }
+        enough = count >= MIN_RISK_OBSERVATIONS
+        for name, values in metrics.items():
+            results[name][rows] = np.where(enough & np.isfinite(values), values, np.nan)
+
+    return {name: pd.DataFrame(values, index=daily_returns.index, columns=daily_returns.columns)
+            for name, values in results.items()}
+
+
+def compute_drawdown_duration(values: pd.DataFrame) -> pd.DataFrame:
+    """
+    Longest time below a previous peak up to each date, in days, for every column of a dates x
+    owners value frame: the days since the column last stood at its running peak, maxed to date.
+    """
+    ordinals = pd.Series([day.toordinal() for day in values.index], index=values.index, dtype=float)
+    at_peak = values >= values.cummax()
+    peak_ordinals = pd.DataFrame(np.where(at_peak, ordinals.to_numpy()[:, None], np.nan),
+                                 index=values.index, columns=values.columns).ffill()
+    durations = (peak_ordinals.rsub(ordinals, axis=0)).where(values.notna())
+    return durations.cummax().where(values.notna())
+
+
+def load_risk_matrix(user_ids: list | None = None) -> tuple[pd.DataFrame, pd.DataFrame, dict]:
+    """
+    Stored daily returns and values of every account and user (or of the given users) as dates x
+    owners frames, with ("account", account_id) and ("user", user_id) columns, from one query per
+    metrics table; plus the calendar each owner's metrics were computed on.
+    """
+    account_query = session.query(
+        PortfolioMetricsSnapshot.account_id,
+        PortfolioMetricsSnapshot.snapshot_date,
+        PortfolioMetricsSnapshot.portfolio_value,
+        PortfolioMetricsSnapshot.portfolio_daily_return
+    )
+    user_query = session.query(
+        UserPortfolioMetricsSnapshot.user_id,
+        UserPortfolioMetricsSnapshot.snapshot_date,
+        UserPortfolioMetricsSnapshot.portfolio_value,
+        UserPortfolioMetricsSnapshot.portfolio_daily_return
+    )
+    calendar_queries = [
+        session.query(PortfolioMetricsWatermark.account_id, PortfolioMetricsWatermark.calendar),
+        session.query(UserPortfolioMetricsWatermark.user_id, UserPortfolioMetricsWatermark.calendar),
+    ]
+    if user_ids is not None:
+        accounts = session.query(Account.account_id).filter(Account.user_id.in_(user_ids))
+        account_query = account_query.filter(PortfolioMetricsSnapshot.account_id.in_(accounts))
+        user_query = user_query.filter(UserPortfolioMetricsSnapshot.user_id.in_(user_ids))
+        calendar_queries = [
+            calendar_queries[0].filter(PortfolioMetricsWatermark.account_id.in_(accounts)),
+            calendar_queries[1].filter(UserPortfolioMetricsWatermark.user_id.in_(user_ids)),
+        ]
+
+    frame = pd.DataFrame(
+        [(kind, owner_id, day, to_number(value), to_number(daily_return))
+         for kind, query in (("account", account_query), ("user", user_query))
+         for owner_id, day, value, daily_return in query],
+        columns=["kind", "owner_id", "date", "value", "daily_return"]
+    )
+    calendars = {(kind, owner_id): calendar
+                 for kind, query in zip(("account", "user"), calendar_queries)
+                 for owner_id, calendar in query}
+    values = frame.pivot(index="date", columns=["kind", "owner_id"], values="value").sort_index()
+    daily_returns = frame.pivot(index="date", columns=["kind", "owner_id"], values="daily_return").sort_index()
+    return values, daily_returns, calendars
+
+
+def to_number(value) -> float:
+    return float(value) if value is not None else np.nan
+
+
+def update_risk_metrics(email: str | None = None, rewritten: dict[tuple, date] | None = None):
+    """
+    Recomputes the risk snapshots of every account and user (or of one user's accounts and the user)
+    from their stored metrics in one batched pass per trading calendar, so each window counts
+    that calendar's dates.
+
+    rewritten, as returned by recalculate_portfolio_metrics, limits the rewrite to the owners in it and
+    to their dates from the first rewritten one on; the rest of the snapshots are left in place. The
+    windows still read each owner's full stored history, so the rows written match a full rewrite.
+    """
+    user_ids = None
+    if email is not None:
+        user = session.query(User).filter_by(email=email).first()
+        if not user:
+            raise ValueError(f"No user with email {email}")
+        user_ids = [user.user_id]
+
+    values, daily_returns, calendars = load_risk_matrix(user_ids)
+    if rewritten is None:
+        if values.empty:
+            print("No portfolio metrics to compute risk from.")
+            return
+        rewritten = {owner: date.min for owner in values.columns}
+
+    rows = {"account": [], "user": []}
+    for calendar in sorted({calendars.get(owner, "all") for owner in values.columns}):
+        owners = [owner for owner in values.columns if calendars.get(owner, "all") == calendar]
+        group_values = values[owners].dropna(how="all")
+        risk = compute_risk_metrics(daily_returns[owners].reindex(group_values.index))
+        risk["max_drawdown_duration"] = compute_drawdown_duration(group_values)
+        for (kind, owner_id), owner_rows in risk_rows(group_values, risk).items():
+            if (kind, owner_id) in rewritten:
+                rows[kind] += [{f"{kind}_id": owner_id, **row} for row in owner_rows
+                               if row["snapshot_date"] >= rewritten[(kind, owner_id)]]
+
+    starts = {"account": {}, "user": {}}
+    for (kind, owner_id), start in rewritten.items():
+        starts[kind][owner_id] = start
+    for model, owner_column, kind in ((PortfolioRiskSnapshot, PortfolioRiskSnapshot.account_id, "account"),
+                                      (UserPortfolioRiskSnapshot, UserPortfolioRiskSnapshot.user_id, "user")):
+        if starts[kind]:
+            session.query(model).filter(
+                rows_from(owner_column, model.snapshot_date, starts[kind])
+            ).delete(synchronize_session=False)
+    bulk_insert(session, PortfolioRiskSnapshot, rows["account"])
+    bulk_insert(session, UserPortfolioRiskSnapshot, rows["user"])
+    session.commit()
+    print(f"✅ Risk metrics updated for {len(starts['account'])} account(s) and {len(starts['user'])} user(s)")
+
+
+def rows_from(owner_column, date_column, starts: dict):
+    """Filter for each owner's rows on or after its start date, grouping the owners that share one."""
+    owners_by_start = defaultdict(list)
+    for owner_id, start in starts.items():
+        owners_by_start[start].append(owner_id)
+    return or_(*(and_(owner_column.in_(owner_ids), date_column >= start)
+                 for start, owner_ids in owners_by_start.items()))
+
+
+def risk_rows(values: pd.DataFrame, risk: dict[str, pd.DataFrame]) -> dict[tuple, list[dict]]:
+    """Rows (without the owner key) for every date an owner has a stored value, keyed by owner."""
+    present = values.notna().to_numpy()
+    arrays = {name: frame.to_numpy() for name, frame in risk.items()}
+    owner_rows = {}
+    for j, owner in enumerate(values.columns):
+        owner_rows[owner] = [
+            {
+                "snapshot_date": values.index[i],
+                **{name: to_optional_float(arrays[name][i, j]) for name in RISK_METRICS},
+                "max_drawdown_duration": int(arrays["max_drawdown_duration"][i, j]),
+            }
+            for i in np.flatnonzero(present[:, j])
+        ]
+    return owner_rows
@@ -0,0 +1,254 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from uuid import UUID
+
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import func
+
+from app.models.transaction_type import TransactionType
+from app.models.position_snapshots import PositionSnapshot
+from app.models.position_snapshot_range import PositionSnapshotRange
+from app.services.bulk_writer import bulk_insert
+from app.services.price_index import AsOfPriceIndex, value_snapshot
+
+SNAPSHOT_STORAGE_MODES = ("daily", "range")
+
+
+def snapshot_rows(symbol_data) -> list[tuple[str, Decimal, Decimal | None, str]]:
+    """Rounds symbol_data into (symbol, quantity, avg_cost, action) rows, skipping flat positions."""
+    rows = []
+    for symbol, data in symbol_data.items():
+        quantity = round(data["qty"], 5)
+        total_cost = data["total_cost"]
+        first_action = data["first_action"] or TransactionType.BUY.value
+
+        # ✅ Special case for CASH
+        if symbol == "CASH":
+            avg_cost = Decimal("1.0")
+        else:
+            avg_cost = round(total_cost / quantity, 5) if quantity else None
+
+        if quantity == 0:
+            continue
+
+        rows.append((symbol, quantity, avg_cost, first_action))
+    return rows
+
+
+class DailySnapshotStore:
+    """
+    One PositionSnapshot row per held symbol per replayed day, buffered until flush(). Rows are
+    valued with price and total_value when a price index has been given for the replayed dates and
+    the index has settled the row's price (see AsOfPriceIndex.settled_price).
+    """
+    mode = "daily"
+    valued = True
+
+    def __init__(self, session: Session, account_id, price_index: AsOfPriceIndex | None = None):
+        self.session = session
+        self.account_id = account_id
+        self.price_index = price_index
+        self._pending_dates: list[date] = []
+        self._pending_rows: list[dict] = []
+
+    def last_snapshot_date(self, before: date | None = None) -> date | None:
+        query = self.session.query(func.max(PositionSnapshot.as_of_date)).filter_by(account_id=self.account_id)
+        if before is not None:
+            query = query.filter(PositionSnapshot.as_of_date < before)
+        return query.scalar()
+
+    def clear_from(self, from_date: date):
+        self.session.query(PositionSnapshot).filter(
+            PositionSnapshot.account_id == self.account_id,
+            PositionSnapshot.as_of_date >= from_date
+        ).delete()
+
+    def write(self, symbol_data, snapshot_date: date):
+        self._pending_dates.append(snapshot_date)
+        for symbol, quantity, avg_cost, action in snapshot_rows(symbol_data):
+            price = self.price_index.settled_price(symbol, snapshot_date) if self.price_index else None
+            # Left NULL until its price is settled; hydrate_missing_prices fills it in once one is stored
+            price_val, total_val = value_snapshot(symbol, quantity, price) if price is not None else (None, None)
+            self._pending_rows.append({
+                "account_id": self.account_id,
+                "symbol": symbol,
+                "quantity": quantity,
+                "avg_cost": avg_cost,
+                "price": price_val,
+                "total_value": total_val,
+                "as_of_date": snapshot_date,
+                "action": action,
+            })
+
+    def flush(self):
+        if not self._pending_dates:
+            return
+        # Rewriting a day replaces whatever was stored for it
+        self.session.query(PositionSnapshot).filter(
+            PositionSnapshot.account_id == self.account_id,
+            PositionSnapshot.as_of_date.in_(self._pending_dates)
+        ).delete(synchronize_session=False)
+        bulk_insert(self.session, PositionSnapshot, self._pending_rows)
+        self._pending_dates = []
+        self._pending_rows = []
+
+
+class RangeSnapshotStore:
+    """
+    Change-only storage: a PositionSnapshotRange row is opened when a symbol's quantity, cost or
+    action changes, and its valid_to is pushed forward on every day it stays the same.
+    New ranges are buffered and bulk inserted on flush(). Ranges span many prices, so they are not valued.
+    """
+    mode = "range"
+    valued = False
+
+    def __init__(self, session: Session, account_id):
+        self.session = session
+        self.account_id = account_id
+        self._open: dict[str, dict] | None = None  # ranges still running as of the last written day
+        self._new_rows: list[dict] = []
+        self._extended: dict = {}  # stored PositionSnapshotRange -> new valid_to
+
+    def last_snapshot_date(self, before: date | None = None) -> date | None:
+        query = self.session.query(func.max(PositionSnapshotRange.valid_to)).filter_by(account_id=self.account_id)
+        if before is None:
+            return query.scalar()
+        # What would be left after clear_from(before): earlier ranges, cut off the day before it
+        last_date = query.filter(PositionSnapshotRange.valid_from < before).scalar()
+        return min(last_date, before - timedelta(days=1)) if last_date else None
+
+    def clear_from(self, from_date: date):
+        self.flush()
+        self.session.query(PositionSnapshotRange).filter(
+            PositionSnapshotRange.account_id == self.account_id,
+            PositionSnapshotRange.valid_from >= from_date
+        ).delete()
+
+        # Ranges spanning from_date now end the day before it
+        self.session.query(PositionSnapshotRange).filter(
+            PositionSnapshotRange.account_id == self.account_id,
+            PositionSnapshotRange.valid_to >= from_date
+        ).update({PositionSnapshotRange.valid_to: from_date - timedelta(days=1)})
+
+        self._open = None
+
+    def write(self, symbol_data, snapshot_date: date):
+        if self._open is None:
+            self._load_open(snapshot_date)
+
+        open_ranges = {}
+        for symbol, quantity, avg_cost, action in snapshot_rows(symbol_data):
+            current = self._open.get(symbol)
+            if current is not None and (current["quantity"], current["avg_cost"], current["action"]) == (quantity, avg_cost, action):
+                current["valid_to"] = snapshot_date
+                if "stored" in current:
+                    self._extended[current["stored"]] = snapshot_date
+            else:
+                current = {
+                    "account_id": self.account_id,
+                    "symbol": symbol,
+                    "quantity": quantity,
+                    "avg_cost": avg_cost,
+                    "valid_from": snapshot_date,
+                    "valid_to": snapshot_date,
+                    "action": action,
+                }
+                self._new_rows.append(current)
+            open_ranges[symbol] = current
+
+        # Anything not carried into open_ranges simply keeps its last valid_to
+        self._open = open_ranges
+
+    def flush(self):
+        for stored, valid_to in self._extended.items():
+            stored.valid_to = valid_to
+        self.session.flush()
+        bulk_insert(self.session, PositionSnapshotRange, self._new_rows)
+        self._extended = {}
+        self._new_rows = []
+        self._open = None  # buffered dicts are gone; reload from the table on the next write
+
+    def _load_open(self, snapshot_date: date):
+        self._open = {}
+        previous_date = self.session.query(func.max(PositionSnapshotRange.valid_to)).filter(
+            PositionSnapshotRange.account_id == self.account_id,
+            PositionSnapshotRange.valid_to < snapshot_date
+        ).scalar()
+        if previous_date is None:
+            return
+
+        for stored in self.session.query(PositionSnapshotRange).filter_by(
+                account_id=self.account_id, valid_to=previous_date):
+            self._open[stored.symbol] = {
+                "quantity": stored.quantity,
+                "avg_cost": stored.avg_cost,
+                "action": stored.action,
+                "valid_to": stored.valid_to,
+                "stored": stored,
+            }
+
+
+def get_snapshot_store(mode: str, session: Session, account_id):
+    if mode == "daily":
+        return DailySnapshotStore(session, account_id)
+    if mode == "range":
+        return RangeSnapshotStore(session, account_id)
+    raise ValueError(f"Unknown snapshot storage mode: {mode}")
+
+
+def expand_snapshot_ranges(ranges, start_date: date, end_date: date):
+    """Expands PositionSnapshotRange rows back into one point per day within [start_date, end_date]."""
+    for snapshot_range in ranges:
+        current_date = max(snapshot_range.valid_from, start_date)
+        last_date = min(snapshot_range.valid_to, end_date)
+        while current_date <= last_date:
+            yield {
+                "as_of_date": current_date,
+                "account_id": snapshot_range.account_id,
+                "symbol": snapshot_range.symbol,
+                "quantity": snapshot_range.quantity,
+                "avg_cost": snapshot_range.avg_cost,
+                "action": snapshot_range.action,
+            }
+            current_date += timedelta(days=1)
+
+
+def query_daily_positions(db: Session, account_ids: list[UUID], start_date: date, end_date: date) -> list[dict]:
+    """
+    Returns daily position points for the accounts between start_date and end_date (inclusive),
+    reading both the daily snapshot table and range-encoded snapshots.
+    """
+    daily = (
+        db.query(PositionSnapshot)
+        .filter(
+            PositionSnapshot.account_id.in_(account_ids),
+            PositionSnapshot.as_of_date >= start_date,
+            PositionSnapshot.as_of_date <= end_date
+        )
+        .all()
+    )
+    points = [
+        {
+            "as_of_date": snapshot.as_of_date,
+            "account_id": snapshot.account_id,
+            "symbol": snapshot.symbol,
+            "quantity": snapshot.quantity,
+            "avg_cost": snapshot.avg_cost,
+            "action": snapshot.action,
+        }
+        for snapshot in daily
+    ]
+
+    ranges = (
+        db.query(PositionSnapshotRange)
+        .filter(
+            PositionSnapshotRange.account_id.in_(account_ids),
+            PositionSnapshotRange.valid_from <= end_date,
+            PositionSnapshotRange.valid_to >= start_date
+        )
+        .all()
+    )
+    points.extend(expand_snapshot_ranges(ranges, start_date, end_date))
+
+    points.sort(key=lambda point: (point["as_of_date"], str(point["account_id"]), point["symbol"]))
+    return points
@@ -0,0 +1,123 @@
+from datetime import date, timedelta
+from functools import lru_cache
+
+CALENDARS = ("all", "nyse")
+
+# Full-day NYSE closures that no holiday rule produces
+NYSE_SPECIAL_CLOSURES = {
+    date(2001, 9, 11), date(2001, 9, 12), date(2001, 9, 13), date(2001, 9, 14),  # September 11
+    date(2004, 6, 11),  # President Reagan's funeral
+    date(2007, 1, 2),  # President Ford's funeral
+    date(2012, 10, 29), date(2012, 10, 30),  # Hurricane Sandy
+    date(2018, 12, 5),  # President George H. W. Bush's funeral
+    date(2025, 1, 9),  # President Carter's funeral
+}
+
+
+class TradingCalendar:
+    """Every calendar day is a session; the behaviour snapshots and metrics had before calendars existed."""
+    name = "all"
+
+    def is_session(self, day: date) -> bool:
+        return True
+
+    def roll_forward(self, day: date) -> date:
+        """The first session on or after day."""
+        while not self.is_session(day):
+            day += timedelta(days=1)
+        return day
+
+    def roll_back(self, day: date) -> date:
+        """The last session on or before day."""
+        while not self.is_session(day):
+            day -= timedelta(days=1)
+        return day
+
+    def sessions(self, start_date: date, end_date: date):
+        current_date = start_date
+        while current_date <= end_date:
+            if self.is_session(current_date):
+                yield current_date
+            current_date += timedelta(days=1)
+
+    def is_last_session_of_month(self, day: date) -> bool:
+        return self.roll_forward(day + timedelta(days=1)).month != day.month
+
+
+class NYSECalendar(TradingCalendar):
+    """
+    NYSE sessions: weekdays minus the exchange's holidays, generated by rule for any year, and
+    the one-off closures in NYSE_SPECIAL_CLOSURES. Works offline; early closes count as sessions.
+    """
+    name = "nyse"
+
+    def is_session(self, day: date) -> bool:
+        return day.weekday() < 5 and day not in nyse_holidays(day.year) and day not in NYSE_SPECIAL_CLOSURES
+
+
+@lru_cache(maxsize=None)
+def nyse_holidays(year: int) -> frozenset[date]:
+    holidays = {
+        nth_weekday(year, 2, 0, 3),  # Washington's Birthday: third Monday in February
+        easter(year) - timedelta(days=2),  # Good Friday
+        last_weekday(year, 5, 0),  # Memorial Day: last Monday in May
+        observed(date(year, 7, 4)),  # Independence Day
+        nth_weekday(year, 9, 0, 1),  # Labor Day: first Monday in September
+        nth_weekday(year, 11, 3, 4),  # Thanksgiving: fourth Thursday in November
+        observed(date(year, 12, 25)),  # Christmas
+    }
+    # New Year's Day on a Saturday is not made up on the Friday before (NYSE Rule 7.2)
+    new_year = date(year, 1, 1)
+    if new_year.weekday() != 5:
+        holidays.add(observed(new_year))
+    if year >= 1998:
+        holidays.add(nth_weekday(year, 1, 0, 3))  # Martin Luther King Jr. Day: third Monday in January
+    if year >= 2022:
+        holidays.add(observed(date(year, 6, 19)))  # Juneteenth
+    return frozenset(holidays)
+
+
+def observed(day: date) -> date:
+    """Saturday holidays are observed on Friday, Sunday holidays on Monday."""
+    if day.weekday() == 5:
+        return day - timedelta(days=1)
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    return day
+
+
+def nth_weekday(year: int, month: int, weekday: int, n: int) -> date:
+    first = date(year, month, 1)
+    return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+
+
+def last_weekday(year: int, month: int, weekday: int) -> date:
+    next_month = date(year + month // 12, month % 12 + 1, 1)
+    last = next_month - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def easter(year: int) -> date:
+    """Gregorian Easter Sunday (anonymous Gregorian algorithm)."""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+EVERY_DAY = TradingCalendar()
+
+
+def get_calendar(name: str | None) -> TradingCalendar:
+    if name in (None, "all"):
+        return EVERY_DAY
+    if name == "nyse":
+        return NYSECalendar()
+    raise ValueError(f"Unknown trading calendar: {name}")
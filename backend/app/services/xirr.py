@@ -0,0 +1,105 @@
+from datetime import date
+
+import numpy as np
+
+# |XNPV| below this fraction of the flows' absolute sum counts as a root
+XIRR_TOLERANCE = 1e-10
+NEWTON_ITERATIONS = 50
+# Newton runs on log(1 + rate); a step moves it by at most this much
+MAX_NEWTON_STEP = 1.0
+# Bisection stops once every bracket is this narrow, or after BISECTION_ITERATIONS halvings
+BISECTION_TOLERANCE = 1e-12
+BISECTION_ITERATIONS = 200
+# Rates are searched above -100%; the upper bracket grows by 10x up to MAX_RATE
+MIN_RATE = -0.999999
+MAX_RATE = 1e6
+INITIAL_RATE = 0.1
+
+
+def xnpv(rates: np.ndarray, years: np.ndarray, amounts: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Net present value of every row of amounts at its rate, and its derivative by the rate.
+    amounts is owners x flows (zero-padded); years is the flows' time in years, shared (flows) or per row.
+    """
+    with np.errstate(over="ignore", invalid="ignore", divide="ignore"):
+        discount = (1 + rates[:, None]) ** -years
+        values = np.sum(amounts * discount, axis=1)
+        derivatives = np.sum(-years * amounts * discount / (1 + rates[:, None]), axis=1)
+    return values, derivatives
+
+
+def solve_xirr(years: np.ndarray, amounts: np.ndarray) -> np.ndarray:
+    """
+    Annualized rate at which each row of amounts has a zero XNPV, solved for all rows at once.
+
+    Newton steps run on every row from INITIAL_RATE, in log(1 + rate) so they cannot cross -100%,
+    and are capped at MAX_NEWTON_STEP. Rows they do not settle within NEWTON_ITERATIONS (flows whose
+    XNPV is not monotonic, e.g. large withdrawals midway) are bisected inside a bracket where the
+    XNPV changes sign. Rows whose flows all have the same sign, or without such a bracket, get NaN.
+    """
+    amounts = np.atleast_2d(np.asarray(amounts, dtype=float))
+    years = np.asarray(years, dtype=float)
+    scale = np.abs(amounts).sum(axis=1)
+    growth = np.full(len(amounts), np.log1p(INITIAL_RATE))
+    no_root = ~(amounts > 0).any(axis=1) | ~(amounts < 0).any(axis=1)
+    converged = np.zeros(len(amounts), dtype=bool)
+    newton = ~no_root
+
+    for _ in range(NEWTON_ITERATIONS):
+        rows = np.flatnonzero(newton)
+        if not len(rows):
+            break
+        values, derivatives = xnpv(np.expm1(growth[rows]), years if years.ndim == 1 else years[rows], amounts[rows])
+        settled = np.abs(values) <= XIRR_TOLERANCE * scale[rows]
+        converged[rows[settled]] = True
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            # d XNPV / d log(1 + rate) = (1 + rate) * d XNPV / d rate
+            step = np.clip(values / (derivatives * np.exp(growth[rows])), -MAX_NEWTON_STEP, MAX_NEWTON_STEP)
+        stepped = growth[rows] - step
+        moving = ~settled & np.isfinite(stepped) & (stepped > np.log1p(MIN_RATE)) & (stepped <= np.log1p(MAX_RATE))
+        growth[rows[moving]] = stepped[moving]
+        newton[rows[~moving]] = False
+
+    rates = np.expm1(growth)
+    pending = ~converged & ~no_root
+    if pending.any():
+        rates[pending] = bisect_xirr(years if years.ndim == 1 else years[pending], amounts[pending])
+    rates[no_root] = np.nan
+    return rates
+
+
+def bisect_xirr(years: np.ndarray, amounts: np.ndarray) -> np.ndarray:
+    """
+    Bisection of each row inside a bracket where its XNPV changes sign. The bracket starts at
+    [-50%, 100%] and widens toward MIN_RATE and MAX_RATE (as far as the XNPV stays finite) until it
+    holds a sign change; rows where it never does get NaN.
+    """
+    low, high = np.full(len(amounts), -0.5), np.full(len(amounts), 1.0)
+    low_values, high_values = xnpv(low, years, amounts)[0], xnpv(high, years, amounts)[0]
+    while True:
+        unbracketed = ~(np.sign(low_values) * np.sign(high_values) < 0)
+        wider_low, wider_high = np.maximum(-1 + (1 + low) / 10, MIN_RATE), np.minimum(high * 10, MAX_RATE)
+        wider_low_values, wider_high_values = xnpv(wider_low, years, amounts)[0], xnpv(wider_high, years, amounts)[0]
+        widen_low = unbracketed & (wider_low < low) & np.isfinite(wider_low_values)
+        widen_high = unbracketed & (wider_high > high) & np.isfinite(wider_high_values)
+        if not (widen_low | widen_high).any():
+            break
+        low, low_values = np.where(widen_low, wider_low, low), np.where(widen_low, wider_low_values, low_values)
+        high, high_values = np.where(widen_high, wider_high, high), np.where(widen_high, wider_high_values, high_values)
+
+    for _ in range(BISECTION_ITERATIONS):
+        if not (high - low > BISECTION_TOLERANCE * np.maximum(1.0, np.abs(low))).any():
+            break
+        middle = (low + high) / 2
+        middle_values, _ = xnpv(middle, years, amounts)
+        same_side = np.sign(middle_values) == np.sign(low_values)
+        low = np.where(same_side, middle, low)
+        low_values = np.where(same_side, middle_values, low_values)
+        high = np.where(same_side, high, middle)
+    return np.where(unbracketed, np.nan, (low + high) / 2)
+
+
+def flow_years(days: list[date], origin: date | None = None) -> np.ndarray:
+    """Flow dates as years (of 365 days) after origin, by default the first of them."""
+    origin = origin or min(days)
+    return np.array([(day - origin).days / 365.0 for day in days])
@@ -0,0 +1,38 @@
+"""
+Fetch benchmark: the concurrent fetch scheduler against one-at-a-time fetching, driven by the fake
+provider of tests/test_fetch_scheduler.py, which also checks retries, failure reports and the rate.
+
+    poetry run python -m benchmarks.fetch_benchmark
+
+Runs entirely in memory with simulated round trips; no network or database connection is made.
+"""
+import time
+
+from app.services.fetch_scheduler import FetchScheduler
+from tests.test_fetch_scheduler import FakePriceProvider, fake_symbols
+
+# Simulated round trip of one remote request
+LATENCY_SECONDS = 0.02
+
+
+def timed(fn, *args) -> float:
+    started = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - started
+
+
+def main():
+    print(f"{'symbols':>8} {'workers':>8} {'serial s':>10} {'pooled s':>10} {'speedup':>8}")
+    for count, workers in [(20, 4), (60, 8), (120, 16)]:
+        symbols = fake_symbols(count)
+        serial = FakePriceProvider(FetchScheduler(workers=1, rate=10_000, burst=workers), {}, set(), LATENCY_SECONDS)
+        pooled = FakePriceProvider(FetchScheduler(workers=workers, rate=10_000, burst=workers), {}, set(),
+                                   LATENCY_SECONDS)
+        serial_seconds = timed(serial.latest_closes, symbols)
+        pooled_seconds = timed(pooled.latest_closes, symbols)
+        print(f"{count:>8} {workers:>8} {serial_seconds:>10.3f} {pooled_seconds:>10.3f} "
+              f"{serial_seconds / pooled_seconds:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Replay-loop benchmark: the day-partitioned cursor (iter_replay) against the previous
+per-day rescan of the full transaction list.
+
+    poetry run python -m benchmarks.replay_benchmark
+
+Runs entirely in memory on synthetic transactions; no database connection is made.
+"""
+import random
+import time
+from copy import deepcopy
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+from app.services.position_service import iter_replay, new_symbol_data, update_with_day_transactions
+
+SYMBOLS = ["AAPL", "MSFT", "NVDA", "AMZN", "GOOG", "META", "TSLA", "TPL"]
+START_DATE = date(2015, 1, 2)
+
+
+def make_transactions(count: int, days: int, seed: int = 7) -> list[SimpleNamespace]:
+    rnd = random.Random(seed)
+    txns = [SimpleNamespace(symbol="CASH", action="journal", instrument_type="cash", quantity=1_000_000,
+                            price=1, date=START_DATE, journal_details=None)]
+    for _ in range(count):
+        action = rnd.choice(["buy", "buy", "sell"])
+        qty = rnd.randint(1, 50)
+        txns.append(SimpleNamespace(
+            symbol=rnd.choice(SYMBOLS),
+            action=action,
+            instrument_type="stock",
+            quantity=qty if action == "buy" else -qty,
+            price=round(rnd.uniform(20, 900), 4),
+            date=START_DATE + timedelta(days=rnd.randint(0, days - 1)),
+            journal_details=None,
+        ))
+    return sorted(txns, key=lambda txn: txn.date)
+
+
+def legacy_replay(txns, start_date: date, end_date: date):
+    """The pre-cursor loop: rescans every transaction and deep-copies the state twice per day."""
+    previous_day_data = deepcopy(new_symbol_data())
+    current_date = start_date
+    while current_date <= end_date:
+        day_txns = [txn for txn in txns if txn.date == current_date]
+        symbol_data, _ = update_with_day_transactions(previous_day_data, day_txns)
+        previous_day_data = deepcopy(symbol_data)
+        current_date += timedelta(days=1)
+    return previous_day_data
+
+
+def cursor_replay(txns, start_date: date, end_date: date):
+    symbol_data = new_symbol_data()
+    for _, symbol_data, _ in iter_replay(symbol_data, txns, start_date, end_date):
+        pass
+    return symbol_data
+
+
+def timed(fn, *args) -> float:
+    started = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - started
+
+
+def main():
+    print(f"{'txns':>7} {'days':>6} {'legacy s':>10} {'cursor s':>10} {'cursor us/(txn+day)':>20}")
+    for count, days in [(1_000, 365), (2_000, 730), (4_000, 1_460), (8_000, 2_920)]:
+        txns = make_transactions(count, days)
+        end_date = START_DATE + timedelta(days=days - 1)
+        legacy = timed(legacy_replay, txns, START_DATE, end_date)
+        cursor = timed(cursor_replay, txns, START_DATE, end_date)
+        per_unit = cursor / (len(txns) + days) * 1e6
+        print(f"{len(txns):>7} {days:>6} {legacy:>10.3f} {cursor:>10.3f} {per_unit:>20.2f}")
+
+
+if __name__ == "__main__":
+    main()
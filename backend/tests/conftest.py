@@ -0,0 +1,82 @@
+import os
+import sys
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+
+# Services open their sessions at import time, so the database is chosen before anything from app is
+# imported: a throwaway SQLite file, or TEST_DATABASE_URL (e.g. a PostgreSQL test database; its
+# tables are created and dropped around every test, so never point it at real data).
+os.environ["DATABASE_URL"] = (os.getenv("TEST_DATABASE_URL")
+                              or "sqlite:///" + os.path.join(tempfile.mkdtemp(), "portana-test.db"))
+
+from sqlalchemy.orm import Session  # noqa: E402
+
+import app.models as models  # noqa: E402
+from app.db import Base, SessionLocal, engine  # noqa: E402
+
+postgres_only = pytest.mark.skipif(engine.dialect.name != "postgresql",
+                                   reason="needs TEST_DATABASE_URL pointing at PostgreSQL")
+
+
+def close_module_sessions():
+    """Ends whatever the services' module-level sessions still hold, so tables can be dropped."""
+    for name, module in list(sys.modules.items()):
+        if name.startswith("app.") and isinstance(getattr(module, "session", None), Session):
+            module.session.rollback()
+            module.session.close()
+
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(engine)
+    session = SessionLocal()
+    yield session
+    session.close()
+    close_module_sessions()
+    Base.metadata.drop_all(engine)
+
+
+@pytest.fixture
+def user(db):
+    return add_user(db)
+
+
+def add_user(db, email: str = "test@example.com") -> models.User:
+    user = models.User(email=email, name="Test")
+    db.add(user)
+    db.commit()
+    return user
+
+
+def add_account(db, user, account_number: str = "1") -> models.Account:
+    account = models.Account(user_id=user.user_id, brokerage="schwab", account_number=account_number)
+    db.add(account)
+    db.commit()
+    return account
+
+
+def add_transaction(db, account, symbol: str, action: str, quantity, price, day: date, **columns):
+    txn = models.Transaction(account_id=account.account_id, symbol=symbol, action=action,
+                             instrument_type="cash" if symbol == "CASH" else "stock",
+                             quantity=Decimal(str(quantity)), price=Decimal(str(price)), date=day, **columns)
+    db.add(txn)
+    return txn
+
+
+def seed_valued_snapshots(db, account, start: date, days: int, seed: int = 0):
+    """A deposit on the first day, then daily valued snapshots of one stock and CASH."""
+    add_transaction(db, account, "CASH", "journal", 10_000, 1, start)
+    value = 10_000.0
+    for offset in range(days):
+        value *= 1 + ((offset * 7 + seed) % 11 - 5) / 1_000
+        day = start + timedelta(days=offset)
+        db.add(models.PositionSnapshot(account_id=account.account_id, symbol="AAPL", quantity=Decimal("10"),
+                                       price=Decimal(str(round(value / 10, 5))),
+                                       total_value=Decimal(str(round(value, 5))), as_of_date=day, action="buy"))
+        db.add(models.PositionSnapshot(account_id=account.account_id, symbol="CASH", quantity=Decimal("100"),
+                                       price=Decimal("1"), total_value=Decimal("100"), as_of_date=day,
+                                       action="buy"))
+    db.commit()
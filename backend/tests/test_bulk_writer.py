@@ -0,0 +1,68 @@
+import uuid
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import insert
+
+from app.models import PositionSnapshot, TransactionType
+from app.services.bulk_writer import COPY_NULL, copy_rows, to_copy_field, to_copy_text
+from tests.conftest import add_account, postgres_only
+
+
+def snapshot_rows(account) -> list[dict]:
+    """Snapshot rows with NULLs, Decimals past float precision, explicit UUIDs, every enum and CSV-hostile text."""
+    decimals = [Decimal("0.000000000000000001"), Decimal("-123456789012345.678901234567"), Decimal("1E+3"),
+                Decimal("0"), Decimal("-0.50")]
+    rows = []
+    for i, action in enumerate(TransactionType):
+        rows.append({
+            "snapshot_id": uuid.uuid4(),
+            "account_id": account.account_id,
+            "symbol": ["AAPL", 'QUOTE"D', "COMMA,SYMBOL", "BACK\\SLASH", "NEW\nLINE", "\\N", ""][i % 7],
+            "quantity": decimals[i % len(decimals)],
+            "avg_cost": None if i % 2 else decimals[(i + 1) % len(decimals)],
+            "price": None if i % 3 else Decimal("189.123456789"),
+            "total_value": None,
+            "as_of_date": date(2025, 1, 2 + i),
+            "action": action,
+        })
+    return rows
+
+
+def stored_rows(db) -> dict:
+    return {row.snapshot_id: {name: getattr(row, name) for name in PositionSnapshot.__table__.columns.keys()}
+            for row in db.query(PositionSnapshot)}
+
+
+@postgres_only
+def test_copy_and_executemany_store_the_same_rows(db, user):
+    rows = snapshot_rows(add_account(db, user))
+    table = PositionSnapshot.__table__
+
+    copy_rows(db, table, rows)
+    copied = stored_rows(db)
+    db.rollback()
+    db.execute(insert(table), rows)
+    inserted = stored_rows(db)
+    db.rollback()
+
+    assert copied == inserted
+    assert {row["snapshot_id"]: row for row in rows} == copied  # and both kept every value exactly
+
+
+@pytest.mark.parametrize("value, text", [
+    (None, COPY_NULL),
+    (True, "t"),
+    (Decimal("-0.000000000000000001"), "-1E-18"),
+    (uuid.UUID("12345678-1234-5678-1234-567812345678"), "12345678-1234-5678-1234-567812345678"),
+    (date(2025, 1, 2), "2025-01-02"),
+    ({"a": [1, None]}, '{"a": [1, null]}'),
+])
+def test_copy_text_of_each_value_type(value, text):
+    assert to_copy_text(value) == text
+
+
+def test_only_null_is_an_unquoted_copy_field():
+    assert [to_copy_field(value) for value in (None, COPY_NULL, "", 'say "hi"')] == \
+        [COPY_NULL, '"\\N"', '""', '"say ""hi"""']
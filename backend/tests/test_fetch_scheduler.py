@@ -0,0 +1,98 @@
+import random
+import threading
+import time
+from decimal import Decimal
+from functools import partial
+
+from app.services.fetch_scheduler import MAX_BACKOFF_SECONDS, FetchFailure, FetchReport, FetchScheduler
+
+
+class FakePriceProvider:
+    """
+    Provider interface over simulated requests, one per symbol. Some symbols fail a few times before
+    succeeding, others fail every time.
+    """
+    name = "fake"
+
+    def __init__(self, scheduler: FetchScheduler, flaky: dict[str, int], broken: set[str], latency: float = 0.001):
+        self.scheduler = scheduler
+        self.flaky = dict(flaky)
+        self.broken = broken
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.started: list[float] = []
+
+    def quote(self, symbol: str) -> Decimal:
+        with self.lock:
+            self.started.append(time.monotonic())
+            failures_left = self.flaky.get(symbol, 0)
+            if failures_left:
+                self.flaky[symbol] = failures_left - 1
+        time.sleep(self.latency)
+        if symbol in self.broken:
+            raise ConnectionError(f"{symbol} unavailable")
+        if failures_left:
+            raise TimeoutError(f"{symbol} timed out")
+        return expected_price(symbol)
+
+    def latest_closes(self, symbols: list[str]) -> dict[str, Decimal]:
+        return self.scheduler.run({symbol: partial(self.quote, symbol) for symbol in symbols})
+
+    def option_prices(self, symbols: list[str]) -> dict[str, Decimal]:
+        return self.latest_closes(symbols)
+
+
+def expected_price(symbol: str) -> Decimal:
+    return Decimal(sum(map(ord, symbol))) / 100
+
+
+def fake_symbols(count: int) -> list[str]:
+    return [f"SYM{i:04d}" for i in range(count)]
+
+
+def test_transient_errors_are_retried_and_persistent_ones_reported():
+    count = 120
+    rng = random.Random(13)
+    symbols = fake_symbols(count)
+    flaky = {symbol: rng.randint(1, 3) for symbol in rng.sample(symbols, count // 5)}
+    broken = set(rng.sample(sorted(set(symbols) - set(flaky)), count // 20))
+    scheduler = FetchScheduler(workers=16, rate=1_000, burst=16, retries=3, backoff=0.001)
+    provider = FakePriceProvider(scheduler, flaky, broken)
+
+    prices = provider.latest_closes(symbols)
+    assert prices == {symbol: expected_price(symbol) for symbol in symbols if symbol not in broken}
+    report = scheduler.report
+    assert set(report.failures) == broken
+    assert all(failure.attempts == 4 and "ConnectionError" in failure.error for failure in report.failures.values())
+    assert report.retries == sum(flaky.values()) + 3 * len(broken)
+    assert report.requests == count + report.retries
+
+
+def test_retries_back_off_exponentially_up_to_the_cap():
+    waits = []
+    scheduler = FetchScheduler(workers=1, rate=1_000, burst=1, retries=6, backoff=0.5, sleep=waits.append)
+    provider = FakePriceProvider(scheduler, {}, {"DOWN"}, latency=0.0)
+
+    assert provider.latest_closes(["DOWN"]) == {}
+    assert waits == [0.5, 1.0, 2.0, 4.0, MAX_BACKOFF_SECONDS, MAX_BACKOFF_SECONDS]
+    assert scheduler.report.failures["DOWN"] == FetchFailure("ConnectionError: DOWN unavailable", 7)
+
+
+def test_token_bucket_holds_the_request_rate():
+    rate, burst, requests = 200.0, 5, 60
+    scheduler = FetchScheduler(workers=16, rate=rate, burst=burst, retries=0)
+    provider = FakePriceProvider(scheduler, {}, set(), latency=0.0)
+
+    provider.latest_closes(fake_symbols(requests))
+    # The burst starts at once; every later request waits for a token
+    elapsed = max(provider.started) - min(provider.started)
+    assert elapsed >= (requests - burst) / rate * 0.95, elapsed
+
+
+def test_report_summary_lists_every_failure():
+    report = FetchReport(requests=5, retries=2, failures={"closes AAPL..MSFT": FetchFailure("TimeoutError: slow", 3)})
+    assert report.summary() == [
+        "5 request(s), 2 retried, 1 failed",
+        "[closes AAPL..MSFT] TimeoutError: slow (after 3 attempt(s))",
+    ]
+    assert FetchScheduler().run({}) == {}
@@ -0,0 +1,51 @@
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from app.models import PositionSnapshot, PositionWatermark
+from app.services.position_service import recalculate_account
+from tests.conftest import add_account, add_transaction
+
+
+def aapl_snapshots(db, account) -> dict[date, tuple]:
+    return {snapshot.as_of_date: (snapshot.snapshot_id, snapshot.quantity) for snapshot in
+            db.query(PositionSnapshot).filter_by(account_id=account.account_id, symbol="AAPL")}
+
+
+def test_backdated_import_restarts_the_replay_from_its_date(db, user, capsys):
+    today = date.today()
+    start, backdated = today - timedelta(days=20), today - timedelta(days=10)
+    # Imported and replayed by earlier runs; now() only ticks once a second on SQLite, so date them back
+    imported, replayed = datetime.now() - timedelta(hours=2), datetime.now() - timedelta(hours=1)
+    account = add_account(db, user)
+    add_transaction(db, account, "CASH", "journal", 5_000, 1, start, created_at=imported)
+    add_transaction(db, account, "AAPL", "buy", 10, 100, start, created_at=imported)
+    db.commit()
+    recalculate_account(account, incremental=True)
+    before = aapl_snapshots(db, account)
+    assert set(before) == {start + timedelta(days=offset) for offset in range(21)}
+
+    db.query(PositionWatermark).update({PositionWatermark.updated_at: replayed})
+    db.commit()
+    capsys.readouterr()
+    recalculate_account(account, incremental=True)
+    assert "Back-dated" not in capsys.readouterr().out
+
+    # An import made now, of a trade dated before the watermark; created_at is set by the database
+    db.query(PositionWatermark).update({PositionWatermark.updated_at: replayed})
+    txn = add_transaction(db, account, "AAPL", "buy", 5, 110, backdated)
+    db.commit()
+    db.refresh(txn)
+    assert txn.created_at > replayed
+    recalculate_account(account, incremental=True)
+
+    assert f"Back-dated transactions found, replaying from {backdated}" in capsys.readouterr().out
+    db.expire_all()
+    after = aapl_snapshots(db, account)
+    assert after.keys() == before.keys()
+    for day, (snapshot_id, quantity) in after.items():
+        if day < backdated:
+            assert (snapshot_id, quantity) == before[day]  # left in place
+        else:
+            assert snapshot_id != before[day][0] and quantity == Decimal(15)
+    watermark = db.get(PositionWatermark, account.account_id)
+    assert (watermark.processed_through, watermark.transaction_count) == (today, 3)
@@ -0,0 +1,136 @@
+import random
+from datetime import date
+from decimal import Decimal
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app.services.lot_engine import LONG_TERM_DAYS, LotBook, LotLedger
+from app.services.position_service import aggregate_transactions, update_with_day_transactions
+
+AS_OF = date(2024, 7, 1)
+
+
+def three_lots() -> LotBook:
+    """10 @ 100 held long-term, then 10 @ 150 and 10 @ 120 held short-term as of AS_OF."""
+    book = LotBook()
+    book.open(10, 100, date(2023, 1, 2))
+    book.open(10, 150, date(2024, 3, 1))
+    book.open(10, 120, date(2024, 6, 3))
+    return book
+
+
+@pytest.mark.parametrize("method, lot_open_dates, cost_basis, left", [
+    ("fifo", None, "1750", [0, 5, 10]),
+    ("lifo", None, "1950", [10, 5, 0]),
+    ("hifo", None, "2100", [10, 0, 5]),
+    # The named lot first, then FIFO for the remainder
+    ("specific", [date(2024, 6, 3)], "1700", [5, 10, 0]),
+    ("specific", None, "1750", [0, 5, 10]),
+])
+def test_relief_methods_pick_lots_in_their_order(method, lot_open_dates, cost_basis, left):
+    book = three_lots()
+    relief = book.relieve(15, AS_OF, method, lot_open_dates=lot_open_dates)
+    assert (relief.quantity, relief.cost_basis) == (Decimal(15), Decimal(cost_basis))
+    by_open_date = dict(zip(book.to_dict()["open_date"], book.to_dict()["quantity"]))
+    assert [by_open_date.get(day.toordinal(), 0) for day in
+            (date(2023, 1, 2), date(2024, 3, 1), date(2024, 6, 3))] == left
+
+
+def test_relief_splits_long_and_short_term():
+    relief = three_lots().relieve(15, AS_OF, "fifo")
+    assert (relief.long_term_quantity, relief.long_term_cost) == (Decimal(10), Decimal(1000))
+    assert (relief.short_term_quantity, relief.short_term_cost) == (Decimal(5), Decimal(750))
+
+
+def test_a_lot_held_exactly_the_long_term_days_is_short_term():
+    opened = date(2023, 7, 1)
+    book = LotBook()
+    book.open(2, 10, opened)
+    relief = book.relieve(1, date.fromordinal(opened.toordinal() + LONG_TERM_DAYS), "fifo")
+    assert relief.short_term_quantity == Decimal(1) and relief.long_term_quantity == Decimal(0)
+    relief = book.relieve(1, date.fromordinal(opened.toordinal() + LONG_TERM_DAYS + 1), "fifo")
+    assert relief.long_term_quantity == Decimal(1) and relief.short_term_quantity == Decimal(0)
+
+
+def test_short_lots_are_relieved_separately_from_long_ones():
+    book = LotBook()
+    book.open(5, 100, date(2024, 1, 2))
+    book.open(-10, 50, date(2024, 2, 1))
+    relief = book.relieve(4, AS_OF, "fifo", side=-1)
+    assert (relief.quantity, relief.cost_basis) == (Decimal(4), Decimal(200))
+    assert (book.open_quantity(1), book.open_quantity(-1)) == (5.0, 6.0)
+
+
+def test_relieving_more_than_the_open_lots_raises_and_leaves_the_book():
+    book = three_lots()
+    with pytest.raises(ValueError, match="Cannot relieve 31 from 30"):
+        book.relieve(31, AS_OF, "fifo")
+    assert book.total_quantity() == 30
+
+    ledger = LotLedger("fifo")
+    ledger.open("AAPL", 1, 100, date(2024, 1, 2))
+    with pytest.raises(ValueError, match=r"\[AAPL\] .* on 2024-07-01"):
+        ledger.relieve("AAPL", 2, AS_OF)
+
+
+def test_hifo_over_many_lots_matches_a_full_sort():
+    # More lots than the partial sort starts with, many of them tied on cost
+    rnd = random.Random(3)
+    book = LotBook()
+    lots = [(rnd.randint(1, 20), rnd.choice([90, 95, 100, 105, 110, 115]), date.fromordinal(738_000 + i))
+            for i in range(300)]
+    for quantity, unit_cost, open_date in lots:
+        book.open(quantity, unit_cost, open_date)
+
+    wanted = 700
+    expected_cost, left = 0, wanted
+    for quantity, unit_cost, _ in sorted(lots, key=lambda lot: -lot[1]):  # stable: oldest first among ties
+        taken = min(quantity, left)
+        expected_cost += taken * unit_cost
+        left -= taken
+    assert book.relieve(wanted, AS_OF, "hifo").cost_basis == Decimal(expected_cost)
+
+
+def test_books_round_trip_through_their_stored_form():
+    book = three_lots()
+    book.relieve(12, AS_OF, "fifo")
+    restored = LotBook.from_dict(book.to_dict())
+    assert restored.to_dict() == book.to_dict()
+    assert len(restored) == 2
+    assert np.isclose(restored.total_cost(), book.total_cost())
+
+
+def trade(symbol: str, action: str, quantity, price, day: date):
+    return SimpleNamespace(symbol=symbol, action=action, instrument_type="stock", quantity=Decimal(str(quantity)),
+                           price=Decimal(str(price)), date=day, journal_details=None)
+
+
+def test_selling_more_than_held_realizes_the_lots_and_opens_a_short():
+    lots = LotLedger("fifo")
+    symbol_data, realized = aggregate_transactions([
+        trade("AAPL", "buy", 10, 100, date(2024, 1, 2)),
+        trade("AAPL", "sell", -15, 120, date(2024, 2, 1)),
+    ], track_cash=False, lots=lots)
+
+    (record,) = realized
+    assert (record["qty"], record["pnl"], record["proceeds"]) == (Decimal(10), Decimal(200), Decimal(1200))
+    assert (symbol_data["AAPL"]["qty"], symbol_data["AAPL"]["total_cost"]) == (Decimal(-5), Decimal(-600))
+    assert lots.to_dict()["books"]["AAPL"]["quantity"] == [-5.0]
+
+    # Buying back more than the short covers it and opens a long lot
+    symbol_data, realized = update_with_day_transactions(symbol_data, [
+        trade("AAPL", "buy_to_close", 8, 110, date(2024, 3, 1)),
+    ], track_cash=False, lots=lots)
+    assert (realized[0]["qty"], realized[0]["pnl"]) == (Decimal(5), Decimal(50))
+    assert (symbol_data["AAPL"]["qty"], symbol_data["AAPL"]["total_cost"]) == (Decimal(3), Decimal(330))
+    assert lots.to_dict()["books"]["AAPL"]["quantity"] == [3.0]
+
+
+def test_journaling_out_more_than_the_lots_hold_raises():
+    with pytest.raises(ValueError, match=r"\[AAPL\] Cannot relieve 15 from 10"):
+        aggregate_transactions([
+            trade("AAPL", "buy", 10, 100, date(2024, 1, 2)),
+            trade("AAPL", "journal", -15, 0, date(2024, 2, 1)),
+        ], track_cash=False, lots=LotLedger("fifo"))
@@ -0,0 +1,121 @@
+"""
+The aligned pandas kernels for daily returns, TWR, drawdown and rolling returns against the per-date
+loops they replaced, on random single series and on a dates x accounts frame.
+"""
+import random
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services.portfolio_service import (
+    compute_daily_returns, compute_drawdown_series, compute_rolling_returns, compute_twr_series
+)
+
+START_DATE = date(2015, 1, 2)
+
+# Both sides are float64; the only difference is the order of operations in the product
+TOLERANCE = 1e-9
+
+
+def scalar_daily_returns(portfolio_series: pd.Series, cash_flows: pd.Series) -> pd.Series:
+    adjusted = {}
+    prev_value = None
+
+    for day in portfolio_series.index:
+        value = portfolio_series[day]
+        flow = cash_flows.get(day, 0.0)
+
+        if prev_value is not None:
+            adjusted[day] = (value - flow) / prev_value - 1
+
+        prev_value = value
+
+    return pd.Series(adjusted, dtype=float)
+
+
+def scalar_twr_series(portfolio_series: pd.Series, cash_flows: pd.Series) -> pd.Series:
+    twr = 1.0
+    prev_value = None
+    twr_series = {}
+
+    for day in portfolio_series.index:
+        value = portfolio_series[day]
+        flow = cash_flows.get(day, 0.0)
+
+        if prev_value is not None:
+            r = (value - flow - prev_value) / prev_value
+            twr *= (1 + r)
+
+        prev_value = value
+        twr_series[day] = twr - 1
+
+    return pd.Series(twr_series, dtype=float)
+
+
+def scalar_rolling_return(daily_returns: pd.Series, i: int, days: int) -> float:
+    """The slice product update_portfolio_metrics ran for the i-th snapshot date."""
+    return daily_returns.iloc[max(0, i - (days - 1)):i].add(1).prod() - 1
+
+
+def random_series(rnd: random.Random, days: int, first_day: int = 0) -> tuple[pd.Series, pd.Series]:
+    """A value walk with deposits and withdrawals on random days, some of them not in the value series."""
+    dates = [START_DATE + timedelta(days=first_day + offset) for offset in range(days)]
+    values, flows = {}, {}
+    value = rnd.uniform(1_000, 1_000_000)
+    for day in dates:
+        flow = 0.0
+        if rnd.random() < 0.03:
+            flow = round(rnd.uniform(-0.2, 0.5) * value, 2)
+            flows[day] = flow
+        value = max(1.0, value * (1 + rnd.gauss(0.0004, 0.012)) + flow)
+        if rnd.random() < 0.97:  # missing snapshots
+            values[day] = value
+        elif flow and rnd.random() < 0.5:
+            flows[day] = flow
+    return pd.Series(values, dtype=float), pd.Series(flows, dtype=float)
+
+
+def assert_close(expected: pd.Series, actual: pd.Series, label: str):
+    assert list(expected.index) == list(actual.index), label
+    # NaNs must line up, which the last assertion checks; empty series have no difference at all
+    difference = np.max(np.nan_to_num(np.abs(expected.to_numpy() - actual.to_numpy())
+                                      / np.maximum(1, np.abs(expected)), nan=0.0), initial=0.0)
+    assert difference <= TOLERANCE, (label, difference)
+    assert (expected.isna() == actual.isna()).all(), label
+
+
+@pytest.mark.parametrize("seed", [11, 13])
+def test_series_kernels_match_the_per_date_loops(seed):
+    rnd = random.Random(seed)
+    # Series of one and two days have no or a single return
+    for length in [1, 2] + [rnd.randint(3, 800) for _ in range(25)]:
+        values, flows = random_series(rnd, length)
+        assert_close(scalar_daily_returns(values, flows), compute_daily_returns(values, flows), "returns")
+        assert_close(scalar_twr_series(values, flows), compute_twr_series(values, flows), "twr")
+
+        daily_returns = scalar_daily_returns(values, flows)
+        rolling = compute_rolling_returns(daily_returns, ("7d", "30d", "252d"))
+        for window, days in (("7d", 7), ("30d", 30), ("252d", 252)):
+            expected = pd.Series([scalar_rolling_return(daily_returns, i, days)
+                                  for i in range(1, len(daily_returns) + 1)], index=daily_returns.index, dtype=float)
+            assert_close(expected, rolling[window], window)
+
+
+def test_frame_kernels_match_each_account_alone():
+    # Accounts that start, pause and end on different days, computed as one frame
+    rnd = random.Random(13)
+    columns, flow_columns = {}, {}
+    for account in range(40):
+        columns[account], flow_columns[account] = random_series(rnd, rnd.randint(1, 600), rnd.randint(0, 300))
+    frame, flow_frame = pd.DataFrame(columns).sort_index(), pd.DataFrame(flow_columns).sort_index()
+    daily_returns = compute_daily_returns(frame, flow_frame)
+    twr = compute_twr_series(frame, flow_frame)
+    drawdown = compute_drawdown_series(frame)
+    for account in frame.columns:
+        values, flows = frame[account].dropna(), flow_frame[account].dropna()
+        assert_close(scalar_daily_returns(values, flows),
+                     daily_returns[account].reindex(values.index[1:]), "frame returns")
+        assert_close(scalar_twr_series(values, flows), twr[account].reindex(values.index), "frame twr")
+        assert_close(compute_drawdown_series(values), drawdown[account].reindex(values.index), "frame drawdown")
@@ -0,0 +1,82 @@
+from contextlib import contextmanager
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import event
+
+from app.db import engine
+from app.models import PortfolioMetricsSnapshot, PortfolioMetricsWatermark, Price, UserPortfolioMetricsSnapshot
+from app.services.portfolio_service import update_portfolio_metrics
+from app.services.position_service import recalculate_account
+from tests.conftest import add_account, add_transaction, add_user, seed_valued_snapshots
+
+START_DATE = date(2025, 1, 2)
+
+
+@contextmanager
+def counted_statements():
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+
+
+def metrics_statements(db, capsys, email: str, accounts: int, days: int) -> tuple[int, int]:
+    """Statements run by a full and then an incremental update_portfolio_metrics of a new user."""
+    user = add_user(db, email)
+    account_ids = []
+    for number in range(accounts):
+        account = add_account(db, user, str(number))
+        seed_valued_snapshots(db, account, START_DATE, days, seed=number)
+        account_ids.append(account.account_id)
+
+    with counted_statements() as full:
+        update_portfolio_metrics(email)
+    assert db.query(PortfolioMetricsSnapshot).filter(
+        PortfolioMetricsSnapshot.account_id.in_(account_ids)).count() == accounts * (days - 1)
+    # The user series opens on the accounts' first metrics date, so it has no return on that one
+    assert db.query(UserPortfolioMetricsSnapshot).filter_by(user_id=user.user_id).count() == days - 2
+
+    capsys.readouterr()
+    with counted_statements() as incremental:
+        update_portfolio_metrics(email, incremental=True)
+    # Nothing changed upstream, so every watermark is appended to rather than rebuilt
+    assert "rebuilding" not in capsys.readouterr().out
+    assert db.query(PortfolioMetricsWatermark).filter(
+        PortfolioMetricsWatermark.account_id.in_(account_ids)).count() == accounts
+    return len(full), len(incremental)
+
+
+def test_statement_count_does_not_grow_with_accounts_or_dates(db, capsys):
+    # Both users' rows fit one bulk-upsert batch, so any growth would come from per-account or per-date queries
+    small = metrics_statements(db, capsys, "small@example.com", accounts=1, days=20)
+    large = metrics_statements(db, capsys, "large@example.com", accounts=6, days=150)
+    assert small == large
+
+
+def test_range_stored_accounts_are_refused(db, user):
+    account = add_account(db, user)
+    start = date.today() - timedelta(days=10)
+    add_transaction(db, account, "CASH", "journal", 1_000, 1, start)
+    add_transaction(db, account, "AAPL", "buy", 2, 100, start)
+    # A close today as well, so every replayed day has a settled price
+    db.add_all([Price(symbol="AAPL", price_date=start, price=Decimal("110")),
+                Price(symbol="AAPL", price_date=date.today(), price=Decimal("120"))])
+    db.commit()
+
+    recalculate_account(account, snapshot_storage="range")
+    with pytest.raises(ValueError, match="snapshot ranges"):
+        update_portfolio_metrics(user.email)
+    assert db.query(PortfolioMetricsSnapshot).count() == 0
+
+    # Replayed as valued daily snapshots, the same account gets its metrics
+    recalculate_account(account, snapshot_storage="daily")
+    update_portfolio_metrics(user.email)
+    assert db.query(PortfolioMetricsSnapshot).filter_by(account_id=account.account_id).count() > 0
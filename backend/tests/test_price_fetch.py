@@ -0,0 +1,112 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import app.services.price_providers as price_providers
+from app.models import PositionSnapshot, Price
+from app.models.position import Position
+from app.services.price_providers import YahooPriceProvider
+from app.services.price_service import fetch_and_store_prices
+from tests.conftest import add_account
+
+
+def add_position(db, account, symbol: str, quantity):
+    db.add(Position(account_id=account.account_id, symbol=symbol, quantity=Decimal(str(quantity)),
+                    avg_cost=Decimal("1"), last_updated=date.today(), action="buy"))
+
+
+def test_fetch_and_store_prices_from_a_price_file(db, user, tmp_path, capsys):
+    today = date.today()
+    option = f"AAPL_{today + timedelta(days=60)}_150.0_CALL"
+    expired = f"AAPL_{today - timedelta(days=5)}_150.0_PUT"
+    user.benchmark = "SPY"
+    account = add_account(db, user)
+    for symbol, quantity in (("AAPL", 10), ("MSFT", 5), ("GOOG", 1), ("CASH", 500), (option, 2), (expired, 1)):
+        add_position(db, account, symbol, quantity)
+    db.add(Price(symbol="GOOG", price_date=today, price=Decimal("100")))
+    for symbol, quantity in (("AAPL", 10), (option, 2)):
+        db.add(PositionSnapshot(account_id=account.account_id, symbol=symbol, quantity=Decimal(quantity),
+                                as_of_date=today, action="buy"))
+    db.commit()
+
+    price_file = tmp_path / "prices.csv"
+    price_file.write_text(
+        "symbol,date,price\n"
+        f"AAPL,{today - timedelta(days=1)},180\n"
+        f"AAPL,{today},189.123456\n"
+        f"GOOG,{today},150\n"
+        f"{option},{today},4.5\n"
+        f"SPY,{today - timedelta(days=2)},500.25\n"
+    )
+    fetch_and_store_prices("file", str(price_file))
+
+    stored = {price.symbol: price.price for price in db.query(Price).filter_by(price_date=today)}
+    assert stored == {"AAPL": Decimal("189.1235"), "GOOG": Decimal("100"), "CASH": Decimal("1.0"),
+                      option: Decimal("4.5"), "SPY": Decimal("500.25")}
+    out = capsys.readouterr().out
+    assert "[GOOG] Price already stored" in out
+    assert f"[{expired}] Option expired" in out
+    assert "No price for 1 symbol(s): MSFT" in out
+
+    # Today's snapshots written before the fetch are valued from the new prices, options per 100 shares
+    values = {snapshot.symbol: snapshot.total_value for snapshot in db.query(PositionSnapshot)}
+    assert values == {"AAPL": Decimal("1891.235"), option: Decimal("900")}
+
+
+def yahoo_frame(closes: dict[str, list[float]], single_level: bool = False) -> pd.DataFrame:
+    """A yf.download result: (Price, Ticker) columns, or flat Price columns as older yfinance returns for one ticker."""
+    index = pd.date_range("2025-06-02", periods=len(next(iter(closes.values()))), name="Date")
+    if single_level:
+        (values,) = closes.values()
+        return pd.DataFrame({"Close": values, "Open": values, "Volume": 1_000}, index=index)
+    columns = {(field, ticker): values for ticker, values in closes.items() for field in ("Close", "Open")}
+    frame = pd.DataFrame(columns, index=index)
+    frame.columns = pd.MultiIndex.from_tuples(frame.columns, names=["Price", "Ticker"])
+    return frame
+
+
+class Downloads(list):
+    """Tickers of every yf.download call, and the frame each of them returns."""
+    frame: pd.DataFrame | None = None
+
+
+@pytest.fixture
+def yahoo_download(monkeypatch):
+    calls = Downloads()
+
+    def download(tickers, **kwargs):
+        calls.append(list(tickers))
+        return calls.frame
+
+    monkeypatch.setattr(price_providers.yf, "download", download)
+    return calls
+
+
+@pytest.mark.parametrize("single_level", [False, True])
+def test_download_closes_of_one_ticker(yahoo_download, single_level):
+    yahoo_download.frame = yahoo_frame({"AAPL": [190.0, 191.5, 192.25]}, single_level)
+    assert YahooPriceProvider.download_closes(["AAPL"]) == {"AAPL": Decimal(192.25)}
+
+
+def test_download_closes_of_several_tickers(yahoo_download):
+    # MSFT has not traded on the last day yet, so its previous close is carried forward
+    yahoo_download.frame = yahoo_frame({"AAPL": [190.0, 192.25], "MSFT": [410.5, np.nan], "NVDA": [120.0, 121.0]})
+    closes = YahooPriceProvider.download_closes(["AAPL", "MSFT", "NVDA", "GONE"])
+    assert yahoo_download == [["AAPL", "MSFT", "NVDA", "GONE"]]
+    assert closes == {"AAPL": Decimal(192.25), "MSFT": Decimal(410.5), "NVDA": Decimal(121.0)}
+
+
+def test_download_closes_leaves_out_an_all_nan_column(yahoo_download):
+    yahoo_download.frame = yahoo_frame({"AAPL": [190.0, 192.25], "DLST": [np.nan, np.nan]})
+    assert YahooPriceProvider.download_closes(["AAPL", "DLST"]) == {"AAPL": Decimal(192.25)}
+
+
+@pytest.mark.parametrize("frame", [pd.DataFrame(), yahoo_frame({"DLST": [np.nan, np.nan], "GONE": [np.nan, np.nan]})])
+def test_download_closes_raises_when_nothing_came_back(yahoo_download, frame):
+    # Raising lets the fetch scheduler retry the batch
+    yahoo_download.frame = frame
+    with pytest.raises(ValueError, match="No closes returned for 2 symbol"):
+        YahooPriceProvider.download_closes(["DLST", "GONE"])
@@ -0,0 +1,113 @@
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+
+from sqlalchemy import text
+
+from app.models import PositionSnapshot, Price
+from app.services.position_service import recalculate_account
+from app.services.price_service import HYDRATE_SQL, fetch_and_store_prices, hydrate_in_chunks, hydrate_missing_prices
+from tests.conftest import add_account, add_transaction, postgres_only
+
+START_DATE = date(2025, 1, 2)
+
+
+def add_snapshot(db, account, symbol: str, quantity, as_of_date: date, price=None):
+    db.add(PositionSnapshot(account_id=account.account_id, symbol=symbol, quantity=Decimal(str(quantity)),
+                            price=price, total_value=None, as_of_date=as_of_date, action="buy"))
+
+
+def seed_random_snapshots(db, account, seed: int = 5):
+    """
+    Unpriced snapshots of stocks and options on random dates, prices with six decimals (some ending in
+    a 5 to exercise rounding) on other random dates, and a few snapshots dated before any price.
+    """
+    rnd = random.Random(seed)
+    symbols = [f"S{i:02d}" for i in range(12)] + [f"S{i:02d}_2026-01-16_{i * 5}.0_CALL" for i in range(4)]
+    for symbol in symbols:
+        first_price = rnd.randint(5, 30)
+        for offset in sorted(rnd.sample(range(first_price, 90), 20)):
+            price = Decimal(rnd.randint(100_000, 900_000_000)) / 1_000_000
+            if rnd.random() < 0.3:
+                price = price.quantize(Decimal("0.00001")) + Decimal("0.000005")
+            db.add(Price(symbol=symbol, price_date=START_DATE + timedelta(days=offset), price=price))
+        for offset in rnd.sample(range(90), 25):
+            quantity = Decimal(rnd.randint(-50_000_000, 50_000_000)) / 100_000
+            add_snapshot(db, account, symbol, quantity, START_DATE + timedelta(days=offset))
+    db.commit()
+
+
+def hydrated_values(db) -> dict:
+    return {snapshot_id: (price, total_value) for snapshot_id, price, total_value in
+            db.query(PositionSnapshot.snapshot_id, PositionSnapshot.price, PositionSnapshot.total_value)}
+
+
+def test_snapshots_take_the_latest_price_on_or_before_their_date(db, user):
+    account = add_account(db, user)
+    option = "TSLA_2025-06-20_210.0_PUT"
+    db.add_all([
+        Price(symbol="AAPL", price_date=START_DATE, price=Decimal("100.123455")),
+        Price(symbol="AAPL", price_date=START_DATE + timedelta(days=3), price=Decimal("101")),
+        Price(symbol=option, price_date=START_DATE + timedelta(days=1), price=Decimal("2.5")),
+    ])
+    add_snapshot(db, account, "AAPL", "10", START_DATE + timedelta(days=2))
+    add_snapshot(db, account, "AAPL", "-3", START_DATE + timedelta(days=5))
+    add_snapshot(db, account, option, "2", START_DATE)  # before the option's first price
+    add_snapshot(db, account, option, "2", START_DATE + timedelta(days=1))
+    add_snapshot(db, account, "MSFT", "1", START_DATE + timedelta(days=1), price=Decimal("400"))
+    db.commit()
+
+    hydrate_missing_prices()
+
+    rows = {(snapshot.symbol, snapshot.as_of_date - START_DATE): (snapshot.price, snapshot.total_value)
+            for snapshot in db.query(PositionSnapshot)}
+    assert rows == {
+        ("AAPL", timedelta(days=2)): (Decimal("100.12346"), Decimal("1001.2346")),
+        ("AAPL", timedelta(days=5)): (Decimal("101"), Decimal("-303")),
+        (option, timedelta(days=0)): (None, None),
+        (option, timedelta(days=1)): (Decimal("2.5"), Decimal("500")),
+        ("MSFT", timedelta(days=1)): (Decimal("400"), None),  # already priced, left alone
+    }
+
+
+def test_replay_leaves_unsettled_days_to_the_next_fetch(db, user, tmp_path):
+    today = date.today()
+    bought, gap, yesterday = (today - timedelta(days=days) for days in (3, 2, 1))
+    account = add_account(db, user)
+    add_transaction(db, account, "CASH", "journal", 5_000, 1, bought)
+    add_transaction(db, account, "AAPL", "buy", 10, 170, bought)
+    db.add_all([Price(symbol="AAPL", price_date=bought, price=Decimal("170")),
+                Price(symbol="AAPL", price_date=yesterday, price=Decimal("180"))])
+    db.commit()
+
+    def aapl_values() -> dict:
+        db.expire_all()
+        return {snapshot.as_of_date: (snapshot.price, snapshot.total_value) for snapshot in
+                db.query(PositionSnapshot).filter_by(account_id=account.account_id, symbol="AAPL")}
+
+    recalculate_account(account, incremental=True)
+    # The gap day is settled by the later price; today's close has not been stored yet
+    assert aapl_values() == {bought: (Decimal("170"), Decimal("1700")), gap: (Decimal("170"), Decimal("1700")),
+                             yesterday: (Decimal("180"), Decimal("1800")), today: (None, None)}
+
+    price_file = tmp_path / "prices.csv"
+    price_file.write_text(f"symbol,date,price\nAAPL,{today},190\n")
+    fetch_and_store_prices("file", str(price_file))
+    recalculate_account(account, incremental=True)
+    assert aapl_values()[today] == (Decimal("190"), Decimal("1900"))
+
+
+@postgres_only
+def test_hydrate_sql_matches_the_merge_asof_fallback(db, user):
+    seed_random_snapshots(db, add_account(db, user))
+
+    fallback_count = hydrate_in_chunks(db)
+    fallback = hydrated_values(db)
+    db.rollback()
+    sql_count = db.execute(text(HYDRATE_SQL)).rowcount
+    hydrated = hydrated_values(db)
+    db.rollback()
+
+    assert sql_count == fallback_count == sum(price is not None for price, _ in hydrated.values())
+    assert 0 < sql_count < len(hydrated)  # the early snapshots stay unpriced
+    assert hydrated == fallback
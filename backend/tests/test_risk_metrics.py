@@ -0,0 +1,66 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+from app.models import PortfolioMetricsSnapshot, PortfolioRiskSnapshot, PositionSnapshot, UserPortfolioRiskSnapshot
+from app.services.portfolio_service import recalculate_portfolio_metrics
+from app.services.risk_service import RISK_METRICS, update_risk_metrics
+from tests.conftest import add_account, add_user, seed_valued_snapshots
+
+START_DATE = date(2025, 1, 2)
+SENTINEL = Decimal("-1")
+
+
+def risk_snapshots(db) -> dict[tuple, tuple]:
+    return {
+        **{(row.account_id, row.snapshot_date): tuple(getattr(row, name) for name in RISK_METRICS)
+           for row in db.query(PortfolioRiskSnapshot)},
+        **{(row.user_id, row.snapshot_date): tuple(getattr(row, name) for name in RISK_METRICS)
+           for row in db.query(UserPortfolioRiskSnapshot)},
+    }
+
+
+def test_incremental_run_rewrites_only_the_new_dates(db, user):
+    growing, still = add_account(db, user, "1"), add_account(db, user, "2")
+    seed_valued_snapshots(db, growing, START_DATE, 40)
+    seed_valued_snapshots(db, still, START_DATE, 40, seed=3)
+    update_risk_metrics(user.email, recalculate_portfolio_metrics(user.email, incremental=True))
+
+    # Mark every stored risk value, then give one account five more days
+    for model in (PortfolioRiskSnapshot, UserPortfolioRiskSnapshot):
+        db.query(model).update({model.volatility: SENTINEL})
+    first_new = START_DATE + timedelta(days=40)
+    for offset in range(5):
+        db.add(PositionSnapshot(account_id=growing.account_id, symbol="AAPL", quantity=Decimal("10"),
+                                price=Decimal(1_000 + 5 * offset), total_value=Decimal(10_000 + 50 * offset),
+                                as_of_date=first_new + timedelta(days=offset), action="buy"))
+    db.commit()
+
+    rewritten = recalculate_portfolio_metrics(incremental=True)
+    assert rewritten == {("account", growing.account_id): first_new, ("user", user.user_id): first_new}
+    update_risk_metrics(None, rewritten)
+    db.expire_all()
+    incremental = risk_snapshots(db)
+    for (owner_id, day), metrics in incremental.items():
+        assert (metrics[0] == SENTINEL) == (day < first_new or owner_id == still.account_id), (owner_id, day)
+    assert {day for owner_id, day in incremental if owner_id == growing.account_id} == \
+        {START_DATE + timedelta(days=offset) for offset in range(1, 45)}
+
+    # The appended rows are the ones a full rewrite stores
+    update_risk_metrics()
+    db.expire_all()
+    full = risk_snapshots(db)
+    assert full.keys() == incremental.keys()
+    assert all(incremental[key] == full[key] for key in full if key[1] >= first_new)
+
+
+def test_recalculate_portfolio_without_an_email_covers_every_user(db, user):
+    other = add_user(db, "other@example.com")
+    accounts = [add_account(db, user), add_account(db, other)]
+    for account in accounts:
+        seed_valued_snapshots(db, account, START_DATE, 10)
+
+    rewritten = recalculate_portfolio_metrics()
+    assert rewritten == {**{("account", account.account_id): date.min for account in accounts},
+                         ("user", user.user_id): date.min, ("user", other.user_id): date.min}
+    assert {account_id for account_id, in db.query(PortfolioMetricsSnapshot.account_id).distinct()} == \
+        {account.account_id for account in accounts}